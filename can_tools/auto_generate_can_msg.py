@@ -4,11 +4,13 @@ import errno
 import json
 import re
 import argparse
+import hashlib
 import inspect
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime
 from enum import IntEnum
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 # ========================= Helpers ========================= #
 
@@ -54,23 +56,279 @@ def get_motorola_bit_positions(start_bit: int, length: int) -> List[Tuple[int, i
         bits.append((byte_index, bit_index))
     return bits
 
+CODEGEN_MODES = ("bitloop", "shiftmask")
+
+def get_signal_bit_span(sig) -> Tuple[int, int]:
+    """回傳 signal 在整個 payload（視為 little-endian 整數）裡的 (lsb, length)。
+
+    Motorola 沿用 get_motorola_bit_positions 的 start_bit - i 公式，
+    所以 MSB 在 start、LSB 在 start - length + 1，一樣是一段連續位元。
+    """
+    if sig.byte_order == "little_endian":
+        return sig.start, sig.length
+    return sig.start - sig.length + 1, sig.length
+
+def message_frame_len(msg) -> int:
+    """payload 長度：DLC 與 signal 最高位元取大者（lsb < 0 的 Motorola 位元是從這個長度的尾端繞回）。"""
+    need = 0
+    for sig in msg.signals:
+        lsb, length = get_signal_bit_span(sig)
+        need = max(need, (lsb + length + 7) // 8)
+    return max(int(msg.length or 0), need)
+
+def shiftmask_extract_expr(lsb: int, length: int, src: str = "data") -> str:
+    """產生從 src (bytes) 取出 [lsb, lsb+length) 位元的 Python 運算式（只用 index/slice + shift/mask）。"""
+    b0 = lsb // 8
+    b1 = (lsb + length - 1) // 8 + 1
+    shift = lsb - 8 * b0
+    mask = (1 << length) - 1
+    if b1 - b0 == 1:
+        expr = f"{src}[{b0}]"
+    else:
+        expr = f"int.from_bytes({src}[{b0}:{b1}], 'little')"
+    if shift:
+        expr = f"({expr} >> {shift})"
+    if shift + length < 8 * (b1 - b0):
+        expr = f"({expr} & 0x{mask:X})"
+    return expr
+
+def shiftmask_insert_expr(lsb: int, length: int, var: str) -> str:
+    """產生把 var 的低 length 位元放到 [lsb, lsb+length) 的運算式；lsb < 0 的部分直接裁掉（與 bitloop 的越界略過一致）。"""
+    if lsb < 0:
+        length += lsb
+        var = f"({var} >> {-lsb})"
+        lsb = 0
+    expr = f"({var} & 0x{(1 << length) - 1:X})"
+    if lsb:
+        expr = f"({expr} << {lsb})"
+    return expr
+
+def batch_signal_layout(sig) -> Tuple:
+    """NumPy 批次解碼用的 (name, first_byte, n_bytes, shift, mask)，由 sig.start / sig.length / sig.byte_order 算出。
+
+    lsb < 0 的 Motorola signal 與純量 decode 相同：payload 之前的位元以負 index 繞回 payload 尾端。
+    這種 signal 多一個 wrap = (first_byte < 0, n_bytes, shift, bits)，描述繞回部分（值的低 bits 位元）；
+    前 5 欄只描述 bit 0 以上的部分（沒有時 n_bytes = 0）。"""
+    lsb, length = get_signal_bit_span(sig)
+    if lsb >= 0:
+        b0 = lsb // 8
+        nb = (lsb + length - 1) // 8 + 1 - b0 if length else 1
+        return sig.name, b0, nb, lsb - 8 * b0, (1 << length) - 1
+    wbits = min(-lsb, length)
+    wb0 = lsb // 8
+    wnb = (lsb + wbits - 1) // 8 + 1 - wb0
+    high = length - wbits
+    nb = (high - 1) // 8 + 1 if high else 0
+    return sig.name, 0, nb, 0, (1 << high) - 1, (wb0, wnb, lsb - 8 * wb0, wbits)
+
+def batch_extract(frames, layout, frame_len: int = 64) -> Dict:
+    """Vectorized bit-field extraction.
+
+    frames: (N, frame_len) uint8 array, or a bytes-like buffer / 1-D uint8 array of N concatenated frame_len-byte payloads.
+    layout: ((name, first_byte, n_bytes, shift, mask[, wrap]), ...)
+            wrap = (first_byte < 0, n_bytes, shift, bits): low bits taken from the end of the payload
+            (negative byte index, same as the scalar decoder); the first five fields then give the bits above them.
+    Returns {signal_name: np.ndarray} with one column per signal (raw unsigned values).
+    """
+    import numpy as np
+    if isinstance(frames, np.ndarray) and frames.ndim >= 2:
+        arr = frames.reshape(-1, frames.shape[-1]) if frames.ndim > 2 else frames
+    else:
+        # 串接的 payload：1-D 陣列與 bytes 一樣依 frame_len 切成 N 列
+        arr = frames if isinstance(frames, np.ndarray) else np.frombuffer(frames, dtype=np.uint8)
+        if arr.size % frame_len:
+            raise ValueError(f"buffer of {arr.size} bytes is not a multiple of frame_len={frame_len}")
+        arr = arr.reshape(-1, frame_len)
+    arr = arr.astype(np.uint8, copy=False)
+    orig = arr
+    need = max((e[1] + e[2] for e in layout), default=0)
+    width = max(need, 8)
+    if arr.shape[1] < width:
+        padded = np.zeros((arr.shape[0], width), dtype=np.uint8)
+        padded[:, :arr.shape[1]] = arr
+        arr = padded
+
+    def field(src, b0, nb, shift, mask):
+        if nb == 0:
+            return np.zeros(src.shape[0], dtype=np.uint64)
+        if nb == 1:
+            v = src[:, b0].astype(np.uint64)
+        else:
+            # 取 8 bytes 以 little-endian uint64 一次組起來（超出 payload 的部分補 0）
+            word = np.zeros((src.shape[0], 8), dtype=np.uint8)
+            take = min(nb, 8)
+            word[:, :take] = src[:, b0:b0 + take]
+            v = word.view("<u8")[:, 0]
+        v = v >> np.uint64(shift)
+        if nb > 8:  # shift + length > 64：第 9 個 byte 補上高位
+            v = v | (src[:, b0 + 8].astype(np.uint64) << np.uint64(64 - shift))
+        return v & np.uint64(mask)
+
+    out = {}
+    for name, b0, nb, shift, mask, *wrap in layout:
+        v = field(arr, b0, nb, shift, mask)
+        bits = mask.bit_length()
+        if wrap:
+            # 負 index 繞回原始 payload 尾端（與純量 decode 的 data[byte_i] 相同；payload 比繞回範圍短時 IndexError）
+            wb0, wnb, wshift, wbits = wrap[0]
+            n = orig.shape[1]
+            if n + wb0 < 0:
+                raise IndexError(f"{name}: payload of {n} bytes is too short for byte index {wb0}")
+            v = field(orig[:, n + wb0:n + wb0 + wnb], 0, wnb, wshift, (1 << wbits) - 1) | (v << np.uint64(wbits))
+            bits += wbits
+        dtype = np.uint8 if bits <= 8 else np.uint16 if bits <= 16 else np.uint32 if bits <= 32 else np.uint64
+        out[name] = v.astype(dtype)
+    return out
+
+def _num_literal(x) -> str:
+    """把 scale/offset 轉成 Python 字面量；整數值就輸出整數，避免不必要的 float 運算。"""
+    x = float(x)
+    return str(int(x)) if x.is_integer() else repr(x)
+
+def needs_physical(sig) -> bool:
+    """signal 在 physical 模式下是否需要轉換（sign / float / scale / offset 任一）。"""
+    return bool(getattr(sig, "is_float", False) or getattr(sig, "is_signed", False)
+                or float(getattr(sig, "scale", 1) or 1) != 1.0 or float(getattr(sig, "offset", 0) or 0) != 0.0)
+
+def physical_is_float(sig) -> bool:
+    return bool(getattr(sig, "is_float", False)) or not float(sig.scale).is_integer() or not float(sig.offset).is_integer()
+
+def physical_default(sig) -> str:
+    """raw = 0 對應的 physical 值（dataclass 預設值）：0 * scale + offset = offset；IEEE float 的 raw 0 也是 0.0。"""
+    offset = float(sig.offset)
+    return repr(offset) if physical_is_float(sig) else _num_literal(offset)
+
+def physical_decode_expr(sig, raw: str) -> str:
+    """raw (unsigned int) → physical：two's complement 符號延伸、IEEE float、scale/offset，常數於產生時摺疊。"""
+    if not needs_physical(sig):
+        return raw
+    length = sig.length
+    if getattr(sig, "is_float", False):
+        fmt = "_F32" if length == 32 else "_F64"
+        val = f"{fmt}.unpack({raw}.to_bytes({length // 8}, 'little'))[0]"
+    elif getattr(sig, "is_signed", False):
+        sign = f"0x{1 << (length - 1):X}"
+        val = f"(({raw} ^ {sign}) - {sign})"
+    else:
+        val = raw
+    scale, offset = float(sig.scale), float(sig.offset)
+    if scale != 1.0:
+        val = f"{val} * {_num_literal(scale)}"
+    if offset > 0:
+        val = f"{val} + {_num_literal(offset)}"
+    elif offset < 0:
+        val = f"{val} - {_num_literal(-offset)}"
+    return f"({val})" if val != raw else val
+
+def physical_encode_expr(sig, value: str) -> str:
+    """physical → raw int；負值交給之後的 & mask 轉成 two's complement。"""
+    if not needs_physical(sig):
+        return value
+    scale, offset = float(sig.scale), float(sig.offset)
+    v = value
+    if offset != 0.0:
+        v = f"({v} - {_num_literal(offset)})"
+    if scale != 1.0:
+        v = f"{v} / {_num_literal(scale)}"
+    if getattr(sig, "is_float", False):
+        fmt = "_F32" if sig.length == 32 else "_F64"
+        return f"int.from_bytes({fmt}.pack({v}), 'little')"
+    if v != value:
+        return f"round({v})"
+    return value
+
+def batch_apply_physical(cols: Dict, conv) -> Dict:
+    """Apply sign extension / IEEE float / scale+offset to whole columns (no per-value boxing).
+
+    conv: ((name, length, is_signed, is_float, scale, offset), ...) — only signals that need conversion.
+    """
+    import numpy as np
+    for name, length, is_signed, is_float, scale, offset in conv:
+        v = cols[name]
+        if is_float:
+            v = v.astype(np.uint32).view(np.float32) if length == 32 else v.astype(np.uint64).view(np.float64)
+        elif is_signed:
+            sign = np.int64(1 << (length - 1))
+            v = (v.astype(np.int64) ^ sign) - sign if length < 64 else v.astype(np.uint64).view(np.int64)
+        if scale != 1 or offset != 0:
+            v = v * np.float64(scale) + np.float64(offset)
+        cols[name] = v
+    return cols
+
+def signal_bytes(sig) -> List[int]:
+    """signal 用到的 byte index。
+
+    lsb < 0 的 Motorola 位元保留負 index：bitloop 以 data[byte_i] 讀取，實際落在哪個 byte
+    取決於執行時的 len(data)（8-byte DLC 或補到 64 byte 的 payload 會不同），不能在產生時換算。
+    """
+    lsb, length = get_signal_bit_span(sig)
+    return sorted({pos // 8 for pos in range(lsb, lsb + length)})
+
+def decode_changed_signals(prev: bytes, data: bytes, byte_signals, decoders, wrap_signals=()) -> Dict:
+    """Decode only the signals whose bytes differ between prev and data.
+
+    byte_signals: tuple indexed by byte -> tuple of signal names using that byte
+    decoders: {signal_name: callable(data) -> value}
+    wrap_signals: ((negative byte index, signal names), ...) resolved against len(data)
+    """
+    if len(prev) != len(data):
+        return {name: dec(data) for name, dec in decoders.items()}
+    diff = int.from_bytes(prev, 'little') ^ int.from_bytes(data, 'little')
+    if not diff:
+        return {}
+    names = set()
+    for b, wrapped in wrap_signals:
+        b += len(data)
+        if b >= 0 and (diff >> (b * 8)) & 0xFF:
+            names.update(wrapped)
+    n = len(byte_signals)
+    while diff:
+        b = ((diff & -diff).bit_length() - 1) >> 3  # 最低的變動 byte
+        if b < n:
+            names.update(byte_signals[b])
+        diff >>= (b + 1) * 8
+        diff <<= (b + 1) * 8
+    return {name: decoders[name](data) for name in names}
+
+def patch_payload(prev_values: Dict, prev_payload: bytes, values: Dict, patchers) -> Optional[bytes]:
+    """Re-encode a message by patching only the changed signals into its previous payload.
+
+    patchers: {signal_name: (clear_mask, default, insert(value) -> int)} — bits must not overlap
+    Signals dropped from values go back to their default. Returns None when more than half
+    of the signals changed (a full encode is cheaper then).
+    """
+    changed = [k for k, v in values.items() if k in patchers and (k not in prev_values or prev_values[k] != v)]
+    reverted = [k for k in prev_values if k not in values and k in patchers]
+    if len(changed) + len(reverted) > len(patchers) // 2:
+        return None
+    acc = int.from_bytes(prev_payload, 'little')
+    for k in changed:
+        mask, _, insert = patchers[k]
+        acc = (acc & ~mask) | insert(values[k])
+    for k in reverted:
+        mask, default, insert = patchers[k]
+        acc = (acc & ~mask) | insert(default)
+    return acc.to_bytes(len(prev_payload), 'little')
+
 GEN_FILE_RE = re.compile(r"^generate_0x[0-9A-Fa-f]+\.py$")
+MANIFEST_NAME = "generated_manifest.json"
 def clean_output_dir(out_dir: str) -> None:
-    """只刪掉我們產的 generate_0x*.py 跟 generated_index.py"""
+    """只刪掉我們產的 generate_0x*.py、generated_index.py 跟 generated_manifest.json"""
     if not os.path.isdir(out_dir):
         return
     for name in os.listdir(out_dir):
-        if GEN_FILE_RE.match(name) or name == "generated_index.py":
+        if GEN_FILE_RE.match(name) or name in ("generated_index.py", MANIFEST_NAME):
             os.remove(os.path.join(out_dir, name))
             
 def write_generated_index(output_dir: str) -> None:
     """
-    掃 output_dir 裡所有 generate_0x*.py，產生 generated_index.py
+    掃 output_dir 裡所有 generate_0x*.py，產生 generated_index.py（lazy import）
     內容會是：
-        from . import generate_0x117 as can_0x117
-        from . import generate_0x210 as can_0x210
-        ...
+        MODULES = {0x117: "generate_0x117", 0x210: "generate_0x210", ...}
         __all__ = ["can_0x117", "can_0x210", ...]
+        def module_for_id(frame_id): ...   # frame ID -> 模組（第一次用到才 import）
+        def __getattr__(name): ...         # generated_index.can_0x117 第一次存取才 import
+    import generated_index 本身不會載入任何 generate_0x*.py（及其 IntEnum）。
     """
     pattern = re.compile(r"^generate_0x([0-9A-Fa-f]+)\.py$")
     entries = []
@@ -81,38 +339,73 @@ def write_generated_index(output_dir: str) -> None:
         can_id_hex = m.group(1).upper()  # 讓名稱一致用大寫
         mod_name = f"generate_0x{can_id_hex}"
         alias = f"can_0x{can_id_hex}"
-        entries.append((mod_name, alias))
+        entries.append((int(can_id_hex, 16), mod_name, alias))
 
     if not entries:
         return  # 沒有檔就不寫
 
-    lines = []
-    for mod_name, alias in entries:
-        lines.append(f"from . import {mod_name} as {alias}")
-    all_names = ", ".join(f'"{alias}"' for _, alias in entries)
-    lines.append("")
+    lines = ['"""自動產生：generate_0x*.py 的索引，模組於第一次使用時才 import。"""', "import importlib", ""]
+    lines.append("MODULES = {")
+    for fid, mod_name, _ in entries:
+        lines.append(f'    0x{fid:X}: "{mod_name}",')
+    lines.append("}")
+    lines.append("_ALIASES = {")
+    for _, mod_name, alias in entries:
+        lines.append(f'    "{alias}": "{mod_name}",')
+    lines.append("}")
+    all_names = ", ".join(f'"{alias}"' for _, _, alias in entries)
     lines.append(f"__all__ = [{all_names}]")
-    lines.append("")
+    lines += [
+        "",
+        "",
+        "def _load(mod_name):",
+        "    if __package__:",
+        '        return importlib.import_module(f".{mod_name}", __package__)',
+        "    return importlib.import_module(mod_name)",
+        "",
+        "",
+        "def frame_ids():",
+        "    return list(MODULES)",
+        "",
+        "",
+        "def module_for_id(frame_id):",
+        '    """frame ID -> generate_0x<ID> 模組（未產生的 ID 回傳 None）。"""',
+        "    mod_name = MODULES.get(frame_id)",
+        "    if mod_name is None:",
+        "        return None",
+        "    return _load(mod_name)",
+        "",
+        "",
+        "def __getattr__(name):",
+        "    mod_name = _ALIASES.get(name)",
+        "    if mod_name is None:",
+        '        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")',
+        "    mod = _load(mod_name)",
+        "    globals()[name] = mod  # 之後直接命中，不再經過 __getattr__",
+        "    return mod",
+        "",
+        "",
+        "def __dir__():",
+        "    return sorted(set(globals()) | set(_ALIASES))",
+        "",
+    ]
 
     index_path = os.path.join(output_dir, "generated_index.py")
+    content = "\n".join(lines)
+    if os.path.exists(index_path):
+        with open(index_path, "r", encoding="utf-8") as f:
+            if f.read() == content:
+                return  # 檔案集合沒變就不重寫，避免 import 端 .pyc 失效
     with open(index_path, "w", encoding="utf-8") as f:
-        f.write("\n".join(lines))
+        f.write(content)
 
 # ========================= Generator ========================= #
 
-def generate_can_msg_py(dbc_path: str, target_id: int, output_dir: str = ".", debug: bool = False, strict: bool = False, filename_prefix: str = ""):
-    db = cantools.database.load_file(dbc_path)
-    msg = next((m for m in db.messages if m.frame_id == target_id), None)
-    if msg is None:
-        raise ValueError(f"❌ 找不到 message ID=0x{target_id:X} 於 {dbc_path}")
-
-    dbc_name = os.path.basename(dbc_path)
-    match = re.search(r"(\d{8})", dbc_name)
-    version_info = match.group(1) if match else "unknown_version"
-    
-    output_file = os.path.join(output_dir, f"{filename_prefix}generate_0x{target_id:X}.py")
-
-    lines: List[str] = []
+def _emit_prelude(lines: List[str], dbc_name: str, version_info: str, strict: bool, batch: bool, physical: bool,
+                  need_struct: bool, shared_imports: bool = False) -> None:
+    """輸出產生檔開頭：標頭註解、import、to_enum / STRICT_ENUM 與共用 helper（getsource）。
+    shared_imports: IntEnum / dataclass 的 import 也在這裡輸出一次（單一模組模式）
+    """
     lines.append("# ================================================")
     lines.append("#  Auto-generated CAN Message Encoder/Decoder (with Enums)")
     lines.append(f"#  Source DBC : {dbc_name}")
@@ -120,7 +413,7 @@ def generate_can_msg_py(dbc_path: str, target_id: int, output_dir: str = ".", de
     lines.append(f"#  Generated  : {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     lines.append("# ================================================\n")
     # import module 
-    lines.append("from typing import Dict, List, Tuple")
+    lines.append("from typing import Dict, List, Optional, Tuple")
     lines.append("import re")
     lines.append("")
     
@@ -139,6 +432,28 @@ def generate_can_msg_py(dbc_path: str, target_id: int, output_dir: str = ".", de
     # emit helpers we depend on
     lines.append(inspect.getsource(sanitize_enum_member))
     lines.append(inspect.getsource(get_motorola_bit_positions))
+    lines.append(inspect.getsource(decode_changed_signals))
+    lines.append(inspect.getsource(patch_payload))
+    if batch:
+        lines.append(inspect.getsource(batch_extract))
+        if physical:
+            lines.append(inspect.getsource(batch_apply_physical))
+    if need_struct:
+        lines.append("import struct")
+        lines.append("_F32 = struct.Struct('<f')")
+        lines.append("_F64 = struct.Struct('<d')\n")
+    if shared_imports:
+        lines.append("from enum import IntEnum")
+        lines.append("from dataclasses import dataclass\n")
+
+def _emit_message(lines: List[str], msg, codegen: str = "bitloop", batch: bool = False, physical: bool = False,
+                  slots: bool = False, raw_enums: bool = False, renames: Optional[Dict[str, str]] = None,
+                  shared_imports: bool = False) -> Dict[str, Dict[int, str]]:
+    """輸出單一 message 的 Enum、常數、message 類別與各 encode/decode 函式，回傳 signal_enums。
+    renames: signal name -> 模組層級識別字用的名稱（Enum/常數），單一模組模式下同名 signal 避免互相覆蓋
+    """
+    renames = renames or {}
+    sym = lambda name: renames.get(name, name)
     # ===== Collect and emit ENUMS from value descriptions =====
     # Build a mapping: signal_name -> {value:int : label:str}
     signal_enums: Dict[str, Dict[int, str]] = {}
@@ -151,9 +466,10 @@ def generate_can_msg_py(dbc_path: str, target_id: int, output_dir: str = ".", de
             signal_enums[sig.name] = normalized
 
     if signal_enums:
-        lines.append("from enum import IntEnum\n")
+        if not shared_imports:
+            lines.append("from enum import IntEnum\n")
         for sig_name, mapping in signal_enums.items():
-            enum_name = f"{sig_name}Enum"
+            enum_name = f"{sym(sig_name)}Enum"
             lines.append(f"class {enum_name}(IntEnum):")
             # Preserve key order (sorted by numeric value)
             used_members = {}  # 用來記錄已經出現過的名稱
@@ -163,42 +479,90 @@ def generate_can_msg_py(dbc_path: str, target_id: int, output_dir: str = ".", de
                 member = unique_member_name(member, used_members)
                 lines.append(f"    {member} = {k}")
             lines.append("")
+        if not raw_enums:
+            # raw 值 → member 的查表，解碼時一次 dict 查詢就能轉型，不走 cls(value) + try/except
+            for sig_name in signal_enums:
+                enum_name = f"{sym(sig_name)}Enum"
+                lines.append(f"{enum_name}_LUT = {{int(m): m for m in {enum_name}}}")
+            lines.append("")
 
     # ===== Constants for bit layout =====
     lines.append(f"# Message: {msg.name} (ID=0x{msg.frame_id:X}, DLC={msg.length})\n")
     for sig in msg.signals:
-        lines.append(f"{sig.name}_OFFSET = {sig.start}")
-        lines.append(f"{sig.name}_LEN = {sig.length}")
-        lines.append(f"{sig.name}_BYTE_ORDER = '{sig.byte_order}'")
+        lines.append(f"{sym(sig.name)}_OFFSET = {sig.start}")
+        lines.append(f"{sym(sig.name)}_LEN = {sig.length}")
+        lines.append(f"{sym(sig.name)}_BYTE_ORDER = '{sig.byte_order}'")
+    lines.append(f"FRAME_LEN_0x{msg.frame_id:X} = {message_frame_len(msg)}  # payload bytes (DLC, or up to the last signal bit)")
     lines.append("")
 
-    # ===== Dataclass for message =====
-    lines.append("from dataclasses import dataclass\n")
-    lines.append(f"@dataclass\nclass canfd_0x{msg.frame_id:X}_msg:")
+    # ===== Dataclass (or __slots__ class) for message =====
+    fields: List[Tuple[str, str, str]] = []  # (name, type, default)
     for sig in msg.signals:
         if sig.name in signal_enums:
-            enum_name = f"{sig.name}Enum"
+            enum_name = f"{sym(sig.name)}Enum"
             # Default = smallest key
             default_key = sorted(signal_enums[sig.name].keys())[0]
             default_member = sanitize_enum_member(signal_enums[sig.name][default_key])
-            lines.append(f"    {sig.name}: {enum_name} = {enum_name}.{default_member}")
+            if raw_enums:
+                fields.append((sig.name, "int", str(default_key)))
+            else:
+                fields.append((sig.name, enum_name, f"{enum_name}.{default_member}"))
+        elif physical and needs_physical(sig):
+            ptype = "float" if physical_is_float(sig) else "int"
+            fields.append((sig.name, ptype, physical_default(sig)))
         else:
-            lines.append(f"    {sig.name}: int = 0")
-    lines.append("")
+            fields.append((sig.name, "int", "0"))
+    if slots:
+        # 沒有 per-instance __dict__，配置較省；介面與 dataclass 版相同（欄位、預設值、repr、==）
+        lines.append(f"class canfd_0x{msg.frame_id:X}_msg:")
+        lines.append(f"    __slots__ = ({''.join(f'{name!r}, ' for name, _, _ in fields)})")
+        lines.append("")
+        lines.append("    def __init__(self, " + ", ".join(f"{name}: {ptype} = {default}" for name, ptype, default in fields) + "):")
+        for name, _, _ in fields:
+            lines.append(f"        self.{name} = {name}")
+        if not fields:
+            lines.append("        pass")
+        lines.append("")
+        lines.append("    def __repr__(self):")
+        lines.append("        return f'{type(self).__name__}(' + ', '.join(f'{k}={getattr(self, k)!r}' for k in self.__slots__) + ')'")
+        lines.append("")
+        lines.append("    def __eq__(self, other):")
+        lines.append("        return type(other) is type(self) and all(getattr(self, k) == getattr(other, k) for k in self.__slots__)")
+        lines.append("")
+    else:
+        if not shared_imports:
+            lines.append("from dataclasses import dataclass\n")
+        lines.append(f"@dataclass\nclass canfd_0x{msg.frame_id:X}_msg:")
+        for name, ptype, default in fields:
+            lines.append(f"    {name}: {ptype} = {default}")
+        lines.append("")
 
     # ===== Encode function =====
     lines.append(f"def generate_0x{msg.frame_id:X}_can_msg_bytes(msg: canfd_0x{msg.frame_id:X}_msg, debug: bool = False) -> List[int]:")
-    lines.append("    data = bytearray(64)")
+    if codegen == "shiftmask":
+        lines.append("    acc = 0")
+    else:
+        lines.append("    data = bytearray(64)")
     for sig in msg.signals:
         lname = sig.name.lower()
         if sig.name in signal_enums:
             # cast enum to int when using
             lines.append(f"    {lname} = int(msg.{sig.name})")
+        elif physical:
+            lines.append(f"    {lname} = {physical_encode_expr(sig, f'msg.{sig.name}')}")
         else:
             lines.append(f"    {lname} = msg.{sig.name}")
-        lines.append(f"    if {sig.name}_BYTE_ORDER == 'little_endian':")
-        lines.append(f"        for i in range({sig.name}_LEN):")
-        lines.append(f"            bit_pos = {sig.name}_OFFSET + i")
+        if codegen == "shiftmask":
+            lsb, length = get_signal_bit_span(sig)
+            if lsb + length <= 0:
+                continue  # 全部落在 payload 之外，bitloop 也會整段略過
+            hi = lsb + length - 1
+            lines.append(f"    acc |= {shiftmask_insert_expr(lsb, length, lname)}")
+            lines.append(f"    if debug: print(f'Encode {sig.name}: bits {lsb}..{hi} ← {{{lname}}}')")
+            continue
+        lines.append(f"    if {sym(sig.name)}_BYTE_ORDER == 'little_endian':")
+        lines.append(f"        for i in range({sym(sig.name)}_LEN):")
+        lines.append(f"            bit_pos = {sym(sig.name)}_OFFSET + i")
         lines.append(f"            byte_i = bit_pos // 8")
         lines.append(f"            bit_i = bit_pos % 8")
         lines.append(f"            if ({lname} >> i) & 1:")
@@ -207,51 +571,226 @@ def generate_can_msg_py(dbc_path: str, target_id: int, output_dir: str = ".", de
         lines.append(f"                after = data[byte_i]")
         lines.append(f"                if debug: print(f'Encode {sig.name}: byte{{byte_i}} bit {{bit_i}} → {{before:#04x}} → {{after:#04x}}')")
         lines.append("    else:")
-        lines.append(f"        for i, (byte_i, bit_i) in enumerate(get_motorola_bit_positions({sig.name}_OFFSET, {sig.name}_LEN)):")
-        lines.append(f"            bit_val = ({lname} >> ({sig.name}_LEN - 1 - i)) & 1")
+        lines.append(f"        for i, (byte_i, bit_i) in enumerate(get_motorola_bit_positions({sym(sig.name)}_OFFSET, {sym(sig.name)}_LEN)):")
+        lines.append(f"            bit_val = ({lname} >> ({sym(sig.name)}_LEN - 1 - i)) & 1")
         lines.append(f"            if bit_val and 0 <= byte_i < len(data):")
         lines.append(f"                before = data[byte_i]")
         lines.append(f"                data[byte_i] |= (1 << bit_i)")
         lines.append(f"                after = data[byte_i]")
         lines.append(f"                if debug: print(f'Encode {sig.name}: byte{{byte_i}} bit {{bit_i}} → {{before:#04x}} → {{after:#04x}}')")
     lines.append("    # Materialize to bytes for stable printing/return")
-    lines.append("    outb = bytes(data)")
+    if codegen == "shiftmask":
+        lines.append("    outb = acc.to_bytes(64, 'little')")
+    else:
+        lines.append("    outb = bytes(data)")
     lines.append("    if debug:")
     lines.append("        print('[DEBUG] Encoded data bytes:', outb.hex(':'))")
     lines.append("        print('[DEBUG] Encoded data list:', list(outb))")
     lines.append("    return list(outb)\n")
 
     # ===== Decode function =====
+    def emit_decode_locals(with_debug: bool) -> List[str]:
+        """輸出把每個 signal 解到區域變數的敘述，回傳每個 signal 最終值的運算式（含 Enum 轉型）。"""
+        for sig in msg.signals:
+            if codegen == "shiftmask" and get_signal_bit_span(sig)[0] >= 0:
+                continue  # shiftmask 直接賦值，不需先歸零
+            lines.append(f"    {sig.name.lower()} = 0")
+        lines.append("")
+        for sig in msg.signals:
+            lname = sig.name.lower()
+            lsb, length = get_signal_bit_span(sig)
+            convert = physical and sig.name not in signal_enums
+            if codegen == "shiftmask" and lsb >= 0:
+                raw = shiftmask_extract_expr(lsb, length)
+                lines.append(f"    {lname} = {physical_decode_expr(sig, raw) if convert else raw}")
+                if with_debug:
+                    lines.append(f"    if debug: print(f'Decode {sig.name}: bits {lsb}..{lsb + length - 1} → {{{lname}}}')")
+                    lines.append("")
+                continue
+            # lsb < 0 的 Motorola signal 在 bitloop 會用到負 index（繞回 payload 尾端），保留原迴圈確保結果一致
+            lines.append(f"    if {sym(sig.name)}_BYTE_ORDER == 'little_endian':")
+            lines.append(f"        for i in range({sym(sig.name)}_LEN):")
+            lines.append(f"            bit_pos = {sym(sig.name)}_OFFSET + i")
+            lines.append(f"            byte_i = bit_pos // 8")
+            lines.append(f"            bit_i = bit_pos % 8")
+            lines.append(f"            if (data[byte_i] >> bit_i) & 1:")
+            lines.append(f"                {lname} |= (1 << i)")
+            if with_debug:
+                lines.append(f"                if debug: print(f'Decode {sig.name}: byte={{byte_i}}, bit={{bit_i}}, val=1')")
+            lines.append("    else:")
+            lines.append(f"        for i, (byte_i, bit_i) in enumerate(get_motorola_bit_positions({sym(sig.name)}_OFFSET, {sym(sig.name)}_LEN)):")
+            lines.append(f"            if (data[byte_i] >> bit_i) & 1:")
+            lines.append(f"                {lname} |= (1 << ({sym(sig.name)}_LEN - 1 - i))")
+            if with_debug:
+                lines.append(f"                if debug: print(f'Decode {sig.name}: byte={{byte_i}}, bit={{bit_i}}, val=1')")
+            if convert and needs_physical(sig):
+                lines.append(f"    {lname} = {physical_decode_expr(sig, lname)}")
+            lines.append("")
+        # Final values with proper Enum if available
+        values: List[str] = []
+        for sig in msg.signals:
+            lname = sig.name.lower()
+            if sig.name in signal_enums and not raw_enums:
+                lut = f"{sym(sig.name)}Enum_LUT"
+                # 已知值查表；未知值才走 to_enum（STRICT_ENUM hook）
+                values.append(f"({lut}[{lname}] if {lname} in {lut} else to_enum({sym(sig.name)}Enum, {lname}, STRICT_ENUM))")
+            else:
+                values.append(lname)
+        return values
+
     lines.append(f"def decode_0x{msg.frame_id:X}_can_msg(data: bytes, debug: bool = False) -> canfd_0x{msg.frame_id:X}_msg:")
+    ctor_args = emit_decode_locals(with_debug=True)
+    lines.append(f"    return canfd_0x{msg.frame_id:X}_msg({', '.join(ctor_args)})\n")
+
+    # 直接回傳 dict，省掉 adapter 再走訪 dataclass 欄位複製一次
+    lines.append(f"def decode_0x{msg.frame_id:X}_to_dict(data: bytes) -> Dict[str, object]:")
+    values = emit_decode_locals(with_debug=False)
+    lines.append("    return {")
+    for sig, val in zip(msg.signals, values):
+        lines.append(f"        {sig.name!r}: {val},")
+    lines.append("    }\n")
+
+    # 就地填入既有的 message 物件或 dict，不另外配置
+    lines.append(f"def decode_0x{msg.frame_id:X}_can_msg_into(data: bytes, out):")
+    lines.append("    \"\"\"Decode into an existing canfd message object (or dict) in place and return it.\"\"\"")
+    values = emit_decode_locals(with_debug=False)
+    lines.append("    if isinstance(out, dict):")
+    for sig, val in zip(msg.signals, values):
+        lines.append(f"        out[{sig.name!r}] = {val}")
+    lines.append("    else:")
+    for sig, val in zip(msg.signals, values):
+        lines.append(f"        out.{sig.name} = {val}")
+    lines.append("    return out\n")
+
+    # ===== Changed-signals-only decode =====
+    fid = f"0x{msg.frame_id:X}"
+    byte_map: Dict[int, List[str]] = {}
+    wrap_map: Dict[int, List[str]] = {}
     for sig in msg.signals:
-        lines.append(f"    {sig.name.lower()} = 0")
-    lines.append("")
+        for b in signal_bytes(sig):
+            (byte_map if b >= 0 else wrap_map).setdefault(b, []).append(sig.name)
+    n_bytes = max(byte_map) + 1 if byte_map else 0
+    lines.append(f"# byte index -> signals using that byte (for decode_{fid}_changed)")
+    lines.append(f"BYTE_SIGNALS_{fid} = (")
+    for b in range(n_bytes):
+        names = byte_map.get(b, [])
+        lines.append(f"    ({''.join(f'{name!r}, ' for name in names)}),  # byte {b}")
+    lines.append(")\n")
+    wrap_arg = ""
+    if wrap_map:
+        # lsb < 0 的 Motorola 位元：負 byte index，decode_changed_signals 依 len(data) 換算
+        lines.append(f"WRAP_SIGNALS_{fid} = (")
+        for b in sorted(wrap_map):
+            lines.append(f"    ({b}, ({''.join(f'{name!r}, ' for name in wrap_map[b])})),")
+        lines.append(")\n")
+        wrap_arg = f", WRAP_SIGNALS_{fid}"
+    lines.append(f"SIGNAL_DECODERS_{fid} = {{")
     for sig in msg.signals:
-        lname = sig.name.lower()
-        lines.append(f"    if {sig.name}_BYTE_ORDER == 'little_endian':")
-        lines.append(f"        for i in range({sig.name}_LEN):")
-        lines.append(f"            bit_pos = {sig.name}_OFFSET + i")
-        lines.append(f"            byte_i = bit_pos // 8")
-        lines.append(f"            bit_i = bit_pos % 8")
-        lines.append(f"            if (data[byte_i] >> bit_i) & 1:")
-        lines.append(f"                {lname} |= (1 << i)")
-        lines.append(f"                if debug: print(f'Decode {sig.name}: byte={{byte_i}}, bit={{bit_i}}, val=1')")
-        lines.append("    else:")
-        lines.append(f"        for i, (byte_i, bit_i) in enumerate(get_motorola_bit_positions({sig.name}_OFFSET, {sig.name}_LEN)):")
-        lines.append(f"            if (data[byte_i] >> bit_i) & 1:")
-        lines.append(f"                {lname} |= (1 << ({sig.name}_LEN - 1 - i))")
-        lines.append(f"                if debug: print(f'Decode {sig.name}: byte={{byte_i}}, bit={{bit_i}}, val=1')")
-        lines.append("")
-    # Construct dataclass with proper Enum if available
-    ctor_args: List[str] = []
+        lsb, length = get_signal_bit_span(sig)
+        if lsb < 0:
+            # 與完整解碼保持一致（bitloop 負 index 行為），少見，直接借用 to_dict
+            lines.append(f"    {sig.name!r}: lambda data: decode_{fid}_to_dict(data)[{sig.name!r}],")
+            continue
+        val = shiftmask_extract_expr(lsb, length)
+        if physical and sig.name not in signal_enums:
+            val = physical_decode_expr(sig, val)
+        if sig.name in signal_enums and not raw_enums:
+            lut = f"{sym(sig.name)}Enum_LUT"
+            val = f"({lut}[v] if (v := {val}) in {lut} else to_enum({sym(sig.name)}Enum, v, STRICT_ENUM))"
+        lines.append(f"    {sig.name!r}: lambda data: {val},")
+    lines.append("}\n")
+    lines.append(f"def decode_{fid}_changed(prev: bytes, data: bytes) -> Dict[str, object]:")
+    lines.append("    \"\"\"Decode only the signals whose bytes changed since prev (empty dict if identical).\"\"\"")
+    lines.append(f"    return decode_changed_signals(prev, data, BYTE_SIGNALS_{fid}, SIGNAL_DECODERS_{fid}{wrap_arg})\n")
+
+    # ===== Last-frame patch table (patch_payload) =====
+    defaults = {name: default for name, _, default in fields}
+    patch_lines: List[str] = []
+    used = 0
     for sig in msg.signals:
+        lsb, length = get_signal_bit_span(sig)
+        if lsb + length <= 0:
+            continue  # 全部落在 payload 之外，編碼時也整段略過
+        lo = max(lsb, 0)
+        mask = ((1 << (lsb + length - lo)) - 1) << lo
+        if used & mask:
+            patch_lines = []  # signal 位元重疊（multiplex 等）：patch 與完整編碼的 OR 結果不同，不提供
+            break
+        used |= mask
+        # 與 generate_*_can_msg_bytes 相同的值轉換
         if sig.name in signal_enums:
-            enum_name = f"{sig.name}Enum"
-            # STRICT_ENUM hook
-            ctor_args.append(f"to_enum({enum_name}, {sig.name.lower()}, STRICT_ENUM)")
+            value = "int(v)"
+        elif physical:
+            value = physical_encode_expr(sig, "v")
         else:
-            ctor_args.append(f"{sig.name.lower()}")
-    lines.append(f"    return canfd_0x{msg.frame_id:X}_msg({', '.join(ctor_args)})\n")
+            value = "v"
+        patch_lines.append(f"    {sig.name!r}: (0x{mask:X}, {defaults[sig.name]}, lambda v: {shiftmask_insert_expr(lsb, length, value)}),")
+    lines.append(f"# signal -> (clear_mask, default, insert) for patch_payload (None: signal bits overlap)")
+    if patch_lines:
+        lines.append(f"SIGNAL_PATCHERS_{fid} = {{")
+        lines.extend(patch_lines)
+        lines.append("}\n")
+    else:
+        lines.append(f"SIGNAL_PATCHERS_{fid} = None\n")
+
+    # ===== Batch (NumPy) decoder =====
+    if batch:
+        lines.append("# (name, first_byte, n_bytes, shift, mask[, wrap]) for batch_extract")
+        lines.append(f"BATCH_LAYOUT_{fid} = (")
+        for sig in msg.signals:
+            name, b0, nb, shift, mask, *wrap = batch_signal_layout(sig)
+            extra = f", {wrap[0]!r}" if wrap else ""
+            lines.append(f"    ({name!r}, {b0}, {nb}, {shift}, 0x{mask:X}{extra}),")
+        lines.append(")\n")
+        if physical:
+            lines.append("# (name, length, is_signed, is_float, scale, offset) for batch_apply_physical")
+            lines.append(f"PHYSICAL_LAYOUT_{fid} = (")
+            for sig in msg.signals:
+                if sig.name in signal_enums or not needs_physical(sig):
+                    continue
+                lines.append(f"    ({sig.name!r}, {sig.length}, {bool(sig.is_signed)}, {bool(sig.is_float)}, "
+                             f"{_num_literal(sig.scale)}, {_num_literal(sig.offset)}),")
+            lines.append(")\n")
+            lines.append(f"def decode_{fid}_batch(frames, frame_len: int = 64) -> Dict:")
+            lines.append(f"    \"\"\"Decode N frames at once: (N, frame_len) uint8 array or concatenated payload buffer -> {{signal: np.ndarray}} (physical values).\"\"\"")
+            lines.append(f"    return batch_apply_physical(batch_extract(frames, BATCH_LAYOUT_{fid}, frame_len), PHYSICAL_LAYOUT_{fid})\n")
+        else:
+            lines.append(f"def decode_{fid}_batch(frames, frame_len: int = 64) -> Dict:")
+            lines.append(f"    \"\"\"Decode N frames at once: (N, frame_len) uint8 array or concatenated payload buffer -> {{signal: np.ndarray}} (raw values).\"\"\"")
+            lines.append(f"    return batch_extract(frames, BATCH_LAYOUT_{fid}, frame_len)\n")
+    return signal_enums
+
+def generate_can_msg_py(dbc_path: str, target_id: int, output_dir: str = ".", debug: bool = False, strict: bool = False, filename_prefix: str = "",
+                        codegen: str = "bitloop", db=None, batch: bool = False, physical: bool = False,
+                        slots: bool = False, raw_enums: bool = False) -> str:
+    """codegen:
+    - "bitloop"  : 逐 bit 迴圈編解碼（原本的輸出）
+    - "shiftmask": 產生時就把每個 signal 的位置算好，輸出 int.from_bytes + shift/mask 的直線程式碼，結果與 bitloop 逐位元組相同
+    db: 已載入的 cantools Database；沒給才會重新 load dbc_path
+    batch: 另外輸出 NumPy 批次解碼 decode_0x<ID>_batch(frames)（numpy 於呼叫時才 import）
+    physical: 非 Enum 的 signal 以物理值編解碼（符號延伸、IEEE float、scale/offset 於產生時摺疊進運算式）
+    slots: message 類別改用 __slots__（無 per-instance __dict__），取代 @dataclass
+    raw_enums: 解碼不轉成 IntEnum，Enum signal 直接回傳 raw int（Enum 類別仍會輸出供比較用）
+    回傳產生的檔案路徑
+    """
+    if codegen not in CODEGEN_MODES:
+        raise ValueError(f"❌ 不支援的 codegen 模式: {codegen} (可用: {', '.join(CODEGEN_MODES)})")
+    if db is None:
+        db = cantools.database.load_file(dbc_path)
+    msg = next((m for m in db.messages if m.frame_id == target_id), None)
+    if msg is None:
+        raise ValueError(f"❌ 找不到 message ID=0x{target_id:X} 於 {dbc_path}")
+
+    dbc_name = os.path.basename(dbc_path)
+    match = re.search(r"(\d{8})", dbc_name)
+    version_info = match.group(1) if match else "unknown_version"
+    
+    output_file = os.path.join(output_dir, f"{filename_prefix}generate_0x{target_id:X}.py")
+
+    lines: List[str] = []
+    need_struct = physical and any(getattr(sig, "is_float", False) for sig in msg.signals)
+    _emit_prelude(lines, dbc_name, version_info, strict, batch, physical, need_struct)
+    signal_enums = _emit_message(lines, msg, codegen, batch, physical, slots, raw_enums)
 
     # === sample code ===
     lines.append("if __name__ == '__main__':")
@@ -280,6 +819,229 @@ def generate_can_msg_py(dbc_path: str, target_id: int, output_dir: str = ".", de
     print(f"   來源 DBC : {dbc_name}")
     print(f"   Message  : {msg.name} (ID=0x{msg.frame_id:X})")
     print(f"   Signals  : {[sig.name for sig in msg.signals]}")
+    return output_file
+
+# ---------------------------------------------------------
+# --single-module：整份 DBC 輸出成一支模組（共用 helper 只出現一次）
+# ---------------------------------------------------------
+def generate_single_module_py(dbc_path: str, output_dir: str = ".", strict: bool = False, filename_prefix: str = "",
+                              codegen: str = "bitloop", db=None, batch: bool = False, physical: bool = False,
+                              slots: bool = False, raw_enums: bool = False) -> str:
+    """
+    產生 <prefix>generate_<DBC檔名>.py：prelude（to_enum、helper、import）只輸出一次，接著每個 message 的
+    Enum / 類別 / encode / decode（名稱與單檔模式相同），最後是以 frame ID 為 key 的 dispatch：
+        DECODERS = {0x117: decode_0x117_to_dict, ...}      # data -> {signal: value}
+        ENCODERS = {0x117: encode_0x117_from_dict, ...}    # {signal: value} -> bytes
+    並附 parse_frame / parse_changed / encode_signals，可直接當 can_sim_server_zlg 的 --parser-mod。
+    不同 message 內同名的 signal，其 Enum / 常數名稱加上 _0x<ID> 後綴避免互相覆蓋。
+    回傳產生的檔案路徑
+    """
+    if codegen not in CODEGEN_MODES:
+        raise ValueError(f"❌ 不支援的 codegen 模式: {codegen} (可用: {', '.join(CODEGEN_MODES)})")
+    if db is None:
+        db = cantools.database.load_file(dbc_path)
+    messages = sorted(db.messages, key=lambda m: m.frame_id)
+
+    dbc_name = os.path.basename(dbc_path)
+    match = re.search(r"(\d{8})", dbc_name)
+    version_info = match.group(1) if match else "unknown_version"
+    stem = re.sub(r"\W+", "_", os.path.splitext(dbc_name)[0])
+    output_file = os.path.join(output_dir, f"{filename_prefix}generate_{stem}.py")
+
+    name_count: Dict[str, int] = {}
+    for msg in messages:
+        for sig in msg.signals:
+            name_count[sig.name] = name_count.get(sig.name, 0) + 1
+
+    lines: List[str] = []
+    need_struct = physical and any(getattr(sig, "is_float", False) for msg in messages for sig in msg.signals)
+    _emit_prelude(lines, dbc_name, version_info, strict, batch, physical, need_struct, shared_imports=True)
+    for msg in messages:
+        fid = f"0x{msg.frame_id:X}"
+        renames = {sig.name: f"{sig.name}_{fid}" for sig in msg.signals if name_count[sig.name] > 1}
+        lines.append(f"# {'=' * 48}")
+        lines.append(f"# {msg.name} ({fid})")
+        lines.append(f"# {'=' * 48}\n")
+        _emit_message(lines, msg, codegen, batch, physical, slots, raw_enums, renames=renames, shared_imports=True)
+        lines.append(f"SIGNALS_{fid} = frozenset(({''.join(f'{sig.name!r}, ' for sig in msg.signals)}))\n")
+        lines.append(f"def encode_{fid}_from_dict(values: Dict[str, object]) -> bytes:")
+        lines.append("    \"\"\"Encode from {signal: value}; signals not in this message are ignored, missing ones use defaults.\"\"\"")
+        lines.append(f"    msg = canfd_{fid}_msg(**{{k: v for k, v in values.items() if k in SIGNALS_{fid}}})")
+        lines.append(f"    return bytes(generate_{fid}_can_msg_bytes(msg))\n")
+
+    # ===== frame ID dispatch =====
+    lines.append("# frame ID -> codec，RX 路徑一次 dict 查詢即可分派")
+    for table, func in (("DECODERS", "decode_{}_to_dict"), ("CHANGED_DECODERS", "decode_{}_changed"),
+                        ("ENCODERS", "encode_{}_from_dict")):
+        lines.append(f"{table} = {{")
+        for msg in messages:
+            lines.append(f"    0x{msg.frame_id:X}: {func.format(f'0x{msg.frame_id:X}')},")
+        lines.append("}\n")
+    owners: Dict[str, List[int]] = {}
+    for msg in messages:
+        for sig in msg.signals:
+            owners.setdefault(sig.name, []).append(msg.frame_id)
+    lines.append("# signal name -> frame IDs that carry it")
+    lines.append("SIGNAL_OWNERS = {")
+    for name, fids in owners.items():
+        lines.append(f"    {name!r}: ({''.join(f'0x{f:X}, ' for f in fids)}),")
+    lines.append("}\n")
+    lines += [
+        "def parse_frame(can_id: int, data: bytes) -> Dict[str, object]:",
+        "    dec = DECODERS.get(can_id)",
+        "    return dec(data) if dec is not None else {}",
+        "",
+        "def parse_changed(can_id: int, prev: bytes, data: bytes) -> Dict[str, object]:",
+        "    dec = CHANGED_DECODERS.get(can_id)",
+        "    return dec(prev, data) if dec is not None else {}",
+        "",
+        "def encode_signals(updates: Dict[str, object]) -> List[Tuple[int, bytes]]:",
+        "    \"\"\"Encode only the messages that carry one of the updated signals.\"\"\"",
+        "    targets: List[int] = []",
+        "    for name in updates:",
+        "        for fid in SIGNAL_OWNERS.get(name, ()):",
+        "            if fid not in targets:",
+        "                targets.append(fid)",
+        "    return [(fid, ENCODERS[fid](updates)) for fid in targets]",
+        "",
+    ]
+
+    with open(output_file, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines))
+
+    print(f"✅ 已生成 {output_file}")
+    print(f"   來源 DBC : {dbc_name}")
+    print(f"   Messages : {len(messages)}")
+    return output_file
+
+# ---------------------------------------------------------
+# --id all：DBC 只解析一次、process pool 平行產生、manifest 記錄 hash 做增量
+# ---------------------------------------------------------
+_generator_hash = None
+def _get_generator_hash() -> str:
+    """產生器本身的 hash；產生器改版時所有 message 都要重產。"""
+    global _generator_hash
+    if _generator_hash is None:
+        with open(__file__, "rb") as f:
+            _generator_hash = hashlib.sha256(f.read()).hexdigest()
+    return _generator_hash
+
+def message_fingerprint(msg, dbc_name: str, options: Dict) -> str:
+    """message 定義（含所有 signal 屬性）+ 產生選項 + 產生器版本 的 sha256。"""
+    signals = []
+    for sig in msg.signals:
+        choices = getattr(sig, "choices", None) or getattr(sig, "value_descriptions", None)
+        signals.append({
+            "name": sig.name,
+            "start": sig.start,
+            "length": sig.length,
+            "byte_order": sig.byte_order,
+            "is_signed": bool(getattr(sig, "is_signed", False)),
+            "is_float": bool(getattr(sig, "is_float", False)),
+            "scale": getattr(sig, "scale", 1),
+            "offset": getattr(sig, "offset", 0),
+            "minimum": getattr(sig, "minimum", None),
+            "maximum": getattr(sig, "maximum", None),
+            "choices": {str(int(k)): str(v) for k, v in dict(choices).items()} if choices else None,
+        })
+    definition = {
+        "name": msg.name,
+        "frame_id": msg.frame_id,
+        "length": msg.length,
+        "signals": signals,
+        "dbc_name": dbc_name,
+        "options": options,
+        "generator": _get_generator_hash(),
+    }
+    blob = json.dumps(definition, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(blob).hexdigest()
+
+def load_manifest(output_dir: str) -> Dict:
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}  # 壞掉的 manifest 當成沒有，全部重產
+    return data.get("messages", {}) if isinstance(data, dict) else {}
+
+def save_manifest(output_dir: str, entries: Dict) -> None:
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"messages": entries}, f, indent=2, sort_keys=True)
+
+_WORKER_DB = None
+def _init_worker(dbc_path: str) -> None:
+    """Process pool initializer：fork 時直接沿用父行程已解析的 DB；spawn (Windows) 時每個 worker 只解析一次。"""
+    global _WORKER_DB
+    if _WORKER_DB is None:
+        _WORKER_DB = cantools.database.load_file(dbc_path)
+
+def _generate_worker(dbc_path: str, frame_id: int, output_dir: str, kwargs: Dict) -> str:
+    return generate_can_msg_py(dbc_path, frame_id, output_dir, db=_WORKER_DB, **kwargs)
+
+def generate_all_can_msg_py(dbc_path: str, output_dir: str = ".", debug: bool = False, strict: bool = False,
+                            filename_prefix: str = "", codegen: str = "bitloop", db=None,
+                            jobs: int = 0, force: bool = False, batch: bool = False,
+                            physical: bool = False, slots: bool = False, raw_enums: bool = False) -> List[str]:
+    """產生 DBC 內所有 message。
+
+    - DBC 只解析一次（db 可由呼叫端傳入）
+    - jobs > 1 時用 process pool 平行產生；0 = os.cpu_count()
+    - output_dir/generated_manifest.json 記錄每個 message 定義的 hash，
+      hash 相同且檔案還在就略過；DBC 已刪除的 message 會一併刪掉舊檔
+    回傳本次實際（重新）產生的檔案路徑
+    """
+    global _WORKER_DB
+    if db is None:
+        db = cantools.database.load_file(dbc_path)
+    dbc_name = os.path.basename(dbc_path)
+    kwargs = dict(debug=debug, strict=strict, filename_prefix=filename_prefix, codegen=codegen, batch=batch,
+                  physical=physical, slots=slots, raw_enums=raw_enums)
+    old_entries = {} if force else load_manifest(output_dir)
+
+    entries: Dict[str, Dict] = {}
+    todo: List[int] = []
+    for m in db.messages:
+        key = f"0x{m.frame_id:X}"
+        fname = f"{filename_prefix}generate_0x{m.frame_id:X}.py"
+        digest = message_fingerprint(m, dbc_name, kwargs)
+        entries[key] = {"file": fname, "hash": digest}
+        old = old_entries.get(key)
+        if old and old.get("hash") == digest and old.get("file") == fname \
+                and os.path.exists(os.path.join(output_dir, fname)):
+            continue
+        todo.append(m.frame_id)
+
+    # manifest 裡有、這次 DBC 已經沒有的 message → 刪掉我們之前產的檔
+    current_files = {e["file"] for e in entries.values()}
+    for key, old in old_entries.items():
+        fname = old.get("file")
+        if key not in entries and fname and fname not in current_files:
+            path = os.path.join(output_dir, fname)
+            if os.path.exists(path):
+                os.remove(path)
+
+    print(f"[gen] {len(todo)}/{len(entries)} message(s) 需要產生，{len(entries) - len(todo)} 個未變更略過")
+    jobs = jobs or os.cpu_count() or 1
+    written: List[str] = []
+    if jobs <= 1 or len(todo) <= 1:
+        for fid in todo:
+            written.append(generate_can_msg_py(dbc_path, fid, output_dir, db=db, **kwargs))
+    else:
+        _WORKER_DB = db  # fork 的 worker 直接繼承，不用再解析
+        try:
+            with ProcessPoolExecutor(max_workers=min(jobs, len(todo)), initializer=_init_worker,
+                                     initargs=(dbc_path,)) as pool:
+                futures = [pool.submit(_generate_worker, dbc_path, fid, output_dir, kwargs) for fid in todo]
+                written = [fut.result() for fut in futures]
+        finally:
+            _WORKER_DB = None
+
+    save_manifest(output_dir, entries)
+    return written
 
 
 # ---------------------------------------------------------
@@ -490,6 +1252,16 @@ if __name__ == "__main__":
     parser.add_argument("--list", action="store_true", help="列出 DBC 所有 CAN 訊息")
     parser.add_argument("--strict", action="store_true", help="Enum 嚴格模式：遇到未定義的枚舉值即拋出錯誤（預設為寬鬆模式）")
     parser.add_argument("--clean-out", action="store_true", help="產生前先清掉 out 目錄裡舊的 auto-generated 檔案")
+    parser.add_argument("--physical", action="store_true", help="非 Enum signal 以物理值編解碼（signed / float / scale / offset）；預設為 raw 無號整數")
+    parser.add_argument("--slots", action="store_true", help="message 類別改用 __slots__（取代 @dataclass，減少每幀配置）")
+    parser.add_argument("--raw-enums", action="store_true", help="解碼不轉成 IntEnum，Enum signal 直接回傳 raw int（高頻只比數字的使用端）")
+    parser.add_argument("--batch", action="store_true", help="另外產生 NumPy 批次解碼 decode_0x<ID>_batch()（大量錄製資料離線分析用）")
+    parser.add_argument("--jobs", type=int, default=0, help="--id all 時平行產生的 process 數（預設 0 = CPU 核心數；1 = 不平行）")
+    parser.add_argument("--force", action="store_true", help="--id all 時忽略 generated_manifest.json，全部重新產生")
+    parser.add_argument("--single-module", action="store_true",
+                        help="--id all 時整份 DBC 輸出成單一 generate_<DBC檔名>.py（共用 helper 一次，DECODERS/ENCODERS 以 frame ID 分派）")
+    parser.add_argument("--codegen", default="bitloop", choices=CODEGEN_MODES,
+                        help="編解碼產生方式：bitloop=逐 bit 迴圈（預設）；shiftmask=產生時預先算好位置的 shift/mask 直線程式碼（較快，輸出相同）")
     
     # 輸出 OPC UA json
     parser.add_argument("--opcua-json", help="output json file for opcua nodes")
@@ -518,12 +1290,21 @@ if __name__ == "__main__":
             raise ValueError(f"指定DBC({args.dbc})不存在")
 
         db = cantools.database.load_file(args.dbc)        
-        if str(args.id).lower() == 'all':
-            for m in db.messages:
-                generate_can_msg_py(args.dbc, m.frame_id, args.out, args.debug, strict=args.strict, filename_prefix=args.prefix)
+        if args.single_module and str(args.id).lower() != 'all':
+            raise ValueError("--single-module 需搭配 --id all")
+        if args.single_module:
+            generate_single_module_py(args.dbc, out_dir, strict=args.strict, filename_prefix=args.prefix,
+                                      codegen=args.codegen, db=db, batch=args.batch, physical=args.physical,
+                                      slots=args.slots, raw_enums=args.raw_enums)
+        elif str(args.id).lower() == 'all':
+            generate_all_can_msg_py(args.dbc, out_dir, args.debug, strict=args.strict, filename_prefix=args.prefix,
+                                    codegen=args.codegen, db=db, jobs=args.jobs, force=args.force, batch=args.batch,
+                                    physical=args.physical, slots=args.slots, raw_enums=args.raw_enums)
         else:
             target_id = int(args.id, 16) if str(args.id).startswith("0x") else int(args.id)
-            generate_can_msg_py(args.dbc, target_id, args.out, args.debug, strict=args.strict, filename_prefix=args.prefix)
+            generate_can_msg_py(args.dbc, target_id, args.out, args.debug, strict=args.strict, filename_prefix=args.prefix,
+                                codegen=args.codegen, db=db, batch=args.batch, physical=args.physical,
+                                slots=args.slots, raw_enums=args.raw_enums)
             
         write_generated_index(out_dir)
         
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+rx_sniffer 收包端每幀成本：逐幀 print 十六進位 vs 二進位紀錄（can_capture.CaptureWriter）
+
+- print   : 舊做法，每幀一次 f-string + hex + print（輸出到 os.devnull，不含終端機本身的成本）
+- capture : CaptureWriter.add_frames（RX thread 端成本；壓縮 / 寫檔在背景 thread），各 codec 一列
+幀組成：一半 8 bytes classic、一半 64 bytes FD（payload 為遞增計數，接近真實 signal 的可壓縮程度）。
+
+輸出 RX 端 frames/s、檔案大小、壓縮比，以及讀回（read_capture）frames/s。
+
+用法：
+    python benchmarks/bench_capture.py --frames 200000
+"""
+from __future__ import annotations
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+ROOT = Path(__file__).resolve().parent.parent
+EXAMPLES = ROOT / "examples"
+if str(EXAMPLES) not in sys.path:
+    sys.path.insert(0, str(EXAMPLES))
+
+from can_capture import CaptureWriter, RatePrinter, lz4_block, read_capture, zstandard
+from can_transport import RxFrame
+
+
+def make_frames(n: int) -> List[RxFrame]:
+    out = []
+    for i in range(n):
+        if i % 2:
+            out.append(RxFrame(0x117, (i & 0xFFFFFFFF).to_bytes(4, "little") * 16, True, True, False, 1000 + i * 100))
+        else:
+            out.append(RxFrame(0x200 + i % 8, (i & 0xFFFF).to_bytes(2, "little") * 4, False, False, False, 1000 + i * 100))
+    return out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="逐幀 print vs 二進位紀錄的 RX 端成本")
+    parser.add_argument("--frames", type=int, default=200000, help="幀數 (預設 200000)")
+    parser.add_argument("--batch", type=int, default=256, help="每次 recv 的幀數 (預設 256)")
+    args = parser.parse_args()
+
+    frames = make_frames(args.frames)
+    batches = [frames[i:i + args.batch] for i in range(0, len(frames), args.batch)]
+    print(f"{'mode':>14} {'rx frames/s':>12} {'file MB':>8} {'ratio':>6} {'read frames/s':>14}")
+
+    with open(os.devnull, "w") as null:
+        t0 = time.perf_counter()
+        for b in batches:
+            for f in b:
+                print(RatePrinter.line(f), file=null)
+        dt = time.perf_counter() - t0
+    print(f"{'print':>14} {len(frames) / dt:>12.0f}")
+
+    codecs = ["none", "zlib"] + (["zstd"] if zstandard else []) + (["lz4"] if lz4_block else [])
+    with tempfile.TemporaryDirectory() as td:
+        for codec in codecs:
+            path = os.path.join(td, f"bench_{codec}.cancap")
+            cap = CaptureWriter(path, codec, ring_blocks=64)
+            t0 = time.perf_counter()
+            for b in batches:
+                cap.add_frames(b)
+            dt = time.perf_counter() - t0
+            cap.close()
+            t1 = time.perf_counter()
+            n = sum(1 for _ in read_capture(path))
+            rdt = time.perf_counter() - t1
+            size = os.path.getsize(path)
+            label = f"capture {codec}"
+            note = f" (dropped {cap.dropped})" if cap.dropped else ""
+            print(f"{label:>14} {len(frames) / dt:>12.0f} {size / 1e6:>8.1f} {cap.raw_bytes / max(1, size):>6.2f} "
+                  f"{n / rdt:>14.0f}{note}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模擬 Server 公式求值成本：每個 tick 把設定檔內全部公式各求值一次
+
+比較兩種做法（公式組成：state 相依 / 只用 tnow_ms / 常數 約各三分之一）：
+- eval     : 舊版，每次 eval(原始字串)（每次都重新 parse + compile）
+- compiled : formula_engine，載入時編譯成函式，常數公式直接回傳快取值
+
+用法：
+    python benchmarks/bench_formulas.py --sizes 100,300,1000 --ticks 200
+"""
+from __future__ import annotations
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+EXAMPLES = ROOT / "examples"
+if str(EXAMPLES) not in sys.path:
+    sys.path.insert(0, str(EXAMPLES))
+
+from formula_engine import compile_values, evaluate
+
+_TEMPLATES = (
+    "(state.get('Sig{i}', 0) + 1) % 16",
+    "int(tnow_ms / 100) % 256",
+    "{i} * 2 + 0x10",
+)
+
+
+def make_formulas(n: int) -> Dict[str, str]:
+    return {f"Sig{i}": _TEMPLATES[i % len(_TEMPLATES)].format(i=i) for i in range(n)}
+
+
+def tick_eval(formulas: Dict[str, str], state: Dict[str, Any], tnow_ms: float) -> None:
+    for k, expr in formulas.items():
+        state[k] = eval(expr, {"__builtins__": {"int": int}}, {"state": state, "tnow_ms": tnow_ms})
+
+
+def tick_compiled(formulas: Dict[str, Any], state: Dict[str, Any], tnow_ms: float) -> None:
+    for k, f in formulas.items():
+        state[k] = evaluate(f, state, tnow_ms)
+
+
+def run(tick: Callable, formulas: Dict[str, Any], ticks: int) -> float:
+    """回傳每 tick 平均耗時（us）。"""
+    state: Dict[str, Any] = {}
+    t0 = time.perf_counter()
+    for t in range(ticks):
+        tick(formulas, state, t * 10.0)
+    return (time.perf_counter() - t0) / ticks * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="設定檔公式每 tick 求值成本（eval vs 預先編譯）")
+    parser.add_argument("--sizes", default="100,300,1000", help="公式數列表，逗號分隔 (預設 100,300,1000)")
+    parser.add_argument("--ticks", type=int, default=200, help="每種情境跑幾個 tick (預設 200)")
+    args = parser.parse_args()
+
+    sizes: List[int] = [int(s) for s in args.sizes.split(",") if s.strip()]
+    print(f"{'N':>6} {'load ms':>8} {'eval us/tick':>13} {'compiled us/tick':>17} {'speedup':>8}")
+    for n in sizes:
+        raw = make_formulas(n)
+        t0 = time.perf_counter()
+        compiled = compile_values(raw)
+        load_ms = (time.perf_counter() - t0) * 1000.0
+        # 兩種做法結果須一致
+        s_eval: Dict[str, Any] = {}
+        s_comp: Dict[str, Any] = {}
+        tick_eval(raw, s_eval, 1234.0)
+        tick_compiled(compiled, s_comp, 1234.0)
+        assert s_eval == s_comp, "compiled formulas disagree with eval"
+        ev = run(tick_eval, raw, args.ticks)
+        co = run(tick_compiled, compiled, args.ticks)
+        print(f"{n:>6} {load_ms:>8.2f} {ev:>13.1f} {co:>17.1f} {ev / co:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+generated_index 冷啟動 import 成本（-X importtime）
+
+依訊息數 N 產生 N 支 generate_0x*.py 與 generated_index.py 到暫存 package，
+每種情境各開一個新的 Python process（-X importtime）量測 generated_index 本身的 import 時間、
+情境總耗時、tracemalloc 配置峰值與實際載入的訊息模組數：
+- index : 只 import generated_index（lazy，不載入任何訊息模組）
+- two   : import generated_index 後用 module_for_id() 取前 2 個 ID
+- eager : 載入全部訊息模組（等同舊版逐一 from . import 的 generated_index）
+
+用法：
+    python benchmarks/bench_generated_index.py --dbc your.dbc --sizes 1,10,50,100,all
+"""
+from __future__ import annotations
+import argparse
+import contextlib
+import io
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import cantools
+
+from auto_generate_can_msg import generate_can_msg_py, write_generated_index
+
+_CHILD = r"""
+import sys, time
+if {trace}:
+    import tracemalloc
+    tracemalloc.start()
+t0 = time.perf_counter()
+import {pkg}.generated_index as idx
+if "{mode}" == "two":
+    for fid in idx.frame_ids()[:2]:
+        idx.module_for_id(fid)
+elif "{mode}" == "eager":
+    for name in idx.__all__:
+        getattr(idx, name)
+wall = time.perf_counter() - t0
+peak = tracemalloc.get_traced_memory()[1] if {trace} else 0
+loaded = sum(1 for m in sys.modules if m.startswith("{pkg}.generate_0x"))
+print(wall, peak, loaded)
+"""
+
+MODES = ("index", "two", "eager")
+
+
+def _index_import_us(stderr: str, pkg: str) -> int:
+    """-X importtime 輸出中 {pkg}.generated_index 的 cumulative 時間（us）。"""
+    target = f"{pkg}.generated_index"
+    for line in stderr.splitlines():
+        parts = line[len("import time:"):].split("|")
+        if line.startswith("import time:") and len(parts) == 3 and parts[2].strip() == target:
+            return int(parts[1])
+    return 0
+
+
+def run_case(base: Path, pkg: str, mode: str, trace: bool = False) -> Dict[str, float]:
+    env = dict(os.environ, PYTHONPATH=str(base))
+    code = _CHILD.format(pkg=pkg, mode=mode, trace=trace)
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          capture_output=True, text=True, env=env, check=True)
+    wall, peak, loaded = proc.stdout.split()
+    return {"index_ms": _index_import_us(proc.stderr, pkg) / 1000.0, "wall_ms": float(wall) * 1000.0,
+            "peak_mib": int(peak) / (1024 * 1024), "loaded": int(loaded)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="generated_index 冷啟動 import 成本（依訊息數成長）")
+    parser.add_argument("--dbc", required=True, help="指定 DBC 檔案路徑")
+    parser.add_argument("--sizes", default="1,10,50,100,all", help="訊息數列表，逗號分隔，all 表示全部 (預設 1,10,50,100,all)")
+    parser.add_argument("--repeat", type=int, default=3, help="每個情境重跑次數，取最小值 (預設 3)")
+    parser.add_argument("--codegen", default="shiftmask", help="產生模式 (預設 shiftmask)")
+    args = parser.parse_args()
+
+    db = cantools.database.load_file(args.dbc)
+    ids = [m.frame_id for m in db.messages]
+    sizes: List[int] = []
+    for tok in args.sizes.split(","):
+        n = len(ids) if tok.strip().lower() == "all" else min(int(tok), len(ids))
+        if n and n not in sizes:
+            sizes.append(n)
+
+    with tempfile.TemporaryDirectory(prefix="bench_index_") as tmp:
+        base = Path(tmp)
+        print(f"{'N':>5} {'mode':>6} {'index ms':>9} {'wall ms':>9} {'alloc MiB':>10} {'loaded':>7}")
+        for n in sizes:
+            pkg = f"gen_{n}"
+            out = base / pkg
+            out.mkdir()
+            (out / "__init__.py").write_text("", encoding="utf-8")
+            with contextlib.redirect_stdout(io.StringIO()):   # 不顯示產生訊息
+                for fid in ids[:n]:
+                    generate_can_msg_py(args.dbc, fid, str(out), codegen=args.codegen, db=db)
+            write_generated_index(str(out))
+            # 先 import 一次讓 .pyc 就緒，量到的是載入成本而非編譯成本
+            run_case(base, pkg, "eager")
+            for mode in MODES:
+                runs = [run_case(base, pkg, mode) for _ in range(max(1, args.repeat))]
+                best = min(runs, key=lambda r: r["wall_ms"])
+                peak = run_case(base, pkg, mode, trace=True)["peak_mib"]   # tracemalloc 會拖慢，另跑一次只取記憶體
+                print(f"{n:>5} {mode:>6} {best['index_ms']:>9.2f} {best['wall_ms']:>9.2f} {peak:>10.2f} {best['loaded']:>7}")
+
+
+if __name__ == "__main__":
+    main()
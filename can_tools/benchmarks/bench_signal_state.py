@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SignalState 多執行緒吞吐量：1 條寫入端（模擬 RX thread）+ R 條讀取端（模擬排程 / 回應規則）
+
+比較兩種做法（讀取端每次都要拿到一致的狀態，再讀 --reads 個 signal）：
+- locked : dict + threading.Lock，寫入 update、讀取複製整份 dict 都在鎖內
+- cow    : SignalState（copy-on-write snapshot，讀取端不拿鎖）
+
+輸出寫入端 updates/s、單次 update 的最大耗時（讀取端是否擋住 RX）、讀取端合計 reads/s。
+
+用法：
+    python benchmarks/bench_signal_state.py --signals 500 --readers 0,1,4 --seconds 1
+"""
+from __future__ import annotations
+import argparse
+import random
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+EXAMPLES = ROOT / "examples"
+if str(EXAMPLES) not in sys.path:
+    sys.path.insert(0, str(EXAMPLES))
+
+from signal_state import SignalState
+
+
+class LockedState:
+    """舊做法加上鎖：讀取端為了一致性必須在鎖內複製。"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._d: Dict[str, Any] = {}
+
+    def update(self, changed: Dict[str, Any]) -> None:
+        with self._lock:
+            self._d.update(changed)
+
+    @property
+    def values(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._d)
+
+
+def run_case(store: Any, names: List[str], readers: int, seconds: float, per_update: int, reads: int) -> Dict[str, float]:
+    stop = threading.Event()
+    read_counts = [0] * readers
+    result = {"updates": 0, "max_update_us": 0.0}
+    store.update({n: 0 for n in names})
+
+    def writer() -> None:
+        rnd = random.Random(1)
+        n = 0
+        worst = 0
+        perf = time.perf_counter_ns
+        while not stop.is_set():
+            changed = {rnd.choice(names): n for _ in range(per_update)}
+            t0 = perf()
+            store.update(changed)
+            dt = perf() - t0
+            if dt > worst:
+                worst = dt
+            n += 1
+        result["updates"] = n
+        result["max_update_us"] = worst / 1000.0
+
+    def reader(i: int) -> None:
+        picks = names[:reads]
+        n = 0
+        while not stop.is_set():
+            vals = store.values
+            for k in picks:
+                vals.get(k, 0)
+            n += 1
+        read_counts[i] = n
+
+    threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    return {"updates_s": result["updates"] / seconds, "max_update_us": result["max_update_us"],
+            "reads_s": sum(read_counts) / seconds}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="SignalState 寫入 / 讀取吞吐量（多執行緒競爭）")
+    parser.add_argument("--signals", type=int, default=500, help="狀態內的 signal 數 (預設 500)")
+    parser.add_argument("--readers", default="0,1,4", help="讀取端 thread 數列表，逗號分隔 (預設 0,1,4)")
+    parser.add_argument("--seconds", type=float, default=1.0, help="每個情境執行秒數 (預設 1)")
+    parser.add_argument("--per-update", type=int, default=3, help="每次 update 變動的 signal 數 (預設 3)")
+    parser.add_argument("--reads", type=int, default=10, help="讀取端每次讀幾個 signal (預設 10)")
+    args = parser.parse_args()
+
+    names = [f"Sig{i}" for i in range(args.signals)]
+    print(f"{'readers':>7} {'store':>6} {'updates/s':>10} {'max update us':>14} {'reads/s':>10}")
+    for r in [int(x) for x in args.readers.split(",") if x.strip()]:
+        for label, store in (("locked", LockedState()), ("cow", SignalState())):
+            s = run_case(store, names, r, args.seconds, args.per_update, args.reads)
+            print(f"{r:>7} {label:>6} {s['updates_s']:>10.0f} {s['max_update_us']:>14.0f} {s['reads_s']:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
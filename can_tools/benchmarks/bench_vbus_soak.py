@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+虛擬 bus soak 測試：同一個 process 內 N 個 ZlgSimServer + 1 個測試節點掛在同一條 VirtualBus 上（不需硬體）
+
+- 每個 Server 一條回應規則：收到 0x100+i 回 0x200+i（raw response）
+- 測試節點以固定速率輪流送請求給各 Server，同時收回應，量 請求 → 回應 的來回時間
+- 給 --dbc 時每個 Server 也載入 runtime codec，請求 ID 若在 DBC 內會一起解碼（量解碼成本）
+
+輸出：送出請求數、收到回應數、達成 fps、來回延遲 avg / p99 / max、bus 負載。
+
+用法：
+    python benchmarks/bench_vbus_soak.py --servers 4 --rate 2000 --seconds 5
+    python benchmarks/bench_vbus_soak.py --servers 2 --rate 20000 --no-timing --dbc my.dbc
+"""
+from __future__ import annotations
+import argparse
+import logging
+import sys
+import time
+from collections import deque
+from pathlib import Path
+from typing import Deque, Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+EXAMPLES = ROOT / "examples"
+if str(EXAMPLES) not in sys.path:
+    sys.path.insert(0, str(EXAMPLES))
+
+from can_sim_server_zlg import ResponseRule, SimConfig, ZlgSimServer, _load_runtime_codec
+from virtual_bus import get_bus
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="虛擬 bus soak 測試（N 個 Server + 請求 / 回應來回時間）")
+    parser.add_argument("--servers", type=int, default=4, help="Server 數 (預設 4)")
+    parser.add_argument("--rate", type=float, default=2000, help="請求速率 frames/s，平均分給各 Server (預設 2000)")
+    parser.add_argument("--seconds", type=float, default=5.0, help="送請求的秒數 (預設 5)")
+    parser.add_argument("--len", type=int, default=8, help="請求 payload 長度；> 8 為 CAN FD (預設 8)")
+    parser.add_argument("--abit", type=int, default=500000, help="仲裁段位元率 (預設 500000)")
+    parser.add_argument("--dbit", type=int, default=2000000, help="資料段位元率 (預設 2000000)")
+    parser.add_argument("--no-timing", action="store_true", help="不模擬 bus 時間（量純軟體吞吐量）")
+    parser.add_argument("--loss", type=float, default=0.0, help="每個接收端的遺失率 (預設 0)")
+    parser.add_argument("--latency-us", type=float, default=0.0, help="交付延遲 us (預設 0)")
+    parser.add_argument("--seed", type=int, default=1, help="遺失 / jitter 亂數種子 (預設 1)")
+    parser.add_argument("--dbc", help="每個 Server 載入的 DBC（選用）")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format="[%(levelname)s] %(message)s")
+
+    bus = get_bus("soak", abit=0 if args.no_timing else args.abit, dbit=args.dbit, loss=args.loss,
+                  latency_us=args.latency_us, seed=args.seed)
+    servers: List[ZlgSimServer] = []
+    for i in range(args.servers):
+        cfg = SimConfig(respond=[ResponseRule(name=f"r{i}", request_id=0x100 + i, raw_can_id=0x200 + i,
+                                              raw_data=bytes(8))])
+        parsers = {None: _load_runtime_codec(args.dbc, None)} if args.dbc else {}
+        srv = ZlgSimServer(None, None, None, parsers, cfg, transport=bus.attach(f"srv{i}", tx_buffer=4096))
+        srv.start()
+        servers.append(srv)
+    tester = bus.attach("tester", tx_buffer=4096)
+
+    pending: Dict[int, Deque[int]] = {0x200 + i: deque() for i in range(args.servers)}
+    rtts: List[int] = []
+    sent = received = 0
+    payload = bytes(args.len)
+    t0 = time.monotonic()
+    t_end = t0 + args.seconds
+    while True:
+        now = time.monotonic()
+        if now < t_end:
+            due = int((now - t0) * args.rate) - sent
+            if due > 0:
+                frames = [(0x100 + (sent + k) % args.servers, payload) for k in range(due)]
+                t_ns = time.monotonic_ns()
+                n = tester.send(frames)
+                for can_id, _ in frames[:n]:
+                    pending[can_id + 0x100].append(t_ns)
+                sent += n
+        elif not any(pending.values()) or now > t_end + 1.0:
+            break
+        for f in tester.recv(1):
+            q = pending.get(f.can_id)
+            if q:
+                rtts.append(time.monotonic_ns() - q.popleft())
+                received += 1
+    elapsed = time.monotonic() - t0
+
+    for srv in servers:
+        srv.stop()
+        srv.transport.close()
+    load = bus.format()
+    tester.close()
+
+    rtts.sort()
+    pick = lambda p: rtts[min(len(rtts) - 1, int(p * len(rtts)))] / 1000.0 if rtts else 0.0
+    print(f"servers={args.servers} rate={args.rate:.0f}/s len={args.len} timing={'off' if args.no_timing else f'{args.abit}/{args.dbit}'}")
+    print(f"requests={sent} responses={received} ({100.0 * received / max(1, sent):.1f}%) "
+          f"achieved={sent / args.seconds:.0f} req/s over {elapsed:.2f}s")
+    print(f"round trip avg={sum(rtts) / max(1, len(rtts)) / 1000.0:.0f}us p99={pick(0.99):.0f}us max={pick(1.0):.0f}us")
+    print(load)
+    if args.loss:
+        print("(loss > 0：遺失的請求 / 回應會讓之後的配對錯位，來回時間僅供參考)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Runtime DBC codec（不用產生 generate_0x*.py）
+
+- 透過 cantools 只載入一次 DBC
+- 每個 message 第一次用到時，依 signal 位置產生 shift/mask 直線程式碼並 compile 成
+  decoder / encoder，之後以 frame ID 快取
+- encode 端：以 (frame ID, signal 值) 為 key 的 LRU 快取；沒命中時以該 message 上一次編碼的 payload 為底，
+  只把有變動的 signal 位元改寫進去（signal 位元互相重疊的 message，例如 multiplex，一律完整重編）
+- 提供與 generator_adapter_0x*.py 相同的 parse_frame(can_id, data) / encode_signals(updates)，
+  可直接交給 can_sim_server_zlg.CanParserAdapter 使用（見 --dbc）
+
+位元位置規則與 auto_generate_can_msg.py 相同（Motorola 沿用 get_motorola_bit_positions 的公式）。
+"""
+from __future__ import annotations
+import argparse
+import struct
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import cantools
+
+from auto_generate_can_msg import (get_signal_bit_span, shiftmask_extract_expr, shiftmask_insert_expr,
+                                   physical_decode_expr, physical_encode_expr, physical_default,
+                                   decode_changed_signals, message_frame_len as _frame_len, patch_payload)
+
+Decoder = Callable[[bytes], Dict[str, int]]
+Encoder = Callable[[Dict[str, Any]], bytes]
+
+
+def _extract_expr(lsb: int, length: int) -> str:
+    """shiftmask_extract_expr 的 runtime 版：lsb < 0 的位元視為 0（不做 bitloop 的負 index 繞回）。"""
+    if lsb >= 0:
+        return shiftmask_extract_expr(lsb, length)
+    if lsb + length <= 0:
+        return "0"
+    return f"({shiftmask_extract_expr(0, lsb + length)} << {-lsb})"
+
+
+def _signal_default(sig, physical: bool = False) -> str:
+    """與產生的 dataclass 相同：有 enum 取最小的 key，否則 0（physical 模式為 raw 0 對應的物理值）。"""
+    choices = getattr(sig, "choices", None)
+    if choices:
+        return str(min(int(k) for k in choices))
+    return physical_default(sig) if physical else "0"
+
+
+def build_decoder_source(msg, physical: bool = False) -> str:
+    n = _frame_len(msg)
+    lines = ["def decode(data):"]
+    lines.append(f"    if len(data) < {n}:")
+    lines.append(f"        data = bytes(data).ljust({n}, b'\\x00')")
+    lines.append("    return {")
+    for sig in msg.signals:
+        lsb, length = get_signal_bit_span(sig)
+        expr = _extract_expr(lsb, length)
+        if physical and not getattr(sig, "choices", None):
+            expr = physical_decode_expr(sig, expr)
+        lines.append(f"        {sig.name!r}: {expr},")
+    lines.append("    }")
+    return "\n".join(lines) + "\n"
+
+
+def build_signal_decoders_source(msg, physical: bool = False) -> str:
+    """每個 signal 一個 decoder（給 parse_changed 只解有變動的 signal 用）。"""
+    lines = ["DECODERS = {"]
+    for sig in msg.signals:
+        lsb, length = get_signal_bit_span(sig)
+        expr = _extract_expr(lsb, length)
+        if physical and not getattr(sig, "choices", None):
+            expr = physical_decode_expr(sig, expr)
+        lines.append(f"    {sig.name!r}: lambda data: {expr},")
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+def build_byte_signals(msg) -> Tuple[Tuple[str, ...], ...]:
+    """byte index -> 用到該 byte 的 signal names（lsb < 0 的位元視為 0，不佔 byte）。"""
+    table: List[List[str]] = [[] for _ in range(_frame_len(msg))]
+    for sig in msg.signals:
+        lsb, length = get_signal_bit_span(sig)
+        lo, hi = max(lsb, 0), lsb + length - 1
+        if hi < lo:
+            continue
+        for b in range(lo // 8, hi // 8 + 1):
+            table[b].append(sig.name)
+    return tuple(tuple(names) for names in table)
+
+
+def build_encoder_source(msg, physical: bool = False) -> str:
+    n = _frame_len(msg)
+    lines = ["def encode(values):", "    get = values.get", "    acc = 0"]
+    for sig in msg.signals:
+        lsb, length = get_signal_bit_span(sig)
+        if lsb + length <= 0:
+            continue
+        value = f"get({sig.name!r}, {_signal_default(sig, physical)})"
+        if physical and not getattr(sig, "choices", None):
+            value = physical_encode_expr(sig, value)
+        var = f"int({value})"
+        lines.append(f"    acc |= {shiftmask_insert_expr(lsb, length, var)}")
+    lines.append(f"    return acc.to_bytes({n}, 'little')")
+    return "\n".join(lines) + "\n"
+
+
+def build_signal_patchers_source(msg, physical: bool = False) -> str:
+    """每個 signal 的 (clear_mask, default, insert)：payload int 上只改寫這個 signal 的位元。"""
+    lines = ["PATCHERS = {"]
+    for sig in msg.signals:
+        lsb, length = get_signal_bit_span(sig)
+        if lsb + length <= 0:
+            continue
+        lo = max(lsb, 0)
+        mask = ((1 << (lsb + length - lo)) - 1) << lo
+        value = "v"
+        if physical and not getattr(sig, "choices", None):
+            value = physical_encode_expr(sig, value)
+        insert = shiftmask_insert_expr(lsb, length, f"int({value})")
+        lines.append(f"    {sig.name!r}: (0x{mask:X}, {_signal_default(sig, physical)}, lambda v: {insert}),")
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+def _compile(source: str, func_name: str, filename: str) -> Any:
+    ns: Dict[str, Any] = {"_F32": struct.Struct("<f"), "_F64": struct.Struct("<d")}
+    exec(compile(source, filename, "exec"), ns)
+    return ns[func_name]
+
+
+class DbcRuntimeCodec:
+    """一份 DBC 的 runtime codec；decoder / encoder 依 frame ID 延遲編譯並快取。"""
+
+    # CanParserAdapter 看到這個旗標就不再另外包一層 encode 快取
+    encode_cached = True
+
+    def __init__(self, dbc_path: str, frame_ids: Optional[Iterable[int]] = None, physical: bool = False,
+                 encode_cache_size: int = 1024):
+        """
+        physical         : 非 Enum signal 以物理值編解碼（同 auto_generate_can_msg.py --physical）
+        encode_cache_size: encode LRU 的項目數上限（0 = 不快取；上一幀 patch 仍然有效）
+        """
+        db = cantools.database.load_file(dbc_path)
+        self.physical = physical
+        wanted = set(frame_ids) if frame_ids is not None else None
+        self.dbc_path = dbc_path
+        self.messages: Dict[int, Any] = {
+            m.frame_id: m for m in db.messages if wanted is None or m.frame_id in wanted
+        }
+        if wanted:
+            missing = wanted - set(self.messages)
+            if missing:
+                raise ValueError(f"❌ 找不到 message ID={', '.join(f'0x{i:X}' for i in sorted(missing))} 於 {dbc_path}")
+        self._decoders: Dict[int, Decoder] = {}
+        self._encoders: Dict[int, Encoder] = {}
+        self._changed: Dict[int, Tuple[int, Tuple[Tuple[str, ...], ...], Dict[str, Callable]]] = {}
+        # encode 快取：frame ID -> (payload 長度, patchers 或 None)；上一幀 (signal 值, payload)；LRU
+        self._patchers: Dict[int, Tuple[int, Optional[Dict[str, Tuple[int, Any, Callable]]], frozenset]] = {}
+        self._last_tx: Dict[int, Tuple[Dict[str, Any], bytes]] = {}
+        self._encode_lru: "OrderedDict[Tuple[int, frozenset], bytes]" = OrderedDict()
+        self.encode_cache_size = max(0, int(encode_cache_size))
+        self.encode_stats = {"hits": 0, "patched": 0, "full": 0}
+        # signal name -> 擁有它的 frame IDs（同名 signal 可能出現在多個 message）
+        self.signal_owners: Dict[str, List[int]] = {}
+        for fid, msg in self.messages.items():
+            for sig in msg.signals:
+                self.signal_owners.setdefault(sig.name, []).append(fid)
+
+    def frame_ids(self) -> List[int]:
+        return sorted(self.messages)
+
+    def decoder(self, frame_id: int) -> Optional[Decoder]:
+        dec = self._decoders.get(frame_id)
+        if dec is None:
+            msg = self.messages.get(frame_id)
+            if msg is None:
+                return None
+            dec = _compile(build_decoder_source(msg, self.physical), "decode", f"<dbc decode 0x{frame_id:X}>")
+            self._decoders[frame_id] = dec
+        return dec
+
+    def encoder(self, frame_id: int) -> Optional[Encoder]:
+        enc = self._encoders.get(frame_id)
+        if enc is None:
+            msg = self.messages.get(frame_id)
+            if msg is None:
+                return None
+            enc = _compile(build_encoder_source(msg, self.physical), "encode", f"<dbc encode 0x{frame_id:X}>")
+            self._encoders[frame_id] = enc
+        return enc
+
+    def _changed_table(self, frame_id: int):
+        entry = self._changed.get(frame_id)
+        if entry is None:
+            msg = self.messages.get(frame_id)
+            if msg is None:
+                return None
+            decoders = _compile(build_signal_decoders_source(msg, self.physical), "DECODERS",
+                                f"<dbc signals 0x{frame_id:X}>")
+            entry = (_frame_len(msg), build_byte_signals(msg), decoders)
+            self._changed[frame_id] = entry
+        return entry
+
+    def _patch_table(self, frame_id: int):
+        entry = self._patchers.get(frame_id)
+        if entry is None:
+            msg = self.messages.get(frame_id)
+            if msg is None:
+                return None
+            patchers = _compile(build_signal_patchers_source(msg, self.physical), "PATCHERS",
+                                f"<dbc patch 0x{frame_id:X}>")
+            used = 0
+            for mask, _, _ in patchers.values():
+                if used & mask:
+                    patchers = None  # signal 位元重疊（multiplex 等）：patch 與完整編碼的 OR 結果不同，不 patch
+                    break
+                used |= mask
+            names = frozenset(sig.name for sig in msg.signals)
+            entry = (_frame_len(msg), patchers, names)
+            self._patchers[frame_id] = entry
+        return entry
+
+    def encode_frame(self, frame_id: int, updates: Dict[str, Any]) -> Optional[bytes]:
+        """編碼單一 message（未提供的 signal 取預設值）；依序嘗試 LRU、上一幀 patch、完整編碼。"""
+        entry = self._patchers.get(frame_id) or self._patch_table(frame_id)
+        if entry is None:
+            return None
+        _, patchers, names = entry
+        values = {k: v for k, v in updates.items() if k in names}
+        key = None
+        if self.encode_cache_size:
+            try:
+                key = (frame_id, frozenset(values.items()))
+            except TypeError:
+                key = None  # 值不可 hash（例如 list）：不走 LRU
+            if key is not None:
+                payload = self._encode_lru.get(key)
+                if payload is not None:
+                    self._encode_lru.move_to_end(key)
+                    self._last_tx[frame_id] = (values, payload)
+                    self.encode_stats["hits"] += 1
+                    return payload
+        last = self._last_tx.get(frame_id)
+        payload = None
+        if last is not None and patchers is not None:
+            payload = patch_payload(last[0], last[1], values, patchers)
+            if payload is not None:
+                self.encode_stats["patched"] += 1
+        if payload is None:
+            payload = self.encoder(frame_id)(values)
+            self.encode_stats["full"] += 1
+        self._last_tx[frame_id] = (values, payload)
+        if key is not None:
+            self._encode_lru[key] = payload
+            if len(self._encode_lru) > self.encode_cache_size:
+                self._encode_lru.popitem(last=False)
+        return payload
+
+    def compile_all(self) -> None:
+        """預先編譯全部 message（預設是第一次用到才編譯）。"""
+        for fid in self.messages:
+            self.decoder(fid)
+            self.encoder(fid)
+
+    # ---- CanParserAdapter 介面 ---- #
+    def parse_frame(self, can_id: int, data: bytes) -> Dict[str, int]:
+        dec = self._decoders.get(can_id) or self.decoder(can_id)
+        if dec is None:
+            return {}
+        return dec(data)
+
+    def parse_changed(self, can_id: int, prev: bytes, data: bytes) -> Dict[str, int]:
+        """只解 prev → data 之間有變動 byte 的 signal（payload 相同回傳空 dict）。"""
+        entry = self._changed.get(can_id) or self._changed_table(can_id)
+        if entry is None:
+            return {}
+        n, byte_signals, decoders = entry
+        if len(data) < n or len(prev) < n:
+            data, prev = bytes(data).ljust(n, b"\x00"), bytes(prev).ljust(n, b"\x00")
+        return decode_changed_signals(prev, data, byte_signals, decoders)
+
+    def encode_signals(self, updates: Dict[str, Any]) -> List[Tuple[int, bytes]]:
+        """只編碼擁有 updates 內 signal 的 message；未提供的 signal 使用預設值。"""
+        targets: List[int] = []
+        for name in updates:
+            for fid in self.signal_owners.get(name, ()):
+                if fid not in targets:
+                    targets.append(fid)
+        return [(fid, self.encode_frame(fid, updates)) for fid in targets]
+
+
+def _bench(dbc_path: str, frames: int, physical: bool = False) -> None:
+    """比較 DbcRuntimeCodec 與 cantools.Database.decode_message 的載入與解碼成本。"""
+    t0 = time.perf_counter()
+    codec = DbcRuntimeCodec(dbc_path, physical=physical)
+    t1 = time.perf_counter()
+    db = cantools.database.load_file(dbc_path)
+    print(f"[bench] load: runtime codec {1e3 * (t1 - t0):.1f} ms, cantools {1e3 * (time.perf_counter() - t1):.1f} ms")
+    for fid in codec.frame_ids():
+        msg = codec.messages[fid]
+        payload = bytes((i * 37 + 11) & 0xFF for i in range(_frame_len(msg)))[:msg.length]
+        t0 = time.perf_counter()
+        codec.decoder(fid)
+        t_compile = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        for _ in range(frames):
+            codec.parse_frame(fid, payload)
+        t_rt = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        for _ in range(frames):
+            db.decode_message(fid, payload, decode_choices=False, scaling=codec.physical)
+        t_ct = time.perf_counter() - t0
+        print(f"  0x{fid:X} {msg.name}: compile {1e3 * t_compile:.2f} ms, "
+              f"decode {1e6 * t_rt / frames:.2f} us vs cantools {1e6 * t_ct / frames:.2f} us "
+              f"({t_ct / t_rt if t_rt else 0:.1f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Runtime DBC codec（不產生檔案，直接 compile 出 decoder/encoder）")
+    parser.add_argument("--dbc", required=True, help="指定 DBC 檔案路徑")
+    parser.add_argument("--bench", type=int, default=10000, help="每個 message 解碼幾次做比較 (預設 10000)")
+    parser.add_argument("--physical", action="store_true", help="以物理值解碼（與 cantools scaling=True 比較）")
+    args = parser.parse_args()
+    _bench(args.dbc, args.bench, args.physical)
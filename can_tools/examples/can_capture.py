@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+高吞吐二進位收包紀錄（.cancap）
+
+檔案格式（little-endian）：
+    file header (32 B) : magic "CANCAP\\0\\1", version u16, reserved u16, block_size u32, created_ns u64, reserved u64
+    block header (32 B): magic "CBLK", codec u8, reserved 3B, raw_len u32, stored_len u32, nframes u32,
+                         first_ts_us u64, last_ts_us u64
+    block payload      : stored_len bytes（codec 壓縮後；解壓後為 raw_len bytes 的 frame records）
+    frame record       : ts_us u64, can_id u32（bit31 = extended）, flags u8（bit0 FD, bit1 BRS）, len u8, chan u16,
+                         之後緊接 len bytes payload（16 B 固定表頭，不補齊）
+- ts_us 為 wall-clock 微秒；transport 有裝置 / kernel timestamp 時以它推算（第一幀對齊 host 時間），否則用 host 時間
+- codec：none / zlib（標準函式庫）/ zstd（需 zstandard）/ lz4（需 lz4）；壓縮後沒變小的 block 以 none 存
+
+寫入端（CaptureWriter）：
+- 預先配置 ring_blocks 個 block_size 的 bytearray；RX thread 只做 struct.pack_into + 複製 payload，
+  block 滿了（或超過 flush_ms）交給背景 writer thread 壓縮、一次 write 整塊
+- writer 跟不上（沒有空的 block）時丟棄新幀並計數（dropped），不會擋住 RX
+- writer thread 寫檔失敗（例如磁碟滿）時記下錯誤（error），之後的 block 不再寫入但照樣還給 RX；
+  下一次 add / add_frames 或 close() 丟 RuntimeError（只丟一次）
+
+用法：
+    cap = CaptureWriter("bus.cancap", codec="zstd"); cap.add_frames(tr.recv(20)); ...; cap.close()
+    for rec in read_capture("bus.cancap"): print(rec.ts_us, hex(rec.can_id), rec.data.hex())
+"""
+from __future__ import annotations
+import logging, os, queue, struct, sys, threading, time, zlib
+from typing import Any, BinaryIO, Callable, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from can_transport import EFF_FLAG, RxFrame
+
+try:
+    import zstandard
+except Exception:
+    zstandard = None
+try:
+    import lz4.block as lz4_block
+except Exception:
+    lz4_block = None
+
+MAGIC = b"CANCAP\x00\x01"
+VERSION = 1
+FILE_HDR = struct.Struct("<8sHHIQQ")
+BLOCK_MAGIC = b"CBLK"
+BLOCK_HDR = struct.Struct("<4sB3xIIIQQ")
+REC_HDR = struct.Struct("<QIBBH")
+FLAG_FD, FLAG_BRS = 0x01, 0x02
+CODECS = ("none", "zlib", "zstd", "lz4")
+CODEC_IDS = {name: i for i, name in enumerate(CODECS)}
+
+
+class CaptureRecord(NamedTuple):
+    ts_us: int
+    can_id: int          # 不含旗標的 11 / 29-bit ID
+    data: bytes
+    is_fd: bool
+    brs: bool
+    extended: bool
+    chan: int
+
+
+def _compressor(codec: str, level: Optional[int]) -> Callable[[bytes], bytes]:
+    if codec == "none":
+        return lambda b: b
+    if codec == "zlib":
+        lv = 1 if level is None else level
+        return lambda b: zlib.compress(b, lv)
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard not installed; pip install zstandard (or use --capture-codec zlib)")
+        c = zstandard.ZstdCompressor(level=3 if level is None else level)
+        return c.compress
+    if codec == "lz4":
+        if lz4_block is None:
+            raise RuntimeError("lz4 not installed; pip install lz4 (or use --capture-codec zlib)")
+        return lambda b: lz4_block.compress(b, store_size=False)
+    raise ValueError(f"unknown capture codec {codec!r} (choose from {', '.join(CODECS)})")
+
+
+def decompress_block(codec_id: int, payload: bytes, raw_len: int) -> bytes:
+    if codec_id == 0:
+        return payload
+    if codec_id == 1:
+        return zlib.decompress(payload)
+    if codec_id == 2:
+        if zstandard is None:
+            raise RuntimeError("capture block is zstd-compressed; pip install zstandard")
+        return zstandard.ZstdDecompressor().decompress(payload, max_output_size=raw_len)
+    if codec_id == 3:
+        if lz4_block is None:
+            raise RuntimeError("capture block is lz4-compressed; pip install lz4")
+        return lz4_block.decompress(payload, uncompressed_size=raw_len)
+    raise ValueError(f"unknown capture block codec id {codec_id}")
+
+
+class CaptureWriter:
+    def __init__(self, path: str, codec: str = "none", level: Optional[int] = None, block_size: int = 1 << 20,
+                 ring_blocks: int = 8, flush_ms: float = 500.0, chan: int = 0):
+        self.path, self.codec, self.chan = path, codec, chan
+        self._compress = _compressor(codec, level)
+        self._codec_id = CODEC_IDS[codec]
+        self.block_size = max(4096, int(block_size))
+        self.flush_ns = int(flush_ms * 1e6)
+        self._free: "queue.Queue[bytearray]" = queue.Queue()
+        for _ in range(max(2, ring_blocks)):
+            self._free.put(bytearray(self.block_size))
+        self._full: "queue.Queue[Optional[Tuple[bytearray, int, int, int, int]]]" = queue.Queue()
+        self._f: BinaryIO = open(path, "wb", buffering=0)
+        self._f.write(FILE_HDR.pack(MAGIC, VERSION, 0, self.block_size, time.time_ns(), 0))
+        # 目前填寫中的 block
+        self._buf: Optional[bytearray] = self._free.get()
+        self._pos = self._n = 0
+        self._first_ts = self._last_ts = 0
+        self._opened_ns = 0
+        # 時間基準：裝置 timestamp -> wall-clock
+        self._ts_offset: Optional[int] = None
+        # 統計
+        self.frames = 0
+        self.dropped = 0
+        self.blocks = 0
+        self.raw_bytes = 0
+        self.stored_bytes = FILE_HDR.size
+        self.write_s = 0.0
+        # writer thread 的寫檔錯誤；lost = 因此沒寫進檔案的幀數
+        self.error: Optional[BaseException] = None
+        self.lost = 0
+        self._reported = False
+        self._writer = threading.Thread(target=self._write_loop, name="capture-writer", daemon=True)
+        self._writer.start()
+
+    # ---- RX thread ---- #
+    def _failure(self) -> RuntimeError:
+        self._reported = True
+        return RuntimeError(f"capture {self.path}: write failed: {self.error}")
+
+    def _wall_us(self, dev_ts_us: int) -> int:
+        if not dev_ts_us:
+            return time.time_ns() // 1000
+        if self._ts_offset is None:
+            self._ts_offset = time.time_ns() // 1000 - dev_ts_us
+        return dev_ts_us + self._ts_offset
+
+    def _rotate(self) -> bool:
+        """把目前 block 交給 writer，換一塊空的；沒有空的時回傳 False（目前 block 保留）。"""
+        if self._n:
+            try:
+                nxt = self._free.get_nowait()
+            except queue.Empty:
+                return False
+            self._full.put((self._buf, self._pos, self._n, self._first_ts, self._last_ts))
+            self._buf, self._pos, self._n = nxt, 0, 0
+        return True
+
+    def add(self, can_id: int, data: bytes, ts_us: int = 0, is_fd: bool = False, brs: bool = False,
+            extended: bool = False, chan: Optional[int] = None) -> bool:
+        """加入一幀；回傳 False 表示 writer 跟不上而丟棄。"""
+        if self.error is not None:
+            raise self._failure() from self.error
+        n = len(data)
+        need = REC_HDR.size + n
+        if self._pos + need > self.block_size and not self._rotate():
+            self.dropped += 1
+            return False
+        ts = self._wall_us(ts_us)
+        if not self._n:
+            self._first_ts = ts
+            self._opened_ns = time.monotonic_ns()
+        buf, pos = self._buf, self._pos
+        REC_HDR.pack_into(buf, pos, ts, (can_id & 0x1FFFFFFF) | (EFF_FLAG if extended else 0),
+                          (FLAG_FD if is_fd else 0) | (FLAG_BRS if brs else 0), n, self.chan if chan is None else chan)
+        pos += REC_HDR.size
+        buf[pos:pos + n] = data
+        self._pos = pos + n
+        self._n += 1
+        self._last_ts = ts
+        self.frames += 1
+        return True
+
+    def add_frames(self, frames: Iterable[RxFrame]) -> None:
+        """一批 RxFrame（recv 的回傳值）；同 add() 但少了逐幀的函式呼叫，沒有 timestamp 的幀共用一個 host 時間。"""
+        if self.error is not None:
+            raise self._failure() from self.error
+        pack, hdr, bs, chan = REC_HDR.pack_into, REC_HDR.size, self.block_size, self.chan
+        host_us = time.time_ns() // 1000
+        off = self._ts_offset
+        buf, pos, n = self._buf, self._pos, self._n
+        added = 0
+        for f in frames:
+            data = f.data
+            ln = len(data)
+            end = pos + hdr + ln
+            if end > bs:
+                self._pos, self._n = pos, n
+                if not self._rotate():
+                    self.dropped += 1
+                    continue
+                buf, pos, n = self._buf, 0, 0
+                end = hdr + ln
+            if f.ts_us:
+                if off is None:
+                    off = self._ts_offset = host_us - f.ts_us
+                ts = f.ts_us + off
+            else:
+                ts = host_us
+            if not n:
+                self._first_ts = ts
+                self._opened_ns = time.monotonic_ns()
+            pack(buf, pos, ts, f.can_id | (EFF_FLAG if f.extended else 0), (FLAG_FD if f.is_fd else 0) | (FLAG_BRS if f.brs else 0),
+                 ln, chan)
+            buf[pos + hdr:end] = data
+            pos = end
+            n += 1
+            added += 1
+            self._last_ts = ts
+        self.frames += added
+        self._pos, self._n = pos, n
+        self.maybe_flush()
+
+    def maybe_flush(self) -> None:
+        """block 開始超過 flush_ms 就先交出（閒置時資料也會落地）；RX loop 每輪呼叫即可。"""
+        if self._n and time.monotonic_ns() - self._opened_ns >= self.flush_ns:
+            self._rotate()
+
+    # ---- writer thread ---- #
+    def _write_loop(self) -> None:
+        f, compress, codec_id = self._f, self._compress, self._codec_id
+        while True:
+            item = self._full.get()
+            if item is None:
+                break
+            buf, length, n, first_ts, last_ts = item
+            if self.error is not None:   # 已經寫壞：不再寫，block 直接還給 RX（close() 才不會等不到空 block）
+                self._free.put(buf)
+                self.lost += n
+                continue
+            t0 = time.perf_counter()
+            raw = bytes(memoryview(buf)[:length])
+            self._free.put(buf)   # 已複製出來，block 可以還給 RX
+            stored, cid = raw, 0
+            try:
+                if codec_id:
+                    packed = compress(raw)
+                    if len(packed) < length:
+                        stored, cid = packed, codec_id
+                f.write(BLOCK_HDR.pack(BLOCK_MAGIC, cid, length, len(stored), n, first_ts, last_ts) + stored)
+            except Exception as e:
+                logging.error("capture %s: write failed, dropping further blocks: %s", self.path, e)
+                self.error = e
+                self.lost += n
+                continue
+            self.write_s += time.perf_counter() - t0
+            self.blocks += 1
+            self.raw_bytes += length
+            self.stored_bytes += BLOCK_HDR.size + len(stored)
+
+    def close(self) -> None:
+        if self._buf is None:
+            return
+        if self._n:
+            while not self._rotate() and self._writer.is_alive():
+                time.sleep(0.001)
+        self._full.put(None)
+        self._writer.join()
+        self._buf = None
+        self._f.close()
+        if self.error is not None and not self._reported:
+            raise self._failure() from self.error
+
+    def format(self) -> str:
+        ratio = self.raw_bytes / max(1, self.stored_bytes - FILE_HDR.size - self.blocks * BLOCK_HDR.size)
+        return (f"capture {os.path.basename(self.path)}: frames={self.frames} dropped={self.dropped} blocks={self.blocks} "
+                f"raw={self.raw_bytes / 1e6:.1f}MB file={self.stored_bytes / 1e6:.1f}MB codec={self.codec} "
+                f"ratio={ratio:.2f} write={self.write_s:.2f}s" + (f" lost={self.lost} error={self.error}" if self.error else ""))
+
+
+# ---------------- 讀取 ---------------- #
+def read_header(f: BinaryIO) -> Tuple[int, int]:
+    """(block_size, created_ns)"""
+    hdr = f.read(FILE_HDR.size)
+    if len(hdr) < FILE_HDR.size:
+        raise ValueError("not a CAN capture (file too short)")
+    magic, version, _, block_size, created_ns, _ = FILE_HDR.unpack(hdr)
+    if magic != MAGIC:
+        raise ValueError("not a CAN capture (bad magic)")
+    if version > VERSION:
+        raise ValueError(f"capture version {version} is newer than this reader ({VERSION})")
+    return block_size, created_ns
+
+
+def iter_records(raw: bytes, n: Optional[int] = None) -> Iterator[CaptureRecord]:
+    """解出一個 block（解壓後）內的 frame records。"""
+    pos, end = 0, len(raw)
+    unpack = REC_HDR.unpack_from
+    while pos < end:
+        ts, cid, flags, length, chan = unpack(raw, pos)
+        pos += REC_HDR.size
+        yield CaptureRecord(ts, cid & 0x1FFFFFFF, bytes(raw[pos:pos + length]), bool(flags & FLAG_FD),
+                            bool(flags & FLAG_BRS), bool(cid & EFF_FLAG), chan)
+        pos += length
+
+
+def read_capture(path: str) -> Iterator[CaptureRecord]:
+    """依序讀出整個檔案（一次一個 block）；最後一個 block 不完整時（寫到一半中斷）忽略。"""
+    with open(path, "rb") as f:
+        read_header(f)
+        while True:
+            hdr = f.read(BLOCK_HDR.size)
+            if len(hdr) < BLOCK_HDR.size:
+                return
+            magic, cid, raw_len, stored_len, n, _, _ = BLOCK_HDR.unpack(hdr)
+            if magic != BLOCK_MAGIC:
+                raise ValueError(f"corrupt capture block at offset {f.tell() - BLOCK_HDR.size}")
+            payload = f.read(stored_len)
+            if len(payload) < stored_len:
+                logging.warning("capture %s: truncated last block (%d frames) ignored", path, n)
+                return
+            yield from iter_records(decompress_block(cid, payload, raw_len))
+
+
+# ---------------- 取樣 / 限速列印 ---------------- #
+class RatePrinter:
+    """每秒最多印 max_per_s 行（每 every 幀取 1 幀）；超過的只計數，每秒補一行摘要。整批一次 write。"""
+
+    def __init__(self, max_per_s: float = 20.0, every: int = 1, out: Any = None):
+        self.max_per_s, self.every = max_per_s, max(1, every)
+        self.out = out or sys.stdout
+        self._window = time.monotonic()
+        self._printed = 0
+        self._skipped = 0
+        self._seen = 0
+
+    @staticmethod
+    def line(f: RxFrame) -> str:
+        if f.is_fd:
+            return f"[RX-FD] id=0x{f.can_id:X} len={len(f.data)} brs={f.brs} data={f.data.hex(' ')}"
+        return f"[RX]    id=0x{f.can_id:X} dlc={len(f.data)} data={f.data.hex(' ')}"
+
+    def feed(self, frames: List[RxFrame]) -> None:
+        now = time.monotonic()
+        lines: List[str] = []
+        if now - self._window >= 1.0:
+            if self._skipped:
+                lines.append(f"[...]   {self._skipped} frames not shown in the last {now - self._window:.1f}s")
+            self._window, self._printed, self._skipped = now, 0, 0
+        if self.max_per_s > 0:
+            for f in frames:
+                self._seen += 1
+                if self._seen % self.every or self._printed >= self.max_per_s:
+                    self._skipped += 1
+                    continue
+                self._printed += 1
+                lines.append(self.line(f))
+        if lines:
+            self.out.write("\n".join(lines) + "\n")
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+asyncio 版模擬 Server（可插拔 transport，一個 event loop 模擬多個 channel）
+
+- RX / TX / 週期工作 / startup burst / 回應規則全部是同一個 event loop 上的 coroutine
+- 底層 can_transport.CanTransport（ZLG / SocketCAN）的阻塞呼叫集中在每個 channel 專屬的單一 executor thread
+- TX 佇列與同步版相同（tx_queue.TxQueue：有上限、ID 小的先送、--tx-policy）；
+  event loop 上不能阻塞，policy=block 時滿了直接丟棄新幀並計數
+- 設定檔、adapter / --dbc / --transport 參數與 can_sim_server_zlg.py 相同；
+  ZLG 用 --chans 0,1、SocketCAN / vbus 用 --ifname vcan0,vcan1 一次模擬多個 channel
+  （vbus 同名即同一條 bus：--ifname bus0,bus0 是兩個 Server 節點掛在同一條虛擬 bus 上）
+
+Transport 介面（AsyncTransport）：
+    async recv() -> List[(can_id, data)]     # 一批收到的幀
+    async send(frames) -> int                 # 送出一批
+    async close()
+內建 ExecutorTransport（包任一 CanTransport，ZLG / SocketCAN / vbus 皆同）與 MemoryTransport（--dry-run；inject() 可灌入假幀，echo=True 時 TX 回灌為 RX）。
+"""
+from __future__ import annotations
+import asyncio, logging, signal
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from can_sim_server_zlg import (CanParserAdapter, SimConfig, build_arg_parser, load_config, load_parsers,
+                                build_signal_owners, encode_with_parsers, job_signals, matching_rules)
+from can_transport import CanTransport, ZlgTransport, load_zlgcan, open_transport, zlg_open_device
+from periodic_scheduler import PeriodicScheduler, ScheduledJob
+from signal_state import SignalState
+from tx_queue import TxQueue
+from zlg_rx_engine import RxConfig
+
+Frame = Tuple[int, bytes]
+
+
+class AsyncTransport:
+    name = "transport"
+
+    async def recv(self) -> List[Frame]:
+        raise NotImplementedError
+
+    async def send(self, frames: List[Frame]) -> int:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class ExecutorTransport(AsyncTransport):
+    """包一個已 open 的 CanTransport；所有呼叫都在同一條專屬 executor thread 上執行（RX 與 TX 依序，不會同時進 DLL / socket）。"""
+
+    def __init__(self, transport: CanTransport, name: str = "", block_ms: float = 5):
+        self.transport, self.name = transport, name or transport.name
+        # RX 阻塞等待會佔住 executor，TX 最多因此延遲 block_ms，所以預設比同步版短
+        self.block_ms = block_ms
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"can-{self.name}")
+
+    def _recv_blocking(self) -> List[Frame]:
+        return [(f.can_id, f.data) for f in self.transport.recv(self.block_ms)]
+
+    async def recv(self) -> List[Frame]:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._recv_blocking)
+
+    async def send(self, frames: List[Frame]) -> int:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self.transport.send, frames)
+
+    async def close(self) -> None:
+        await asyncio.get_running_loop().run_in_executor(self._executor, self.transport.close)
+        self._executor.shutdown(wait=False)
+        logging.info("[%s] %s", self.name, self.transport.format_stats())
+
+
+class MemoryTransport(AsyncTransport):
+    """不接硬體：TX 印出（或回灌 RX），RX 只收 inject() 進來的幀。"""
+
+    def __init__(self, name: str = "mem", echo: bool = False, print_tx: bool = True):
+        self.name, self.echo, self.print_tx = name, echo, print_tx
+        self._rx: "asyncio.Queue[Frame]" = asyncio.Queue()
+
+    def inject(self, can_id: int, data: bytes) -> None:
+        self._rx.put_nowait((can_id, data))
+
+    async def recv(self) -> List[Frame]:
+        batch = [await self._rx.get()]
+        while not self._rx.empty():
+            batch.append(self._rx.get_nowait())
+        return batch
+
+    async def send(self, frames: List[Frame]) -> int:
+        for can_id, payload in frames:
+            if self.print_tx:
+                print(f"TX[{self.name}] 0x{can_id:X} {payload.hex()}")
+            if self.echo:
+                self.inject(can_id, payload)
+        return len(frames)
+
+
+class AsyncSimServer:
+    def __init__(self, transport: AsyncTransport, parsers_by_id: Dict[Optional[int], CanParserAdapter],
+                 cfg: SimConfig, tx_queue_max: int = 4096, tx_policy: str = "drop_oldest"):
+        self.transport = transport
+        self.name = transport.name
+        self.parsers_by_id, self.cfg = parsers_by_id, cfg
+        self.signal_owners = build_signal_owners(parsers_by_id)
+        self.state = SignalState()
+        self._tx_q = TxQueue(tx_queue_max, tx_policy)
+        self._tx_ready = asyncio.Event()
+        self.scheduler = PeriodicScheduler(self._on_jobs_due)
+        self._stop = asyncio.Event()
+        self._tasks: List["asyncio.Task"] = []
+        self._rx_listeners: List[Callable[[int, Dict[str, Any]], None]] = []
+
+    def add_rx_listener(self, cb: Callable[[int, Dict[str, Any]], None]) -> None:
+        """cb(can_id, changed)：每收到一幀且有 signal 變動時呼叫，changed 只含有變的 signal。"""
+        self._rx_listeners.append(cb)
+
+    def _choose_parser(self, can_id: int) -> Optional[CanParserAdapter]:
+        return self.parsers_by_id.get(can_id) or self.parsers_by_id.get(None)
+
+    async def start(self) -> None:
+        for b in self.cfg.startup_burst:
+            self.scheduler.add(f"startup:{b.name}", 0, payload=b, delay_ms=b.delay_ms)
+        for job in self.cfg.periodic:
+            self.scheduler.add(f"periodic:{job.name}", job.interval_ms, payload=job)
+        self._tasks = [
+            asyncio.create_task(self._rx_task(), name=f"{self.name}:rx"),
+            asyncio.create_task(self._tx_task(), name=f"{self.name}:tx"),
+            asyncio.create_task(self.scheduler.run_async(self._stop), name=f"{self.name}:sched"),
+        ]
+        logging.info("[%s] started (%d periodic, %d rules)", self.name, len(self.cfg.periodic), len(self.cfg.respond))
+
+    async def stop(self) -> None:
+        self._stop.set()
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self.transport.close()
+        for line in self.scheduler.format_stats():
+            logging.info("[%s] sched %s", self.name, line)
+        logging.info("[%s] %s", self.name, self._tx_q.format())
+
+    # ---- TX ---- #
+    def _enqueue(self, frames: List[Frame]) -> None:
+        dropped = self._tx_q.dropped
+        for item in frames:
+            self._tx_q.put(item, block=False)
+        if self._tx_q.dropped and not dropped:
+            logging.warning("[%s] TX queue full (max=%d, policy=%s); dropping frames", self.name,
+                            self._tx_q.maxsize, self._tx_q.policy)
+        if frames:
+            self._tx_ready.set()
+
+    async def _tx_task(self) -> None:
+        # 一次取走佇列內全部的幀（依 ID 優先），transport 內再依 tx_batch 切成多次 Transmit（只換一次 executor thread）
+        while True:
+            await self._tx_ready.wait()
+            self._tx_ready.clear()
+            batch: List[Frame] = []
+            while not self._tx_q.empty():
+                batch.append(self._tx_q.get_nowait())
+            if not batch:
+                continue
+            try:
+                await self.transport.send(batch)
+            except Exception as e:
+                logging.error("[%s] send error (%d frames, first 0x%X): %s", self.name, len(batch), batch[0][0], e)
+            self._tx_q.sent()
+
+    def _on_jobs_due(self, jobs: List[ScheduledJob]) -> None:
+        values = self.state.values
+        frames: List[Frame] = []
+        for sj in jobs:
+            try:
+                frames.extend(encode_with_parsers(self.parsers_by_id, job_signals(sj.payload, values), values,
+                                                  self.signal_owners))
+            except Exception:
+                logging.exception("[%s] Encode error in %s", self.name, sj.name)
+        self._enqueue(frames)
+
+    # ---- RX ---- #
+    async def _rx_task(self) -> None:
+        while True:
+            try:
+                frames = await self.transport.recv()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logging.exception("[%s] recv error", self.name)
+                await asyncio.sleep(0.1)
+                continue
+            for can_id, data in frames:
+                self._on_rx_frame(can_id, data)
+
+    def _on_rx_frame(self, can_id: int, data: bytes) -> None:
+        parser = self._choose_parser(can_id)
+        if parser:
+            try:
+                changed = parser.parse_changed(can_id, data)
+                if changed:
+                    self.state.update(changed)
+                    for cb in self._rx_listeners:
+                        cb(can_id, changed)
+            except Exception:
+                logging.exception("[%s] Decode error 0x%X", self.name, can_id)
+        try:
+            for rule in matching_rules(self.cfg, can_id, data):
+                if rule.resp_signals:
+                    self._enqueue(encode_with_parsers(self.parsers_by_id, rule.resp_signals, self.state.values,
+                                                      self.signal_owners))
+                elif rule.raw_can_id is not None and rule.raw_data is not None:
+                    self._enqueue([(rule.raw_can_id, rule.raw_data)])
+        except Exception:
+            logging.exception("[%s] Respond error 0x%X", self.name, can_id)
+
+
+def parse_args():
+    p = build_arg_parser()
+    p.description = "asyncio ZLG Simulate/Response Server (pluggable transport, multi-channel on one event loop)"
+    p.add_argument("--chans", help="Comma-separated channels simulated on one event loop, e.g. '0,1' (overrides --chan)")
+    p.add_argument("--echo", action="store_true", help="Dry-run only: loop TX frames back into RX (exercises response rules)")
+    p.set_defaults(rx_block_ms=5)
+    return p.parse_args()
+
+
+async def amain(args) -> int:
+    cfg = load_config(args.config)
+    by_name = args.transport in ("socketcan", "vbus")   # channel = 介面 / bus 名稱
+    if by_name:
+        chans: List[Any] = [n.strip() for n in args.ifname.split(",") if n.strip()]
+    else:
+        chans = [int(c, 0) for c in args.chans.split(",")] if args.chans else [args.chan]
+    rx_cfg = RxConfig(batch_fd=args.rx_batch, batch=args.rx_batch, block_ms=args.rx_block_ms)
+
+    zcanlib = dev_handle = None
+    if not args.dry_run and not by_name:
+        zcanlib = load_zlgcan()
+        dev_handle = zlg_open_device(zcanlib, args.dev_type, args.dev_idx)
+
+    servers: List[AsyncSimServer] = []
+    for ch in chans:
+        name = ch if by_name else f"ch{ch}"
+        if args.dry_run:
+            transport: AsyncTransport = MemoryTransport(name, echo=bool(args.echo))
+        elif by_name:
+            tr: CanTransport = open_transport(args, ifname=ch, rx_cfg=rx_cfg)
+            transport = ExecutorTransport(tr, name, args.rx_block_ms)
+        else:
+            tr = ZlgTransport(zcanlib, args.dev_type, args.dev_idx, ch, args.abit, args.dbit, loopback=bool(args.loopback),
+                              rx_cfg=rx_cfg, tx_batch=args.tx_batch, dev_handle=dev_handle, name=name).open()
+            transport = ExecutorTransport(tr, name, args.rx_block_ms)
+        # 每個 channel 各自一組 parser（parse_changed 的上一幀快取是 per channel）
+        servers.append(AsyncSimServer(transport, load_parsers(args), cfg, tx_queue_max=args.tx_queue_max,
+                                      tx_policy=args.tx_policy))
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for s in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(s, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass  # Windows：Ctrl+C 會以 KeyboardInterrupt 取消 amain，一樣走 finally
+    try:
+        for srv in servers:
+            await srv.start()
+        await stop.wait()
+    finally:
+        for srv in servers:
+            await srv.stop()
+        if dev_handle is not None and zcanlib is not None:
+            try:
+                zcanlib.ZCAN().CloseDevice(dev_handle)
+            except Exception:
+                pass
+    return 0
+
+
+def main() -> int:
+    args = parse_args()
+    logging.basicConfig(level=getattr(logging, args.log_level), format="[%(levelname)s] %(message)s")
+    try:
+        return asyncio.run(amain(args))
+    except KeyboardInterrupt:
+        return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -2,8 +2,9 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 import argparse, importlib, logging, threading, time, queue, signal, sys, os
+from collections import OrderedDict
 from dataclasses import dataclass, field
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from pathlib import Path
 
 SCRIPT_DIR = Path(__file__).resolve().parent
@@ -20,24 +21,115 @@ if hasattr(os, "add_dll_directory"):
         try: os.add_dll_directory(str(kd))
         except Exception: pass
 
+from zlg_rx_engine import RxConfig
+from can_transport import CanTransport, ZlgTransport, add_transport_args, load_zlgcan, open_transport
+from periodic_scheduler import PeriodicScheduler, ScheduledJob
+from formula_engine import compile_values, evaluate
+from signal_state import SignalState
+from tx_queue import POLICIES as TX_POLICIES, TxQueue
+
 def _ensure_zlg_loaded():
-    import importlib
-    return importlib.import_module("zlgcan")
+    return load_zlgcan()
 
 class CanParserAdapter:
-    def __init__(self, module_name: str):
-        mod = importlib.import_module(module_name)
+    def __init__(self, module_name: str, codec: Any = None, encode_cache_size: int = 256):
+        # codec: 已建立好、具 parse_frame/encode_signals 的物件（例如 DbcRuntimeCodec），就不用 import 模組
+        mod = codec if codec is not None else importlib.import_module(module_name)
         self._parse = getattr(mod, "parse_frame", None)
         self._encode = getattr(mod, "encode_signals", None)
         if self._parse is None:
             raise RuntimeError(f"{module_name} must define parse_frame(can_id:int,data:bytes)->dict")
         if self._encode is None:
             logging.warning("encode_signals() not found; only parse/respond(raw) will work.")
+        # parse_changed(can_id, prev, data) 為選配；沒有就完整解碼後與上次結果比較
+        self._parse_changed = getattr(mod, "parse_changed", None)
+        # 這個 adapter 編碼得出的 signal names（SIGNALS / SIGNAL_OWNERS / codec.signal_owners，取第一個有定義的）；
+        # None 表示未知，更新一律交給它。空集合多半是 adapter 沒取到欄位，同樣當未知處理並警告，免得更新全被濾掉
+        names = next((n for n in (getattr(mod, a, None) for a in ("SIGNALS", "SIGNAL_OWNERS", "signal_owners"))
+                      if n is not None), None)
+        if names is not None and not names:
+            logging.warning("%s: empty signal list; routing every update to it", module_name)
+            names = None
+        self.signal_names: Optional[frozenset] = frozenset(names) if names is not None else None
+        self._last: Dict[int, bytes] = {}
+        self._last_dec: Dict[int, Dict[str, Any]] = {}
+        # encode LRU：同一組 updates 直接回傳上次的 frames（codec 自己有快取時不重複包一層）
+        self._encode_lru: "OrderedDict[frozenset, Tuple[Tuple[int, bytes], ...]]" = OrderedDict()
+        self.encode_cache_size = 0 if getattr(mod, "encode_cached", False) else max(0, int(encode_cache_size))
+        # 上一幀 patch（選配）：模組提供 SIGNAL_PATCHERS = {can_id: {signal: (clear_mask, default, insert)}} 與
+        # patch_payload，且 encode_signals 對其中每個 can_id 各回傳一幀（未提供的 signal 取預設值）時，
+        # LRU 沒命中就以各 ID 上一幀為底只改寫變動的 signal 位元（同 DbcRuntimeCodec）
+        self._patchers: Optional[Dict[int, Dict[str, Tuple]]] = getattr(mod, "SIGNAL_PATCHERS", None)
+        self._patch = getattr(mod, "patch_payload", None)
+        if self._patch is None or not self._patchers or any(p is None for p in self._patchers.values()):
+            self._patchers = None
+        self._last_tx: Dict[int, Tuple[Dict[str, Any], bytes]] = {}
+        self.encode_stats = {"hits": 0, "patched": 0, "full": 0}
     def parse(self, can_id: int, data: bytes) -> Dict[str, Any]:
         return self._parse(can_id, data)
+    def parse_changed(self, can_id: int, data: bytes) -> Dict[str, Any]:
+        """只回傳與同 ID 上一幀相比有變動的 signal；payload 完全相同時不解碼，回傳 {}。
+        解碼成功後才記住這一幀，解碼丟例外時下一幀仍與上一個成功解碼的幀比較。"""
+        prev = self._last.get(can_id)
+        if prev == data:
+            return {}
+        if self._parse_changed is not None:
+            out = self._parse(can_id, data) if prev is None else self._parse_changed(can_id, prev, data)
+            self._last[can_id] = data
+            return out
+        dec = self._parse(can_id, data)
+        self._last[can_id] = data
+        last = self._last_dec.get(can_id)
+        self._last_dec[can_id] = dec
+        if last is None:
+            return dec
+        return {k: v for k, v in dec.items() if k not in last or last[k] != v}
+    def _patch_encode(self, updates: Dict[str, Any]) -> Optional[Tuple[Tuple[int, bytes], ...]]:
+        """每個 ID 以上一幀為底只改寫變動的 signal；任一 ID 還沒有上一幀或變動太多時回傳 None（完整編碼）。"""
+        frames = []
+        for can_id, patchers in self._patchers.items():
+            last = self._last_tx.get(can_id)
+            if last is None:
+                return None
+            payload = self._patch(last[0], last[1], {k: v for k, v in updates.items() if k in patchers}, patchers)
+            if payload is None:
+                return None
+            frames.append((can_id, payload))
+        return tuple(frames)
+    def _remember(self, updates: Dict[str, Any], frames) -> None:
+        for can_id, payload in frames:
+            patchers = self._patchers.get(can_id)
+            if patchers is not None:
+                self._last_tx[can_id] = ({k: v for k, v in updates.items() if k in patchers}, payload)
     def encode(self, updates: Dict[str, Any]) -> List[Tuple[int, bytes]]:
         if self._encode is None: return []
-        return list(self._encode(updates))
+        key = None
+        if self.encode_cache_size:
+            try:
+                key = frozenset(updates.items())
+            except TypeError:
+                key = None  # 值不可 hash（例如 list）：不走 LRU
+            if key is not None:
+                frames = self._encode_lru.get(key)
+                if frames is not None:
+                    self._encode_lru.move_to_end(key)
+                    self.encode_stats["hits"] += 1
+                    if self._patchers is not None:
+                        self._remember(updates, frames)
+                    return list(frames)
+        frames = self._patch_encode(updates) if self._patchers is not None else None
+        if frames is not None:
+            self.encode_stats["patched"] += 1
+        else:
+            frames = tuple(self._encode(updates))
+            self.encode_stats["full"] += 1
+        if self._patchers is not None:
+            self._remember(updates, frames)
+        if key is not None:
+            self._encode_lru[key] = frames
+            if len(self._encode_lru) > self.encode_cache_size:
+                self._encode_lru.popitem(last=False)
+        return list(frames)
 
 DEFAULT_CONFIG_YAML = r"""
 periodic:
@@ -81,6 +173,26 @@ class ResponseRule:
     resp_signals: Dict[str, Any] = field(default_factory=dict)
     raw_can_id: Optional[int] = None
     raw_data: Optional[bytes] = None
+    # 由 request_mask / request_data 預先編譯：int.from_bytes(data[:match_len], "little") & match_mask == match_value
+    match_len: int = field(default=0, init=False)
+    match_mask: int = field(default=0, init=False)
+    match_value: int = field(default=0, init=False)
+    def __post_init__(self) -> None:
+        if self.request_mask is None or self.request_data is None:
+            return  # 沒有同時給 mask 與 data：只比對 ID
+        n = max(len(self.request_mask), len(self.request_data))
+        mask = self.request_mask.ljust(n, b"\x00")
+        n = len(mask.rstrip(b"\x00"))  # 只需要比到最後一個有遮罩的 byte（可超過 8，比對 FD payload）
+        self.match_len = n
+        self.match_mask = int.from_bytes(mask[:n], "little")
+        self.match_value = int.from_bytes(self.request_data.ljust(n, b"\x00")[:n], "little") & self.match_mask
+    def matches(self, data: bytes) -> bool:
+        n = self.match_len
+        if not n:
+            return True
+        if len(data) < n:
+            return False
+        return int.from_bytes(data[:n], "little") & self.match_mask == self.match_value
 @dataclass
 class StartupBurst:
     name: str
@@ -91,6 +203,15 @@ class SimConfig:
     periodic: List[PeriodicJob] = field(default_factory=list)
     respond: List[ResponseRule] = field(default_factory=list)
     startup_burst: List[StartupBurst] = field(default_factory=list)
+    # request_id -> rules（依設定檔順序），收包時一次 dict 查詢
+    respond_by_id: Dict[int, List[ResponseRule]] = field(default_factory=dict, init=False)
+    def __post_init__(self) -> None:
+        self.index_rules()
+    def index_rules(self) -> None:
+        """respond 有增減時需重新呼叫。"""
+        self.respond_by_id = {}
+        for rule in self.respond:
+            self.respond_by_id.setdefault(rule.request_id, []).append(rule)
 
 def _hx(s: Optional[str]) -> Optional[bytes]:
     if s is None: return None
@@ -106,237 +227,251 @@ def load_config(path: Optional[str]) -> SimConfig:
             cfg_text = f.read()
     data = yaml.safe_load(cfg_text) if yaml else {}
     periodic, respond, startup_burst = [], [], []
+    # 字串值（公式）在這裡驗證並編譯一次；語法錯誤或不允許的名稱直接丟 FormulaError
     for p in (data.get("periodic") or []):
+        name = str(p.get("name","job"))
         periodic.append(PeriodicJob(
-            name=str(p.get("name","job")),
+            name=name,
             interval_ms=int(p.get("interval_ms",100)),
-            signals=dict(p.get("signals") or {}),
-            formulas=dict(p.get("formulas") or {}),
+            signals=compile_values(dict(p.get("signals") or {}), f"periodic[{name}].signals"),
+            formulas=compile_values(dict(p.get("formulas") or {}), f"periodic[{name}].formulas"),
         ))
     for r in (data.get("respond") or []):
         resp = r.get("response") or {}
+        name = str(r.get("name","rule"))
         respond.append(ResponseRule(
-            name=str(r.get("name","rule")),
+            name=name,
             request_id=int(str(r.get("request_id")),0),
             request_mask=_hx(r.get("request_mask")),
             request_data=_hx(r.get("request_data")),
-            resp_signals=dict(resp.get("signals") or {}),
+            resp_signals=compile_values(dict(resp.get("signals") or {}), f"respond[{name}].response.signals"),
             raw_can_id=(int(str(resp.get("can_id")),0) if resp.get("can_id") is not None else None),
             raw_data=_hx(resp.get("data")),
         ))
     for b in (data.get("startup_burst") or []):
+        name = str(b.get("name","burst"))
         startup_burst.append(StartupBurst(
-            name=str(b.get("name","burst")),
+            name=name,
             delay_ms=int(b.get("delay_ms",0)),
-            signals=dict(b.get("signals") or {}),
+            signals=compile_values(dict(b.get("signals") or {}), f"startup_burst[{name}].signals"),
         ))
     return SimConfig(periodic=periodic, respond=respond, startup_burst=startup_burst)
 
-def _eval_formula(expr: str, state: Dict[str, Any], tnow_ms: float) -> Any:
-    return eval(expr, {"__builtins__": {}}, {"state": state, "tnow_ms": tnow_ms})
-
-def _build_dev_map(zcanlib) -> Dict[str, int]:
-    names = [
-        "ZCAN_USBCANFD_100U",
-        "ZCAN_USBCANFD_100U_MINI",
-        "ZCAN_USBCANFD_200U",
-        "ZCAN_USBCANFD_400U",
-        "ZCAN_USBCANFD_800U",
-    ]
-    dev_map = {}
-    for nm in names:
-        val = getattr(zcanlib, nm, None)
-        if val is not None:
-            dev_map[nm.replace("ZCAN_", "")] = val
-    return dev_map
-
-def zlg_open_device(zcanlib, dev_type: str, dev_idx: int) -> int:
-    dev_map = _build_dev_map(zcanlib)
-    dtype = dev_map.get(dev_type.upper())
-    if dtype is None:
-        raise RuntimeError(f"Unsupported dev type '{dev_type}'. Choose one of: {list(dev_map.keys())}")
-    lib = zcanlib.ZCAN()
-    handle = lib.OpenDevice(dtype, dev_idx, 0)
-    if handle == getattr(zcanlib, "INVALID_DEVICE_HANDLE", 0):
-        raise RuntimeError("OpenDevice failed")
-    return handle
-
-def zlg_start_channel(zcanlib, dev_handle: int, chn: int, abit: int, dbit: int, loopback: bool=False) -> int:
-    lib = zcanlib.ZCAN()
-    if lib.ZCAN_SetValue(dev_handle, f"{chn}/canfd_abit_baud_rate", str(abit).encode("utf-8")) != getattr(zcanlib, "ZCAN_STATUS_OK", 1):
-        raise RuntimeError("Set arbitration bitrate failed")
-    if lib.ZCAN_SetValue(dev_handle, f"{chn}/canfd_dbit_baud_rate", str(dbit).encode("utf-8")) != getattr(zcanlib, "ZCAN_STATUS_OK", 1):
-        raise RuntimeError("Set data bitrate failed")
-    lib.ZCAN_SetValue(dev_handle, f"{chn}/initenal_resistance", b"1")
-    cfg = zcanlib.ZCAN_CHANNEL_INIT_CONFIG()
-    cfg.can_type = getattr(zcanlib, "ZCAN_TYPE_CANFD", 1)
-    cfg.config.canfd.mode = 1 if loopback else 0
-    chn_handle = lib.InitCAN(dev_handle, chn, cfg)
-    if chn_handle is None:
-        raise RuntimeError("InitCAN failed")
-    lib.ZCAN_SetValue(dev_handle, f"{chn}/set_device_tx_echo", b"0")
-    if lib.StartCAN(chn_handle) != getattr(zcanlib, "ZCAN_STATUS_OK", 1):
-        raise RuntimeError("StartCAN failed")
-    return chn_handle
+SignalOwners = Dict[Optional[str], List[CanParserAdapter]]
+
+def build_signal_owners(parsers_by_id: Dict[Optional[int], CanParserAdapter]) -> SignalOwners:
+    """signal name -> 編碼得出它的 adapters；key None 放 signal 未知的 adapter（每次更新都交給它）。
+    有 catch-all parser 時只用它（它自己依 signal 分 message）。parsers_by_id 有增減時需重建。"""
+    catch_all = parsers_by_id.get(None)
+    adapters = [catch_all] if catch_all else list(parsers_by_id.values())
+    owners: SignalOwners = {None: []}
+    for pr in adapters:
+        if catch_all or pr.signal_names is None:
+            owners[None].append(pr)
+            continue
+        for name in pr.signal_names:
+            owners.setdefault(name, []).append(pr)
+    return owners
+
+def encode_with_parsers(parsers_by_id: Dict[Optional[int], CanParserAdapter], signals: Dict[str, Any],
+                        state: Dict[str, Any], owners: Optional[SignalOwners] = None) -> List[Tuple[int, bytes]]:
+    """Formula / 字串值當公式（可讀 state / tnow_ms）求值後，依 signal 分給擁有它的 adapter 編碼，
+    只送出受影響的 message（owners 由 build_signal_owners 預先建好；未給則每次現建）。"""
+    if owners is None:
+        owners = build_signal_owners(parsers_by_id)
+    tnow_ms = time.time()*1000.0
+    prepared: Dict[str, Any] = {k: evaluate(v, state, tnow_ms) for k, v in signals.items()}
+    per_adapter: Dict[CanParserAdapter, Dict[str, Any]] = {pr: dict(prepared) for pr in owners[None]}
+    for k, v in prepared.items():
+        for pr in owners.get(k, ()):
+            sub = per_adapter.get(pr)
+            if sub is None:
+                per_adapter[pr] = sub = {}
+            sub[k] = v
+    frames: List[Tuple[int, bytes]] = []
+    for pr, updates in per_adapter.items():
+        frames.extend(pr.encode(updates))
+    return frames
+
+def job_signals(job: Any, state: Dict[str, Any]) -> Dict[str, Any]:
+    """PeriodicJob / StartupBurst 這一次要送的 signals（formulas 於觸發當下求值）。"""
+    signals = dict(job.signals)
+    formulas = getattr(job, "formulas", None)
+    if formulas:
+        tnow_ms = time.time()*1000.0
+        for k, expr in formulas.items():
+            signals[k] = evaluate(expr, state, tnow_ms)
+    return signals
+
+def matching_rules(cfg: SimConfig, can_id: int, data: bytes) -> List[ResponseRule]:
+    rules = cfg.respond_by_id.get(can_id)
+    if not rules:
+        return []
+    return [rule for rule in rules if rule.matches(data)]
 
 class ZlgSimServer:
     def __init__(self, zcanlib, dev_handle: Optional[int], chn_handle: Optional[int],
-                 parsers_by_id: Dict[Optional[int], CanParserAdapter], cfg: SimConfig, dry_run: bool=False):
+                 parsers_by_id: Dict[Optional[int], CanParserAdapter], cfg: SimConfig, dry_run: bool=False,
+                 rx_cfg: Optional[RxConfig]=None, rx_stats_sec: float=0.0,
+                 tx_batch: int=64, tx_flush_ms: float=0.0, tx_queue_max: int=4096, tx_policy: str="drop_oldest",
+                 transport: Optional[CanTransport]=None):
+        """transport：已 open 的 CanTransport（ZLG / SocketCAN）；沒給但有 chn_handle 時包成 ZlgTransport。"""
         self.zcanlib, self.dev_handle, self.chn_handle = zcanlib, dev_handle, chn_handle
         self.parsers_by_id = parsers_by_id
+        self.signal_owners = build_signal_owners(parsers_by_id)
         self.cfg, self.dry_run = cfg, dry_run
-        self.state: Dict[str, Any] = {}
+        # RX thread 寫入；排程 / 回應規則讀 self.state.values（不拿鎖的 snapshot）
+        self.state = SignalState()
         self._stop = threading.Event()
-        self._tx_q: "queue.Queue[Tuple[int, bytes]]" = queue.Queue()
+        # 有上限、ID 小的先出列；滿了依 tx_policy 處理（drop_oldest / coalesce / block）
+        self._tx_q = TxQueue(tx_queue_max, tx_policy)
         self._threads: List[threading.Thread] = []
+        self._rx_listeners: List[Callable[[int, Dict[str, Any]], None]] = []
+        self.rx_cfg, self.rx_stats_sec = rx_cfg or RxConfig(), rx_stats_sec
+        # TX：一次最多送 tx_batch 幀；tx_flush_ms > 0 時，第一幀進來後最多再等這麼久湊批
+        self.tx_batch, self.tx_flush_ms = max(1, tx_batch), tx_flush_ms
+        if transport is None and chn_handle is not None and not dry_run:
+            transport = ZlgTransport(zcanlib, rx_cfg=self.rx_cfg, tx_batch=self.tx_batch,
+                                     dev_handle=dev_handle, chn_handle=chn_handle).open()
+        self.transport = None if dry_run else transport
+        # 週期工作與 startup burst 共用一條排程 thread（heap + monotonic_ns 絕對 deadline）
+        self.scheduler = PeriodicScheduler(self._on_jobs_due)
+
+    def add_rx_listener(self, cb: Callable[[int, Dict[str, Any]], None]) -> None:
+        """cb(can_id, changed)：每收到一幀且有 signal 變動時呼叫，changed 只含有變的 signal。"""
+        self._rx_listeners.append(cb)
 
     def _choose_parser(self, can_id:int) -> Optional[CanParserAdapter]:
         return self.parsers_by_id.get(can_id) or self.parsers_by_id.get(None)
 
-    def start(self) -> None:
-        if self.chn_handle is not None:
+    def start(self, rx: bool = True, schedule: bool = True) -> None:
+        """rx=False：不從 transport 收包（例如 log_replay.py 自己餵幀）；schedule=False：不跑 periodic / startup_burst。"""
+        if rx and self.transport is not None:
             t = threading.Thread(target=self._rx_loop, name="rx", daemon=True)
             t.start(); self._threads.append(t)
         ttx = threading.Thread(target=self._tx_loop, name="tx", daemon=True)
         ttx.start(); self._threads.append(ttx)
+        if not schedule:
+            return
         for b in self.cfg.startup_burst:
-            threading.Timer(b.delay_ms/1000.0, self._enqueue_signals, args=(b.signals, f"startup:{b.name}")).start()
+            self.scheduler.add(f"startup:{b.name}", 0, payload=b, delay_ms=b.delay_ms)
         for job in self.cfg.periodic:
-            t = threading.Thread(target=self._periodic_loop, args=(job,), name=f"per:{job.name}", daemon=True)
-            t.start(); self._threads.append(t)
+            self.scheduler.add(f"periodic:{job.name}", job.interval_ms, payload=job)
+        tsch = threading.Thread(target=self.scheduler.run, args=(self._stop,), name="sched", daemon=True)
+        tsch.start(); self._threads.append(tsch)
 
     def stop(self) -> None:
         self._stop.set()
         for t in self._threads: t.join(timeout=0.5)
+        for line in self.scheduler.format_stats():
+            logging.info("sched %s", line)
+        logging.info("%s", self._tx_q.format())
+
+    def _on_rx_frame(self, can_id: int, data: bytes) -> None:
+        # 只解碼/更新有變動的 signal；回應規則則每一幀都要檢查
+        parser = self._choose_parser(can_id)
+        if parser:
+            try:
+                changed = parser.parse_changed(can_id, data)
+                if changed:
+                    self.state.update(changed)
+                    for cb in self._rx_listeners:
+                        cb(can_id, changed)
+            except Exception:
+                logging.exception("Decode error 0x%X", can_id)
+        try:
+            self._maybe_respond(can_id, data)
+        except Exception:
+            logging.exception("Respond error 0x%X", can_id)
 
     def _rx_loop(self) -> None:
-        assert self.chn_handle is not None
-        lib = self.zcanlib.ZCAN()
-        logging.info("RX loop started")
+        tr = self.transport
+        assert tr is not None
+        logging.info("RX loop started (%s)", tr.name)
+        next_report = time.monotonic() + self.rx_stats_sec
         while not self._stop.is_set():
-            rcv_canfd_num = lib.GetReceiveNum(self.chn_handle, getattr(self.zcanlib, "ZCAN_TYPE_CANFD", 1))
-            if rcv_canfd_num:
-                n = min(rcv_canfd_num, 200)
-                msgs, got = lib.ReceiveFD(self.chn_handle, n, 100)
-                for i in range(got):
-                    frame = msgs[i].frame
-                    can_id = frame.can_id & 0x1FFFFFFF
-                    data = bytes(frame.data[:frame.len])
-                    parser = self._choose_parser(can_id)
-                    if parser:
-                        try:
-                            dec = parser.parse(can_id, data)
-                            if dec: self.state.update(dec)
-                        except Exception:
-                            logging.exception("Decode FD error 0x%X", can_id)
-                    try:
-                        self._maybe_respond(can_id, data)
-                    except Exception:
-                        logging.exception("Respond FD error 0x%X", can_id)
-            rcv_num = lib.GetReceiveNum(self.chn_handle, getattr(self.zcanlib, "ZCAN_TYPE_CAN", 0))
-            if rcv_num:
-                n = min(rcv_num, 200)
-                msgs, got = lib.Receive(self.chn_handle, n, 100)
-                for i in range(got):
-                    frame = msgs[i].frame
-                    can_id = frame.can_id & 0x1FFFFFFF
-                    if frame.can_id & (1<<30): data = b""
-                    else:
-                        dlc = frame.can_dlc
-                        data = bytes(frame.data[:dlc])
-                    parser = self._choose_parser(can_id)
-                    if parser:
-                        try:
-                            dec = parser.parse(can_id, data)
-                            if dec: self.state.update(dec)
-                        except Exception:
-                            logging.exception("Decode error 0x%X", can_id)
-                    try:
-                        self._maybe_respond(can_id, data)
-                    except Exception:
-                        logging.exception("Respond error 0x%X", can_id)
-            time.sleep(0.001)
+            for f in tr.recv(self.rx_cfg.block_ms):
+                self._on_rx_frame(f.can_id, f.data)
+            if self.rx_stats_sec > 0 and time.monotonic() >= next_report:
+                logging.info("%s", tr.format_stats())
+                next_report += self.rx_stats_sec
+        logging.info("RX loop stopped: %s", tr.format_stats())
+
+    def _drain_tx(self, first: Tuple[int, bytes]) -> List[Tuple[int, bytes]]:
+        """取出佇列內已排隊的幀（最多 tx_batch）；tx_flush_ms 內持續等待後續幀湊批。"""
+        batch = [first]
+        deadline = time.monotonic() + self.tx_flush_ms / 1000.0
+        while len(batch) < self.tx_batch:
+            try:
+                batch.append(self._tx_q.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._tx_q.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
 
     def _tx_loop(self) -> None:
-        logging.info("TX loop started (dry_run=%s)", self.dry_run)
+        logging.info("TX loop started (dry_run=%s, batch=%d, flush=%.1fms)", self.dry_run, self.tx_batch, self.tx_flush_ms)
+        tx = self.transport
         while not self._stop.is_set():
             try:
-                can_id, payload = self._tx_q.get(timeout=0.1)
+                first = self._tx_q.get(timeout=0.1)
             except queue.Empty:
                 continue
-            if self.dry_run or self.chn_handle is None:
-                print(f"TX 0x{can_id:X} {payload.hex()}"); continue
+            batch = self._drain_tx(first)
+            if tx is None:
+                for can_id, payload in batch:
+                    print(f"TX 0x{can_id:X} {payload.hex()}")
+                self._tx_q.sent()
+                continue
             try:
-                lib = self.zcanlib.ZCAN()
-                if len(payload) > 8:
-                    obj = self.zcanlib.ZCAN_TransmitFD_Data()
-                    obj.transmit_type = 0
-                    obj.frame.can_id = can_id | (1<<31 if can_id>0x7FF else 0)
-                    obj.frame.len = len(payload)
-                    obj.frame.flags |= 0x1  # BRS
-                    for i,b in enumerate(payload): obj.frame.data[i]=b
-                    lib.TransmitFD(self.chn_handle, (self.zcanlib.ZCAN_TransmitFD_Data*1)(obj), 1)
-                else:
-                    obj = self.zcanlib.ZCAN_Transmit_Data()
-                    obj.transmit_type = 0
-                    obj.frame.can_id = can_id | (1<<31 if can_id>0x7FF else 0)
-                    obj.frame.can_dlc = len(payload)
-                    for i,b in enumerate(payload): obj.frame.data[i]=b
-                    lib.Transmit(self.chn_handle, (self.zcanlib.ZCAN_Transmit_Data*1)(obj), 1)
+                tx.send(batch)
             except Exception as e:
-                logging.error("ZLG send error 0x%X: %s", can_id, e)
+                logging.error("%s send error (%d frames, first 0x%X): %s", tx.name, len(batch), batch[0][0], e)
+            self._tx_q.sent()
+        logging.info("TX loop stopped")
+
+    def _encode_signals(self, signals: Dict[str, Any], values: Optional[Dict[str, Any]] = None) -> List[Tuple[int, bytes]]:
+        return encode_with_parsers(self.parsers_by_id, signals, self.state.values if values is None else values,
+                                   self.signal_owners)
 
     def _enqueue_signals(self, signals: Dict[str, Any], tag: str="") -> None:
-        tnow_ms = time.time()*1000.0
-        prepared: Dict[str, Any] = {}
-        for k,v in signals.items():
-            prepared[k] = _eval_formula(v, self.state, tnow_ms) if isinstance(v, str) else v
-        parser = self.parsers_by_id.get(None)
-        targets = []
-        if parser:
-            targets.append(parser)
-        else:
-            targets.extend(self.parsers_by_id.values())
-        for pr in targets:
-            frames = pr.encode(dict(prepared))
-            for can_id, payload in frames:
-                self._tx_q.put((can_id, payload))
-
-    def _periodic_loop(self, job: PeriodicJob) -> None:
-        next_ts = time.time()
-        while not self._stop.is_set():
-            now = time.time()
-            if now >= next_ts:
-                signals = dict(job.signals)
-                if job.formulas:
-                    tnow_ms = now*1000.0
-                    for k, expr in job.formulas.items():
-                        signals[k] = _eval_formula(expr, self.state, tnow_ms)
-                self._enqueue_signals(signals, tag=f"periodic:{job.name}")
-                next_ts = now + job.interval_ms/1000.0
-            time.sleep(0.001)
+        self._tx_q.put_many(self._encode_signals(signals))
+
+    def _on_jobs_due(self, jobs: List[ScheduledJob]) -> None:
+        # 同時到期的工作先全部編碼，再一起放進 TX 佇列，讓 TX 端同一批送出
+        # 同一批工作的公式都讀同一份 snapshot
+        values = self.state.values
+        frames: List[Tuple[int, bytes]] = []
+        for sj in jobs:
+            try:
+                frames.extend(self._encode_signals(job_signals(sj.payload, values), values))
+            except Exception:
+                logging.exception("Encode error in %s", sj.name)
+        self._tx_q.put_many(frames)
 
     def _maybe_respond(self, can_id: int, data: bytes) -> None:
-        for rule in self.cfg.respond:
-            if can_id != rule.request_id: continue
-
-            if rule.request_mask is not None and rule.request_data is not None:
-            # 使用 bytes(8) 取代 b"\x00"*8，避免某些編輯器把 escape 字面量注入實體 NUL
-                mask = (rule.request_mask + bytes(8))[:8]
-                rdat = (rule.request_data + bytes(8))[:8]
-                if bytes(d & m for d, m in zip(data, mask)) != bytes(r & m for r, m in zip(rdat, mask)):
-                    continue
+        for rule in matching_rules(self.cfg, can_id, data):
             if rule.resp_signals:
                 self._enqueue_signals(rule.resp_signals, tag=f"resp:{rule.name}")
             elif rule.raw_can_id is not None and rule.raw_data is not None:
                 self._tx_q.put((rule.raw_can_id, rule.raw_data))
 
-def parse_args() -> argparse.Namespace:
+def build_arg_parser() -> argparse.ArgumentParser:
     p = argparse.ArgumentParser(description="ZLG USBCANFD-based Simulate/Response Server (multi-adapter, local DLLs only)")
     p.add_argument("--parser-mod", help="Single adapter module path (e.g., dbc_adapters.generator_adapter_0x117)")
     p.add_argument("--dbc-adapter-dir", help="Adapter package folder (e.g., dbc_adapters). Used with --id-list.")
-    p.add_argument("--id-list", help="Comma-separated CAN IDs, e.g., '0x117,0x210'. Used with --dbc-adapter-dir.")
+    p.add_argument("--id-list", help="Comma-separated CAN IDs, e.g., '0x117,0x210'. Used with --dbc-adapter-dir (or to limit --dbc).")
+    p.add_argument("--dbc", help="DBC path; build codecs at runtime (no generated files/adapters needed)")
     p.add_argument("--config", help="YAML config path")
+    p.add_argument("--encode-cache", type=int, default=256, help="Encode LRU entries per adapter / runtime codec (0 = off)")
+    add_transport_args(p)
     p.add_argument("--dev-type", default="USBCANFD_100U", help="Device key, e.g., USBCANFD_100U|USBCANFD_200U|...")
     p.add_argument("--dev-idx", type=int, default=0)
     p.add_argument("--chan", type=int, default=0)
@@ -344,52 +479,75 @@ def parse_args() -> argparse.Namespace:
     p.add_argument("--dbit", type=int, default=2000000)
     p.add_argument("--loopback", action="store_true")
     p.add_argument("--dry-run", action="store_true")
+    p.add_argument("--rx-block-ms", type=int, default=20, help="RX idle: max blocking wait inside ReceiveFD (ms)")
+    p.add_argument("--rx-batch", type=int, default=256, help="RX: max frames per Receive/ReceiveFD call")
+    p.add_argument("--rx-stats-sec", type=float, default=0.0, help="Log RX stats (CPU/frame, latency) every N seconds; 0 = only at exit")
+    p.add_argument("--tx-batch", type=int, default=64, help="TX: max frames per Transmit/TransmitFD call")
+    p.add_argument("--tx-flush-ms", type=float, default=0.0, help="TX: wait up to N ms after the first queued frame to fill a batch (0 = send what is queued)")
+    p.add_argument("--tx-queue-max", type=int, default=4096, help="TX queue bound (frames); lower CAN IDs are dequeued first")
+    p.add_argument("--tx-policy", default="drop_oldest", choices=list(TX_POLICIES),
+                   help="TX queue overflow: drop_oldest | coalesce (keep latest payload per ID) | block (wait, then drop new)")
     p.add_argument("--log-level", default="INFO", choices=["DEBUG","INFO","WARNING","ERROR","CRITICAL"])
-    return p.parse_args()
+    return p
+
+def parse_args() -> argparse.Namespace:
+    return build_arg_parser().parse_args()
 
-def _load_parsers_from_ids(dir_name:str, id_list:str) -> Dict[Optional[int], CanParserAdapter]:
+def _load_parsers_from_ids(dir_name:str, id_list:str, encode_cache: int = 256) -> Dict[Optional[int], CanParserAdapter]:
     result : Dict[Optional[int], CanParserAdapter] = {}
     ids = [int(s.strip(),0) for s in id_list.split(",") if s.strip()]
     for cid in ids:
         modname = f"{dir_name}.generator_adapter_0x{cid:03X}"
-        result[cid] = CanParserAdapter(modname)
+        result[cid] = CanParserAdapter(modname, encode_cache_size=encode_cache)
         logging.info("Loaded adapter: %s (ID=0x%X)", modname, cid)
     return result
 
-def main() -> int:
-    args = parse_args()
-    logging.basicConfig(level=getattr(logging, args.log_level), format="[%(levelname)s] %(message)s")
-    cfg = load_config(args.config)
+def _load_runtime_codec(dbc_path: str, id_list: Optional[str], encode_cache: int = 1024) -> CanParserAdapter:
+    from dbc_runtime_codec import DbcRuntimeCodec
+    ids = [int(s.strip(),0) for s in id_list.split(",") if s.strip()] if id_list else None
+    codec = DbcRuntimeCodec(dbc_path, ids, encode_cache_size=encode_cache)
+    logging.info("Runtime DBC codec: %s (%d IDs)", dbc_path, len(codec.messages))
+    return CanParserAdapter(f"dbc:{dbc_path}", codec=codec)
 
+def load_parsers(args: argparse.Namespace) -> Dict[Optional[int], CanParserAdapter]:
     parsers_by_id : Dict[Optional[int], CanParserAdapter] = {}
     if args.parser_mod:
-        parsers_by_id[None] = CanParserAdapter(args.parser_mod)
+        parsers_by_id[None] = CanParserAdapter(args.parser_mod, encode_cache_size=args.encode_cache)
         logging.info("Single adapter: %s", args.parser_mod)
+    elif args.dbc:
+        parsers_by_id[None] = _load_runtime_codec(args.dbc, args.id_list, args.encode_cache)
     elif args.dbc_adapter_dir and args.id_list:
-        parsers_by_id = _load_parsers_from_ids(args.dbc_adapter_dir, args.id_list)
+        parsers_by_id = _load_parsers_from_ids(args.dbc_adapter_dir, args.id_list, args.encode_cache)
     else:
-        raise SystemExit("Provide --parser-mod OR (--dbc-adapter-dir AND --id-list).")
+        raise SystemExit("Provide --parser-mod OR --dbc OR (--dbc-adapter-dir AND --id-list).")
+    return parsers_by_id
+
+def main() -> int:
+    args = parse_args()
+    logging.basicConfig(level=getattr(logging, args.log_level), format="[%(levelname)s] %(message)s")
+    cfg = load_config(args.config)
+
+    parsers_by_id = load_parsers(args)
 
-    zcanlib = None
-    dev_handle = chn_handle = None
+    rx_cfg = RxConfig(batch_fd=args.rx_batch, batch=args.rx_batch, block_ms=args.rx_block_ms)
+    transport: Optional[CanTransport] = None
     if not args.dry_run:
-        zcanlib = _ensure_zlg_loaded()
-        dev_handle = zlg_open_device(zcanlib, args.dev_type, args.dev_idx)
-        chn_handle = zlg_start_channel(zcanlib, dev_handle, args.chan, args.abit, args.dbit, loopback=bool(args.loopback))
-        logging.info("Device handle=%s, Channel handle=%s", dev_handle, chn_handle)
+        transport = open_transport(args, rx_cfg=rx_cfg, tx_batch=args.tx_batch)
+        logging.info("Transport: %s", transport.name)
     else:
-        logging.info("Dry-run: zlgcan not required; will not open device")
+        logging.info("Dry-run: no device opened, TX is only printed (use --transport vbus for a virtual bus)")
 
-    srv = ZlgSimServer(zcanlib, dev_handle, chn_handle, parsers_by_id, cfg, dry_run=bool(args.dry_run))
+    srv = ZlgSimServer(None, None, None, parsers_by_id, cfg, dry_run=bool(args.dry_run),
+                       rx_cfg=rx_cfg, rx_stats_sec=args.rx_stats_sec,
+                       tx_batch=args.tx_batch, tx_flush_ms=args.tx_flush_ms,
+                       tx_queue_max=args.tx_queue_max, tx_policy=args.tx_policy, transport=transport)
 
     def _stop(signum, frame):
         logging.info("Signal %s received, stopping...", signum)
         srv.stop()
         try:
-            if chn_handle is not None and zcanlib is not None:
-                zcanlib.ZCAN().ResetCAN(chn_handle)
-            if dev_handle is not None and zcanlib is not None:
-                zcanlib.ZCAN().CloseDevice(dev_handle)
+            if transport is not None:
+                transport.close()
         except Exception:
             pass
         sys.exit(0)
@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+共用 CAN transport 介面（概念同 C# ICanTransport：open / 批次收 / 批次送 / close）
+
+- ZlgTransport      : ZLG USBCANFD（zlgcan.py + DLL，Windows）；收包走 ZlgRxEngine、送包走 ZlgTxBatcher
+- SocketCanTransport: Linux SocketCAN（can0 / vcan0 ...，CAN FD）；一次等待後以非阻塞 recv 把 socket buffer 取空
+  （Python 沒有 recvmmsg，這是最接近的批次讀法），送包逐幀 send，buffer 滿（ENOBUFS）時等待可寫再送
+- vbus（virtual_bus.py）：記憶體內的虛擬 bus（位元率 / 仲裁 / 遺失 / 延遲模型），不需硬體即可做壓力測試
+- ZLG 裝置設定（dev map / OpenDevice / 設定位元率 / StartCAN）只在這裡一份，四支工具共用
+
+frame 格式：
+    send([(can_id, payload), ...])     # payload > 8 bytes（或 force_fd）送 FD；can_id > 0x7FF 或帶 bit31 視為 extended
+    recv(timeout_ms) -> [RxFrame]      # RxFrame(can_id, data, is_fd, brs, extended, ts_us)
+
+用法：
+    p = argparse.ArgumentParser(); add_transport_args(p)   # --transport zlg|socketcan|vbus、--ifname vcan0
+    tr = open_transport(args)                               # 依參數建好並 open
+    tr.send([(0x117, b"\\x01\\x02")]); frames = tr.recv(20); tr.close()
+"""
+from __future__ import annotations
+import argparse, errno, importlib, logging, select, socket, struct, time
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from zlg_rx_engine import RxConfig, RxStats, ZlgRxEngine
+from zlg_tx_batch import ZlgTxBatcher
+
+TRANSPORTS = ("zlg", "socketcan", "vbus")
+EFF_FLAG = 1 << 31
+
+
+class RxFrame(NamedTuple):
+    can_id: int          # 不含旗標的 11 / 29-bit ID
+    data: bytes
+    is_fd: bool
+    brs: bool
+    extended: bool
+    ts_us: int           # 裝置 / kernel timestamp（沒有時為 host 時間）
+
+
+# ---------------- ZLG 裝置設定 ---------------- #
+def load_zlgcan():
+    return importlib.import_module("zlgcan")
+
+
+def zlg_dev_map(zcanlib) -> Dict[str, int]:
+    names = [
+        "ZCAN_USBCANFD_100U",
+        "ZCAN_USBCANFD_100U_MINI",
+        "ZCAN_USBCANFD_200U",
+        "ZCAN_USBCANFD_400U",
+        "ZCAN_USBCANFD_800U",
+    ]
+    dev_map = {}
+    for nm in names:
+        val = getattr(zcanlib, nm, None)
+        if val is not None:
+            dev_map[nm.replace("ZCAN_", "")] = val
+    return dev_map
+
+
+def zlg_open_device(zcanlib, dev_type: str, dev_idx: int) -> int:
+    dev_map = zlg_dev_map(zcanlib)
+    dtype = dev_map.get(dev_type.upper())
+    if dtype is None:
+        raise RuntimeError(f"Unsupported dev type '{dev_type}'. Choose one of: {list(dev_map.keys())}")
+    lib = zcanlib.ZCAN()
+    handle = lib.OpenDevice(dtype, dev_idx, 0)
+    if handle == getattr(zcanlib, "INVALID_DEVICE_HANDLE", 0):
+        raise RuntimeError("OpenDevice failed")
+    return handle
+
+
+def zlg_start_channel(zcanlib, dev_handle: int, chn: int, abit: int, dbit: int, loopback: bool = False,
+                      tx_echo: Optional[bool] = False) -> int:
+    """tx_echo: True/False 設定裝置 TX echo；None 表示不設定（沿用裝置預設）。"""
+    lib = zcanlib.ZCAN()
+    if lib.ZCAN_SetValue(dev_handle, f"{chn}/canfd_abit_baud_rate", str(abit).encode("utf-8")) != getattr(zcanlib, "ZCAN_STATUS_OK", 1):
+        raise RuntimeError("Set arbitration bitrate failed")
+    if lib.ZCAN_SetValue(dev_handle, f"{chn}/canfd_dbit_baud_rate", str(dbit).encode("utf-8")) != getattr(zcanlib, "ZCAN_STATUS_OK", 1):
+        raise RuntimeError("Set data bitrate failed")
+    try:
+        lib.ZCAN_SetValue(dev_handle, f"{chn}/initenal_resistance", b"1")
+    except Exception:
+        pass
+    cfg = zcanlib.ZCAN_CHANNEL_INIT_CONFIG()
+    cfg.can_type = getattr(zcanlib, "ZCAN_TYPE_CANFD", 1)
+    cfg.config.canfd.mode = 1 if loopback else 0
+    chn_handle = lib.InitCAN(dev_handle, chn, cfg)
+    if chn_handle is None:
+        raise RuntimeError("InitCAN failed")
+    if tx_echo is not None:
+        try:
+            lib.ZCAN_SetValue(dev_handle, f"{chn}/set_device_tx_echo", b"1" if tx_echo else b"0")
+        except Exception:
+            pass
+    if lib.StartCAN(chn_handle) != getattr(zcanlib, "ZCAN_STATUS_OK", 1):
+        raise RuntimeError("StartCAN failed")
+    return chn_handle
+
+
+# ---------------- 介面 ---------------- #
+class CanTransport:
+    name = "transport"
+
+    def open(self) -> "CanTransport":
+        return self
+
+    def recv(self, timeout_ms: float) -> List[RxFrame]:
+        """收一批：有資料立即回傳（取到 buffer 空為止），沒有則最多等 timeout_ms。"""
+        raise NotImplementedError
+
+    def send(self, frames: Sequence[Tuple[int, bytes]]) -> int:
+        """送一批；回傳實際送出的幀數。"""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+    @property
+    def stats(self) -> RxStats:
+        raise NotImplementedError
+
+    def format_stats(self) -> str:
+        return self.stats.format()
+
+    def __enter__(self) -> "CanTransport":
+        return self.open()
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class ZlgTransport(CanTransport):
+    """ZLG 單一 channel。dev_handle / chn_handle 由外部給時（同一裝置多 channel）不負責關閉裝置。"""
+
+    def __init__(self, zcanlib=None, dev_type: str = "USBCANFD_100U", dev_idx: int = 0, chan: int = 0,
+                 abit: int = 500000, dbit: int = 2000000, loopback: bool = False, tx_echo: Optional[bool] = False,
+                 rx_cfg: Optional[RxConfig] = None, tx_batch: int = 64, brs: bool = True, force_fd: bool = False,
+                 dev_handle: Optional[int] = None, chn_handle: Optional[int] = None, name: str = ""):
+        self.zcanlib = zcanlib
+        self.dev_type, self.dev_idx, self.chan = dev_type, dev_idx, chan
+        self.abit, self.dbit, self.loopback, self.tx_echo = abit, dbit, loopback, tx_echo
+        self.rx_cfg = rx_cfg or RxConfig()
+        self.tx_batch, self.brs, self.force_fd = tx_batch, brs, force_fd
+        self.dev_handle, self.chn_handle = dev_handle, chn_handle
+        self._own_device = dev_handle is None
+        self.name = name or f"zlg{dev_idx}/{chan}"
+        self._buf: List[RxFrame] = []
+        self.rx: Optional[ZlgRxEngine] = None
+        self.tx: Optional[ZlgTxBatcher] = None
+
+    def _on_frame(self, can_id: int, data: bytes, is_fd: bool, frame: Any) -> None:
+        self._buf.append(RxFrame(can_id, data, is_fd, bool(is_fd and frame.flags & 0x1),
+                                 bool(frame.can_id & EFF_FLAG), self.rx.cur_ts_us))
+
+    def open(self) -> "ZlgTransport":
+        if self.zcanlib is None:
+            self.zcanlib = load_zlgcan()
+        if self.chn_handle is None:
+            if self.dev_handle is None:
+                self.dev_handle = zlg_open_device(self.zcanlib, self.dev_type, self.dev_idx)
+            self.chn_handle = zlg_start_channel(self.zcanlib, self.dev_handle, self.chan, self.abit, self.dbit,
+                                                loopback=self.loopback, tx_echo=self.tx_echo)
+        self.rx = ZlgRxEngine(self.zcanlib, self.chn_handle, self._on_frame, self.rx_cfg)
+        self.tx = ZlgTxBatcher(self.zcanlib, self.chn_handle, self.tx_batch, brs=self.brs, force_fd=self.force_fd)
+        return self
+
+    def recv(self, timeout_ms: float) -> List[RxFrame]:
+        self.rx.poll(timeout_ms)
+        out, self._buf = self._buf, []
+        return out
+
+    def send(self, frames: Sequence[Tuple[int, bytes]]) -> int:
+        return self.tx.send(frames)
+
+    @property
+    def stats(self) -> RxStats:
+        return self.rx.stats if self.rx is not None else RxStats()
+
+    def format_stats(self) -> str:
+        s = self.stats.format()
+        if self.tx is not None:
+            s += f"; tx frames={self.tx.frames} calls={self.tx.calls} failed={self.tx.failed}"
+        return s
+
+    def close(self) -> None:
+        lib = self.zcanlib.ZCAN() if self.zcanlib is not None else None
+        if lib is None:
+            return
+        try:
+            if self.chn_handle is not None:
+                lib.ResetCAN(self.chn_handle)
+        except Exception:
+            pass
+        try:
+            if self._own_device and self.dev_handle is not None:
+                lib.CloseDevice(self.dev_handle)
+        except Exception:
+            pass
+
+
+class SocketCanTransport(CanTransport):
+    """Linux SocketCAN raw socket（CAN FD 開啟）；recv_own_msgs=True 時自己送的幀也會收到（同 ZLG TX echo）。"""
+
+    _CAN = struct.Struct("=IB3x8s")       # struct can_frame（16 bytes）
+    _CANFD = struct.Struct("=IBB2x64s")   # struct canfd_frame（72 bytes）
+    CAN_EFF_FLAG, CAN_RTR_FLAG, CAN_ERR_FLAG = 0x80000000, 0x40000000, 0x20000000
+    CANFD_BRS = 0x01
+
+    def __init__(self, ifname: str = "vcan0", batch: int = 256, brs: bool = True, force_fd: bool = False,
+                 recv_own_msgs: bool = False, rcvbuf: int = 1 << 20, name: str = ""):
+        self.ifname, self.batch = ifname, max(1, batch)
+        self.brs, self.force_fd, self.recv_own_msgs, self.rcvbuf = brs, force_fd, recv_own_msgs, rcvbuf
+        self.name = name or ifname
+        self.sock: Optional[socket.socket] = None
+        self._poll: Any = None
+        self._rxbuf = bytearray(self._CANFD.size)
+        self._rxview = memoryview(self._rxbuf)
+        self._stats = RxStats()
+        self.tx_frames = 0
+        self.tx_calls = 0
+        self.tx_failed = 0
+
+    def open(self) -> "SocketCanTransport":
+        s = socket.socket(socket.AF_CAN, socket.SOCK_RAW, socket.CAN_RAW)
+        s.setsockopt(socket.SOL_CAN_RAW, socket.CAN_RAW_FD_FRAMES, 1)
+        if self.recv_own_msgs:
+            s.setsockopt(socket.SOL_CAN_RAW, socket.CAN_RAW_RECV_OWN_MSGS, 1)
+        try:
+            s.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.rcvbuf)
+        except OSError:
+            pass
+        s.bind((self.ifname,))
+        s.setblocking(False)
+        self._attach(s)
+        return self
+
+    def _attach(self, s: socket.socket) -> None:
+        self.sock = s
+        self._poll = select.poll()
+        self._poll.register(s.fileno(), select.POLLIN)
+
+    def _unpack(self, n: int) -> Optional[RxFrame]:
+        if n == self._CANFD.size:
+            raw_id, length, flags, data = self._CANFD.unpack_from(self._rxbuf)
+            is_fd = True
+        elif n == self._CAN.size:
+            raw_id, length, data = self._CAN.unpack_from(self._rxbuf)
+            flags, is_fd = 0, False
+        else:
+            return None
+        if raw_id & self.CAN_ERR_FLAG:
+            return None   # error frame
+        ext = bool(raw_id & self.CAN_EFF_FLAG)
+        can_id = raw_id & (0x1FFFFFFF if ext else 0x7FF)
+        payload = b"" if raw_id & self.CAN_RTR_FLAG else data[:length]
+        return RxFrame(can_id, payload, is_fd, bool(flags & self.CANFD_BRS), ext, time.perf_counter_ns() // 1000)
+
+    def recv(self, timeout_ms: float) -> List[RxFrame]:
+        st, sock, view = self._stats, self.sock, self._rxview
+        out: List[RxFrame] = []
+        c0 = time.thread_time()
+        # 先試著直接取（有資料就不進 poll）；沒有才等待一次
+        for attempt in (0, 1):
+            while len(out) < self.batch:
+                st.calls += 1
+                try:
+                    n = sock.recv_into(view)
+                except (BlockingIOError, InterruptedError):
+                    break
+                fr = self._unpack(n)
+                if fr is not None:
+                    out.append(fr)
+            if out or attempt or timeout_ms <= 0:
+                break
+            st.empty_polls += 1
+            st.blocking_waits += 1
+            st.cpu_s += time.thread_time() - c0
+            ready = self._poll.poll(max(1, int(timeout_ms)))
+            c0 = time.thread_time()
+            if not ready:
+                break
+        st.cpu_s += time.thread_time() - c0
+        if out:
+            got = len(out)
+            st.frames += got
+            fd = sum(1 for f in out if f.is_fd)
+            st.fd_frames += fd
+            st.can_frames += got - fd
+            if got > st.max_burst:
+                st.max_burst = got
+        return out
+
+    def _pack(self, can_id: int, payload: bytes) -> bytes:
+        raw_id = can_id & 0x1FFFFFFF
+        if can_id & EFF_FLAG or raw_id > 0x7FF:
+            raw_id |= self.CAN_EFF_FLAG
+        if self.force_fd or len(payload) > 8:
+            return self._CANFD.pack(raw_id, len(payload), self.CANFD_BRS if self.brs else 0, payload)
+        return self._CAN.pack(raw_id, len(payload), payload)
+
+    def send(self, frames: Sequence[Tuple[int, bytes]]) -> int:
+        sock, sent, failed, err = self.sock, 0, 0, None
+        for can_id, payload in frames:
+            buf = self._pack(can_id, payload)
+            for _ in range(100):
+                self.tx_calls += 1
+                try:
+                    sock.send(buf)
+                    sent += 1
+                    break
+                except (BlockingIOError, InterruptedError):
+                    pass
+                except OSError as e:
+                    if e.errno != errno.ENOBUFS:
+                        # 其他錯誤（ENETDOWN、EMSGSIZE…）重試無用：這幀算失敗，其餘照送（同 ZLG backend）
+                        err = e
+                        failed += 1
+                        break
+                # 介面 TX queue 滿：等一下再送（最多約 100 ms）
+                select.select([], [sock], [], 0.001)
+            else:
+                failed += 1
+        self.tx_frames += sent
+        if failed:
+            self.tx_failed += failed
+            logging.warning("SocketCAN transmit: %d/%d frames accepted%s", sent, len(frames), f" ({err})" if err else "")
+        return sent
+
+    @property
+    def stats(self) -> RxStats:
+        return self._stats
+
+    def format_stats(self) -> str:
+        return (f"{self._stats.format()}; tx frames={self.tx_frames} calls={self.tx_calls} failed={self.tx_failed}")
+
+    def close(self) -> None:
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            finally:
+                self.sock = None
+
+
+# ---------------- CLI 共用 ---------------- #
+def add_transport_args(p: argparse.ArgumentParser) -> None:
+    p.add_argument("--transport", default="zlg", choices=list(TRANSPORTS),
+                   help="zlg = ZLG USBCANFD (zlgcan DLL); socketcan = Linux SocketCAN/vcan; vbus = in-memory virtual bus")
+    p.add_argument("--ifname", default="vcan0",
+                   help="SocketCAN interface (e.g. can0, vcan0) or virtual bus name; comma-separated for multi-channel")
+    g = p.add_argument_group("virtual bus (--transport vbus; bitrate from --abit/--dbit)")
+    g.add_argument("--vbus-shm", action="store_true", help="Share the bus across processes (shared memory; Linux/macOS)")
+    g.add_argument("--vbus-no-timing", action="store_true", help="Do not model bus time (frames delivered as fast as possible)")
+    g.add_argument("--vbus-loss", type=float, default=0.0, help="Per-receiver frame loss probability (0..1)")
+    g.add_argument("--vbus-latency-us", type=float, default=0.0, help="Extra delivery latency after end of frame (us)")
+    g.add_argument("--vbus-jitter-us", type=float, default=0.0, help="Uniform +/- jitter on the latency (us)")
+    g.add_argument("--vbus-seed", type=int, default=None, help="RNG seed for loss / jitter (reproducible runs)")
+
+
+def open_transport(args: argparse.Namespace, *, chan: Optional[int] = None, ifname: Optional[str] = None,
+                   rx_cfg: Optional[RxConfig] = None, tx_batch: int = 64, brs: bool = True, force_fd: bool = False,
+                   tx_echo: Optional[bool] = False, zcanlib=None, dev_handle: Optional[int] = None) -> CanTransport:
+    """依 --transport 建立並 open；ZLG 用 --dev-type/--dev-idx/--chan/--abit/--dbit/--loopback。"""
+    loopback = bool(getattr(args, "loopback", False))
+    if args.transport == "vbus":
+        from virtual_bus import open_vbus
+        return open_vbus(args, ifname or args.ifname, batch=rx_cfg.batch_fd if rx_cfg is not None else 256,
+                         brs=brs, force_fd=force_fd, recv_own=loopback or bool(tx_echo))
+    if args.transport == "socketcan":
+        batch = rx_cfg.batch_fd if rx_cfg is not None else 256
+        return SocketCanTransport(ifname or args.ifname, batch=batch, brs=brs, force_fd=force_fd,
+                                  recv_own_msgs=loopback or bool(tx_echo)).open()
+    return ZlgTransport(zcanlib, args.dev_type, args.dev_idx, args.chan if chan is None else chan, args.abit, args.dbit,
+                        loopback=loopback, tx_echo=tx_echo, rx_cfg=rx_cfg, tx_batch=tx_batch, brs=brs,
+                        force_fd=force_fd, dev_handle=dev_handle).open()
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+.cancap 紀錄的 mmap 讀取與 sidecar 索引（依時間 / CAN ID 跳讀，不必掃過整個檔案）
+
+- 以 mmap 開檔：未壓縮的 block 直接從 mmap 解析 record（payload 才複製）；壓縮的 block 用到時才解壓（保留最近幾塊）
+- sidecar 索引 <檔名>.idx：block 表（offset、幀數、時間範圍）+ 每個 CAN ID 的幀數與出現的 block 清單；
+  第一次開啟時掃描建立（整檔解析一次），之後檔案大小 / mtime 沒變就直接載入
+- frames(start_us, end_us, ids)：只讀時間範圍重疊、且含有所選 ID 的 block
+
+索引格式（little-endian）：
+    header   : magic "CCIX\\0\\1", version u16, capture_size u64, capture_mtime_ns u64, nblocks u32, nids u32
+    blocks   : nblocks × (offset u64, raw_len u32, stored_len u32, nframes u32, codec u8, 3B, first_ts u64, last_ts u64,
+               min_ts u64, max_ts u64)
+    ids      : nids × (can_id u32（bit31 = extended）, count u64, nblk u32, start u32)
+    id_blocks: u32 block 編號（各 ID 連續 nblk 筆，從 start 開始）
+
+用法：
+    log = CaptureLog("bus.cancap")                 # 沒有 / 過期的 .idx 會自動重建
+    log.ids()                                      # {can_id: 幀數}
+    for rec in log.frames(start_us=..., end_us=..., ids={0x117}): ...
+"""
+from __future__ import annotations
+import logging, mmap, os, struct, time
+from array import array
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from can_capture import BLOCK_HDR, BLOCK_MAGIC, EFF_FLAG, FILE_HDR, REC_HDR, CaptureRecord, decompress_block, iter_records, read_header
+
+IDX_MAGIC = b"CCIX\x00\x01"
+IDX_VERSION = 1
+IDX_HDR = struct.Struct("<6sHQQII")
+IDX_BLOCK = struct.Struct("<QIIIB3xQQQQ")
+IDX_ID = struct.Struct("<IQII")
+
+
+class BlockInfo(NamedTuple):
+    offset: int          # block 表頭在檔案內的位置
+    raw_len: int
+    stored_len: int
+    nframes: int
+    codec: int
+    first_ts: int
+    last_ts: int
+    min_ts: int          # block 內最小 / 最大 ts（裝置時間偶有回跳時與 first / last 不同）
+    max_ts: int
+
+
+def _key(can_id: int, extended: bool) -> int:
+    return can_id | (EFF_FLAG if extended else 0)
+
+
+class CaptureLog:
+    def __init__(self, path: str, index: bool = True, rebuild: bool = False, cache_blocks: int = 4):
+        self.path = path
+        self.index_path = path + ".idx"
+        self._f = open(path, "rb")
+        read_header(self._f)
+        self.size = os.fstat(self._f.fileno()).st_size
+        self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+        self._view = memoryview(self._mm) if self._mm is not None else memoryview(b"")
+        self._cache: "OrderedDict[int, bytes]" = OrderedDict()
+        self._cache_blocks = max(1, cache_blocks)
+        self.blocks: List[BlockInfo] = []
+        self._ids: Dict[int, Tuple[int, array]] = {}   # key -> (count, block 編號)
+        self.indexed = False
+        if index:
+            if rebuild or not self._load_index():
+                self.build_index()
+        else:
+            self.blocks = self._scan_blocks()
+
+    # ---- block ---- #
+    def _scan_blocks(self) -> List[BlockInfo]:
+        """只讀 block 表頭（依 stored_len 跳過 payload）；最後一個不完整的 block 忽略。"""
+        out: List[BlockInfo] = []
+        view, off, size = self._view, FILE_HDR.size, self.size
+        while off + BLOCK_HDR.size <= size:
+            magic, codec, raw_len, stored_len, n, first_ts, last_ts = BLOCK_HDR.unpack_from(view, off)
+            if magic != BLOCK_MAGIC:
+                raise ValueError(f"{self.path}: corrupt block header at offset {off}")
+            if off + BLOCK_HDR.size + stored_len > size:
+                logging.warning("%s: truncated last block (%d frames) ignored", self.path, n)
+                break
+            lo, hi = (min(first_ts, last_ts), max(first_ts, last_ts))
+            out.append(BlockInfo(off, raw_len, stored_len, n, codec, first_ts, last_ts, lo, hi))
+            off += BLOCK_HDR.size + stored_len
+        return out
+
+    def block_data(self, i: int) -> memoryview:
+        """第 i 個 block 解壓後的 record 區；未壓縮時直接是 mmap 的一段（不複製）。"""
+        b = self.blocks[i]
+        start = b.offset + BLOCK_HDR.size
+        if b.codec == 0:
+            return self._view[start:start + b.stored_len]
+        raw = self._cache.get(i)
+        if raw is None:
+            raw = decompress_block(b.codec, self._view[start:start + b.stored_len].tobytes(), b.raw_len)
+            self._cache[i] = raw
+            if len(self._cache) > self._cache_blocks:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(i)
+        return memoryview(raw)
+
+    # ---- 索引 ---- #
+    def _stamp(self) -> Tuple[int, int]:
+        st = os.fstat(self._f.fileno())
+        return st.st_size, st.st_mtime_ns
+
+    def build_index(self) -> None:
+        t0 = time.perf_counter()
+        self.blocks = self._scan_blocks()
+        counts: Dict[int, int] = {}
+        per_id: Dict[int, array] = {}
+        blocks: List[BlockInfo] = []
+        unpack, hsz = REC_HDR.unpack_from, REC_HDR.size
+        for i, b in enumerate(self.blocks):
+            raw = self.block_data(i)
+            pos, end = 0, len(raw)
+            lo = hi = b.first_ts
+            seen: Set[int] = set()
+            while pos < end:
+                ts, cid, _, length, _ = unpack(raw, pos)
+                pos += hsz + length
+                if ts < lo:
+                    lo = ts
+                elif ts > hi:
+                    hi = ts
+                counts[cid] = counts.get(cid, 0) + 1
+                if cid not in seen:
+                    seen.add(cid)
+                    per_id.setdefault(cid, array("I")).append(i)
+            blocks.append(b._replace(min_ts=lo, max_ts=hi))
+        self.blocks = blocks
+        self._ids = {cid: (counts[cid], per_id[cid]) for cid in counts}
+        self.indexed = True
+        try:
+            self._save_index()
+        except OSError as e:
+            logging.warning("cannot write index %s: %s", self.index_path, e)
+        logging.info("indexed %s: %d blocks, %d frames, %d IDs in %.2fs", os.path.basename(self.path), len(self.blocks),
+                     self.frame_count(), len(self._ids), time.perf_counter() - t0)
+
+    def _save_index(self) -> None:
+        size, mtime = self._stamp()
+        parts = [IDX_HDR.pack(IDX_MAGIC, IDX_VERSION, size, mtime, len(self.blocks), len(self._ids))]
+        parts.extend(IDX_BLOCK.pack(*b) for b in self.blocks)
+        flat = array("I")
+        for cid in sorted(self._ids):
+            count, blks = self._ids[cid]
+            parts.append(IDX_ID.pack(cid, count, len(blks), len(flat)))
+            flat.extend(blks)
+        parts.append(flat.tobytes())
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(b"".join(parts))
+        os.replace(tmp, self.index_path)
+
+    def _load_index(self) -> bool:
+        try:
+            with open(self.index_path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return False
+        if len(data) < IDX_HDR.size:
+            return False
+        magic, version, size, mtime, nblocks, nids = IDX_HDR.unpack_from(data, 0)
+        if magic != IDX_MAGIC or version != IDX_VERSION or (size, mtime) != self._stamp():
+            return False   # 紀錄檔變了（還在寫 / 被覆蓋）：重建
+        # 表格大小都要對得上表頭的 nblocks / nids，否則視為損毀（截斷 / 寫一半）：回傳 False 改走 build_index()
+        off = IDX_HDR.size + nblocks * IDX_BLOCK.size + nids * IDX_ID.size
+        if len(data) < off:
+            return False
+        blocks = [BlockInfo(*IDX_BLOCK.unpack_from(data, IDX_HDR.size + i * IDX_BLOCK.size)) for i in range(nblocks)]
+        base = IDX_HDR.size + nblocks * IDX_BLOCK.size
+        entries = [IDX_ID.unpack_from(data, base + i * IDX_ID.size) for i in range(nids)]
+        nflat = sum(nblk for _, _, nblk, _ in entries)
+        if len(data) != off + nflat * 4 or any(start + nblk > nflat for _, _, nblk, start in entries):
+            return False
+        flat = array("I")
+        flat.frombytes(data[off:])
+        if flat and max(flat) >= nblocks:
+            return False
+        self.blocks = blocks
+        self._ids = {cid: (count, flat[start:start + nblk]) for cid, count, nblk, start in entries}
+        self.indexed = True
+        return True
+
+    # ---- 查詢 ---- #
+    def ids(self) -> Dict[int, int]:
+        """{can_id（bit31 = extended）: 幀數}；需要索引。"""
+        return {cid: count for cid, (count, _) in sorted(self._ids.items())}
+
+    def frame_count(self) -> int:
+        return sum(b.nframes for b in self.blocks)
+
+    def time_range(self) -> Tuple[int, int]:
+        if not self.blocks:
+            return 0, 0
+        return min(b.min_ts for b in self.blocks), max(b.max_ts for b in self.blocks)
+
+    def select_blocks(self, start_us: Optional[int] = None, end_us: Optional[int] = None,
+                      ids: Optional[Iterable[int]] = None) -> List[int]:
+        """時間範圍重疊、且（給 ids 時）含有其中任一 ID 的 block 編號（遞增）。"""
+        if ids is not None and self.indexed:
+            cand: Set[int] = set()
+            for cid in ids:
+                entry = self._ids.get(cid)
+                if entry:
+                    cand.update(entry[1])
+            picked = sorted(cand)
+        else:
+            picked = range(len(self.blocks))
+        lo = start_us if start_us is not None else -1
+        hi = end_us if end_us is not None else 1 << 64
+        return [i for i in picked if self.blocks[i].max_ts >= lo and self.blocks[i].min_ts <= hi]
+
+    def frames(self, start_us: Optional[int] = None, end_us: Optional[int] = None,
+               ids: Optional[Iterable[int]] = None) -> Iterator[CaptureRecord]:
+        """依檔案順序讀出 [start_us, end_us] 內（且 ID 在 ids 內）的幀；ids 的 extended ID 需帶 bit31。"""
+        want = set(ids) if ids is not None else None
+        lo = start_us if start_us is not None else -1
+        hi = end_us if end_us is not None else 1 << 64
+        for i in self.select_blocks(start_us, end_us, want):
+            b = self.blocks[i]
+            whole = b.min_ts >= lo and b.max_ts <= hi
+            for rec in iter_records(self.block_data(i)):
+                if want is not None and _key(rec.can_id, rec.extended) not in want:
+                    continue
+                if whole or lo <= rec.ts_us <= hi:
+                    yield rec
+
+    def close(self) -> None:
+        self._cache.clear()
+        try:
+            self._view.release()
+            if self._mm is not None:
+                self._mm.close()
+        except BufferError:
+            pass   # 還有 frames() 產生器持有 block 的 view：交給 GC
+        self._f.close()
+
+    def __enter__(self) -> "CaptureLog":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
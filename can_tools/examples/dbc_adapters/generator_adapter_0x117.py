@@ -1,15 +1,39 @@
+import logging
 from . import generate_0x117 as g
 CAN_ID = 0x117
+# 新版產生器會輸出 decode_0x117_to_dict；舊的產生檔沒有就退回走訪 dataclass 欄位
+_decode_to_dict = getattr(g, "decode_0x117_to_dict", None)
+_decode_changed = getattr(g, "decode_0x117_changed", None)
+# 這支 adapter 編碼得出的 signal（Server 依此只把相關的更新交給它）；--slots 產生檔沒有 __dataclass_fields__，改取 __slots__
+SIGNALS = tuple(getattr(g.canfd_0x117_msg, "__dataclass_fields__", None) or getattr(g.canfd_0x117_msg, "__slots__", ()))
+if not SIGNALS:
+    logging.warning("generator_adapter_0x117: no signal fields found on canfd_0x117_msg; server will route every update here")
+# 上一幀 patch（CanParserAdapter 用）：只改寫有變動 signal 的位元；舊產生檔沒有 SIGNAL_PATCHERS_0x117 時一律完整編碼
+_patchers = getattr(g, "SIGNAL_PATCHERS_0x117", None)
+if _patchers is not None:
+    SIGNAL_PATCHERS = {CAN_ID: _patchers}
+    patch_payload = g.patch_payload
 
 def parse_frame(can_id, data):
     if can_id != CAN_ID:
         return {}
+    if _decode_to_dict is not None:
+        return _decode_to_dict(data)
     m = g.decode_0x117_can_msg(data)
     out = {}
-    for f in getattr(m, "__dataclass_fields__", {}):
+    for f in SIGNALS:
         out[f] = getattr(m, f)
     return out
 
+def parse_changed(can_id, prev, data):
+    """只回傳與上一幀 prev 相比有變動的 signal。"""
+    if can_id != CAN_ID:
+        return {}
+    if _decode_changed is not None:
+        return _decode_changed(prev, data)
+    old, new = parse_frame(can_id, prev), parse_frame(can_id, data)
+    return {k: v for k, v in new.items() if old.get(k) != v}
+
 def encode_signals(updates):
     msg = g.canfd_0x117_msg()
     for k, v in updates.items():
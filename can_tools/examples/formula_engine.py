@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模擬 Server 設定檔公式（periodic.formulas、signals / response.signals 的字串值）
+
+- 載入時以 ast 驗證，只允許運算式（算術、比較、布林、條件、索引），函式呼叫只限少數安全的內建函式與
+  state.get(...) 等唯讀方法（公式拿到的是 SignalState 發布的 snapshot，不可被 clear / update / pop 改到）；
+  可用名稱只有 state / tnow_ms 與這些內建函式；不合法的公式在 load_config 就會報錯
+- ** 一律改走 _checked_pow：整數結果過大（例如 10**10**10）時丟 OverflowError，不會在載入時算到記憶體用盡
+- 驗證後編譯成 lambda state, tnow_ms: <expr>，之後每次求值只是一次函式呼叫（不再每次 eval 原始字串）
+- 不依賴 state / tnow_ms 的公式（例如 "1200" 或 "0x10 | 0x01"）在編譯時就算好並快取
+- compile_formula 以運算式字串快取，同一公式出現在多個工作只編譯一次
+"""
+from __future__ import annotations
+import ast
+from functools import lru_cache
+from typing import Any, Dict
+
+# 公式可呼叫的內建函式（不含 __import__ / getattr / eval 等）
+SAFE_BUILTINS: Dict[str, Any] = {
+    "abs": abs, "min": min, "max": max, "round": round, "int": int, "float": float, "bool": bool,
+    "len": len, "sum": sum,
+}
+NAMES = ("state", "tnow_ms")
+# 可呼叫的方法：只限唯讀的 dict 方法
+_CALLABLE_METHODS = ("get", "keys", "values", "items")
+# ** 整數結果的位元數上限（約 2 萬位十進位數，遠超過任何 signal 值）
+_MAX_POW_BITS = 1 << 16
+# str.format 可透過 "{0.__class__}" 讀到私有屬性，一併擋掉
+_BLOCKED_ATTRS = ("format", "format_map")
+
+_ALLOWED_NODES = (
+    ast.Expression, ast.Constant, ast.Name, ast.Load,
+    ast.BinOp, ast.UnaryOp, ast.BoolOp, ast.Compare, ast.IfExp,
+    ast.Call, ast.keyword, ast.Attribute, ast.Subscript, ast.Slice,
+    ast.Tuple, ast.List, ast.Dict, ast.Set,
+    ast.operator, ast.unaryop, ast.boolop, ast.cmpop,
+)
+
+
+class FormulaError(ValueError):
+    pass
+
+
+def _checked_pow(base: Any, exp: Any) -> Any:
+    """公式裡的 base ** exp；整數結果超過 _MAX_POW_BITS 位元時丟 OverflowError。"""
+    if isinstance(base, int) and isinstance(exp, int) and exp > 0 and (abs(base).bit_length() - 1) * exp > _MAX_POW_BITS:
+        raise OverflowError(f"integer power too large ({abs(base).bit_length()}-bit base ** {exp})")
+    return base ** exp
+
+
+class _PowToCall(ast.NodeTransformer):
+    """a ** b -> _pow(a, b)"""
+
+    def visit_BinOp(self, node: ast.BinOp) -> ast.AST:
+        self.generic_visit(node)
+        if isinstance(node.op, ast.Pow):
+            return ast.copy_location(ast.Call(func=ast.Name("_pow", ast.Load()), args=[node.left, node.right],
+                                              keywords=[]), node)
+        return node
+
+
+class Formula:
+    """已驗證、編譯好的公式；以 f(state, tnow_ms) 求值。"""
+    __slots__ = ("expr", "uses_state", "uses_time", "const", "value", "_fn")
+
+    def __init__(self, expr: str):
+        self.expr = expr
+        try:
+            tree = ast.parse(expr.strip(), mode="eval")
+        except SyntaxError as e:
+            raise FormulaError(f"invalid formula {expr!r}: {e.msg}") from None
+        names = set()
+        for node in ast.walk(tree):
+            if not isinstance(node, _ALLOWED_NODES):
+                raise FormulaError(f"formula {expr!r}: {type(node).__name__} is not allowed")
+            if isinstance(node, ast.Name):
+                if node.id not in NAMES and node.id not in SAFE_BUILTINS:
+                    raise FormulaError(f"formula {expr!r}: unknown name {node.id!r} (allowed: state, tnow_ms, "
+                                       f"{', '.join(SAFE_BUILTINS)})")
+                names.add(node.id)
+            elif isinstance(node, ast.Attribute) and (node.attr.startswith("_") or node.attr in _BLOCKED_ATTRS):
+                raise FormulaError(f"formula {expr!r}: attribute {node.attr!r} is not allowed")
+            elif isinstance(node, ast.Call):
+                fn = node.func
+                if not ((isinstance(fn, ast.Name) and fn.id in SAFE_BUILTINS)
+                        or (isinstance(fn, ast.Attribute) and fn.attr in _CALLABLE_METHODS)):
+                    raise FormulaError(f"formula {expr!r}: only calls to {', '.join(SAFE_BUILTINS)} and "
+                                       f".{'() / .'.join(_CALLABLE_METHODS)}() are allowed")
+        self.uses_state = "state" in names
+        self.uses_time = "tnow_ms" in names
+        self.const = not (self.uses_state or self.uses_time)
+        fn_tree = ast.fix_missing_locations(ast.Expression(body=ast.Lambda(
+            args=ast.arguments(posonlyargs=[], args=[ast.arg("state"), ast.arg("tnow_ms")], kwonlyargs=[],
+                               kw_defaults=[], defaults=[]),
+            body=_PowToCall().visit(tree.body))))
+        self._fn = eval(compile(fn_tree, f"<formula {expr!r}>", "eval"),
+                        {"__builtins__": SAFE_BUILTINS, "_pow": _checked_pow})
+        try:
+            self.value = self._fn(None, 0.0) if self.const else None
+        except Exception as e:  # 常數折疊的執行期錯誤，例如 1/0、int("x")、10**10**10（_checked_pow 擋下）
+            raise FormulaError(f"formula {expr!r}: {type(e).__name__}: {e}") from None
+
+    def __call__(self, state: Dict[str, Any], tnow_ms: float) -> Any:
+        if self.const:
+            return self.value
+        return self._fn(state, tnow_ms)
+
+    def __repr__(self) -> str:
+        return f"Formula({self.expr!r})"
+
+
+@lru_cache(maxsize=4096)
+def compile_formula(expr: str) -> Formula:
+    return Formula(expr)
+
+
+def compile_values(values: Dict[str, Any], where: str = "") -> Dict[str, Any]:
+    """把 dict 內的字串值編譯成 Formula（其他型別原樣保留）；where 用於錯誤訊息，例如 "periodic[VehicleStateTick]"。"""
+    out: Dict[str, Any] = {}
+    for k, v in values.items():
+        if isinstance(v, str):
+            try:
+                v = compile_formula(v)
+            except FormulaError as e:
+                raise FormulaError(f"{where}.{k}: {e}" if where else f"{k}: {e}") from None
+        out[k] = v
+    return out
+
+
+def evaluate(value: Any, state: Dict[str, Any], tnow_ms: float) -> Any:
+    """Formula / 字串公式求值；其他值原樣回傳。"""
+    if isinstance(value, Formula):
+        return value(state, tnow_ms)
+    if isinstance(value, str):
+        return compile_formula(value)(state, tnow_ms)
+    return value
@@ -0,0 +1,614 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+把 Vector ASC / BLF、Linux candump 與 .cancap 紀錄串流解碼成「每個 message 一份」的欄式檔（Parquet / Arrow / NPZ）
+
+- 讀取端都是 generator，一次一幀（ASC / candump 逐行、BLF 逐個 LOG_CONTAINER 解壓），不會把整個檔案讀進記憶體
+- 解碼：
+    --dbc      直接用 auto_generate_can_msg.py 的同一份 DBC，以 batch_signal_layout / batch_extract 整欄向量化解碼
+               （--physical 時套 batch_apply_physical，Enum signal 維持 raw，與產生檔 --physical --batch 相同）
+    --gen-dir  用產生檔（*generate_*.py）內的 decode_0x<ID>_batch()；沒有 --batch 的產生檔退回逐幀 decode_0x<ID>_to_dict()
+               payload 寬度取產生檔的 FRAME_LEN_0x<ID>（與 --dbc 相同）；舊產生檔沒有時用該 ID 第一幀的長度
+- 每個 ID 累積 --chunk-rows 幀（payload 補齊成固定寬度的 bytearray + ts / chan 陣列）才解碼一次並寫出一個 chunk；
+  全部 ID 合計超過 --max-buffered-rows 時先寫出累積最多的 ID，記憶體上限與 ID 數無關
+- 輸出 <out>/<輸入檔名（含副檔名；不同目錄的同名檔前面加上層目錄名）>/0x<ID>_<Message>.parquet（每個 chunk 一個 row group）、.arrow（每個 chunk 一個 record batch），
+  或 <out>/<輸入檔名>/0x<ID>_<Message>/part-00000.npz（每個 chunk 一個檔）；欄位為 ts_us、chan 與各 signal
+- 多個輸入檔用 process pool 平行處理（--jobs；每個 worker 只載入一次 DBC / 產生檔）
+
+支援的格式（--format auto 依副檔名 / 檔頭判斷）：
+    candump : candump -l / -L 的 `(ts) iface ID#DATA`（`ID##F DATA` 為 CAN FD）與螢幕格式 `[(ts)] iface ID [len] DE AD ..`
+    asc     : Vector ASC（base hex / dec、timestamps absolute / relative、CAN 與 CANFD 行；時間以 date / Begin Triggerblock 為基準）
+    blf     : Vector BLF（CAN_MESSAGE / CAN_MESSAGE2 / CAN_FD_MESSAGE / CAN_FD_MESSAGE_64；只需標準函式庫）
+    cancap  : rx_sniffer.py --capture 的紀錄
+remote frame、error frame 與其他事件一律略過。Parquet / Arrow 需要 pyarrow，NPZ 只需 numpy。
+
+用法：
+    python3 log_import.py drive1.asc drive2.blf --dbc ../my.dbc --out decoded
+    python3 log_import.py logs/*.log --gen-dir ../out --output npz --jobs 4
+    python3 log_import.py bus.cancap --dbc ../my.dbc --physical --ids 0x117,0x18FEF100 --chunk-rows 200000
+"""
+from __future__ import annotations
+import argparse, glob, importlib.util, logging, os, re, struct, sys, time, zlib
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from can_capture import EFF_FLAG, CaptureRecord, read_capture
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except Exception:
+    pa = pq = None
+
+FORMATS = ("auto", "candump", "asc", "blf", "cancap")
+OUTPUTS = ("parquet", "arrow", "npz")
+CAN_ERR_FLAG = 0x20000000
+
+
+def _key(can_id: int, extended: bool) -> int:
+    return can_id | (EFF_FLAG if extended else 0)
+
+
+def _ts_us(text: str) -> int:
+    """"1436509052.249713" -> 微秒（整數運算，不經 float 失去精度）。"""
+    sec, _, frac = text.partition(".")
+    return int(sec) * 1_000_000 + int((frac + "000000")[:6])
+
+
+# ---------------- candump ---------------- #
+def read_candump(path: str) -> Iterator[CaptureRecord]:
+    chans: Dict[str, int] = {}
+    bad = 0
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            parts = line.split()
+            if not parts:
+                continue
+            try:
+                ts_us = 0
+                if parts[0].startswith("("):
+                    ts_us = _ts_us(parts[0].strip("()"))
+                    parts = parts[1:]
+                if len(parts) < 2:
+                    continue
+                frame = parts[1]
+                if "#" in frame:                                  # log 格式：ID#DATA / ID##F DATA / ID#R
+                    ident, _, rest = frame.partition("#")
+                    if rest[:1] == "R":
+                        continue
+                    is_fd = rest[:1] == "#"
+                    brs = is_fd and bool(int(rest[1], 16) & 1)
+                    data = bytes.fromhex((rest[2:] if is_fd else rest).replace(".", ""))
+                else:                                             # 螢幕格式：ID [len] DE AD ..（FD 的長度為兩位數）
+                    ident = frame
+                    at = next(i for i, p in enumerate(parts) if p.startswith("["))
+                    inner = parts[at].strip("[]")
+                    n = int(inner)
+                    if parts[at + 1:at + 3] == ["remote", "request"]:
+                        continue
+                    is_fd, brs = len(inner) == 2, False
+                    data = bytes.fromhex(" ".join(parts[at + 1:at + 1 + n]))
+                can_id = int(ident, 16)
+            except (ValueError, IndexError, StopIteration):
+                bad += 1
+                continue
+            if can_id & CAN_ERR_FLAG:
+                continue
+            yield CaptureRecord(ts_us, can_id & 0x1FFFFFFF, data, is_fd, brs, len(ident) > 3,
+                                chans.setdefault(parts[0], len(chans)))
+    if bad:
+        logging.warning("%s: %d unparsable lines skipped", path, bad)
+
+
+# ---------------- Vector ASC ---------------- #
+_ASC_MONTHS = {"Jan": 1, "Feb": 2, "Mar": 3, "Mär": 3, "Apr": 4, "May": 5, "Mai": 5, "Jun": 6, "Jul": 7, "Aug": 8,
+               "Sep": 9, "Oct": 10, "Okt": 10, "Nov": 11, "Dec": 12, "Dez": 12}
+_ASC_DATE_FORMATS = ("%m %d %I:%M:%S.%f %p %Y", "%m %d %I:%M:%S %p %Y", "%m %d %H:%M:%S.%f %Y", "%m %d %H:%M:%S %Y")
+
+
+def _asc_date_us(text: str) -> int:
+    """`Mon Jan 1 12:00:00.000 am 2024`（date / Begin Triggerblock 行，本地時間）；月份英 / 德文皆可，認不得時回傳 0。"""
+    parts = text.split()[1:]                 # 去掉星期
+    if parts:
+        parts[0] = str(_ASC_MONTHS.get(parts[0], parts[0]))
+    for fmt in _ASC_DATE_FORMATS:
+        try:
+            return int(datetime.strptime(" ".join(parts), fmt).timestamp() * 1e6)
+        except ValueError:
+            pass
+    return 0
+
+
+def _asc_bytes(tokens: List[str], base: int) -> bytes:
+    return bytes.fromhex(" ".join(tokens)) if base == 16 else bytes(int(b) for b in tokens)
+
+
+def read_asc(path: str) -> Iterator[CaptureRecord]:
+    base, t0_us, relative, last_us = 16, 0, False, 0
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) < 2:
+                continue
+            head = parts[0].lower()
+            if head == "date":
+                t0_us = _asc_date_us(" ".join(parts[1:]))
+                continue
+            if head == "begin" and parts[1].lower() == "triggerblock":
+                t0_us = _asc_date_us(" ".join(parts[2:])) or t0_us   # ts 相對於 trigger block 開始
+                last_us = 0
+                continue
+            if head == "base":
+                base = 10 if parts[1].lower() == "dec" else 16
+                relative = "relative" in (p.lower() for p in parts[2:])
+                continue
+            try:
+                t_us = _ts_us(parts[0])
+            except ValueError:
+                continue                     # Begin / End Triggerblock 等沒有時間的行
+            last_us = last_us + t_us if relative else t_us   # relative：相對上一個事件（含略過的 ErrorFrame 等）
+            try:
+                if parts[1] == "CANFD":      # t CANFD ch Rx|Tx ID[x] [name] brs esi dlc len data...
+                    chan, ident, rest = int(parts[2]) - 1, parts[4], parts[5:]
+                    if rest[0] not in ("0", "1"):
+                        rest = rest[1:]      # 有 symbolic name
+                    brs, n = rest[0] == "1", int(rest[3])
+                    data = _asc_bytes(rest[4:4 + n], base)
+                    is_fd = True
+                else:                        # t ch ID[x] Rx|Tx d dlc data...（r = remote）
+                    if len(parts) < 6 or parts[4] != "d":
+                        continue
+                    chan, ident = int(parts[1]) - 1, parts[2]
+                    n = min(int(parts[5], 16), 8)
+                    data = _asc_bytes(parts[6:6 + n], base)
+                    is_fd = brs = False
+                extended = ident[-1:] in ("x", "X")
+                can_id = int(ident.rstrip("xX"), base)
+            except (ValueError, IndexError):
+                continue                     # ErrorFrame、Statistic 等非資料行
+            yield CaptureRecord(t0_us + last_us, can_id, data, is_fd, brs, extended, chan)
+
+
+# ---------------- Vector BLF ---------------- #
+BLF_FILE_HDR = struct.Struct("<4sLBBBBBBBBQQLL8H8H")
+BLF_OBJ_BASE = struct.Struct("<4sHHLL")        # "LOBJ", header_size, header_version, object_size, object_type
+BLF_OBJ_V1 = struct.Struct("<LHHQ")            # flags, client_index, object_version, timestamp
+BLF_OBJ_V2 = struct.Struct("<LBBHQ8x")         # flags, timestamp_status, reserved, object_version, timestamp, original ts
+BLF_CONTAINER = struct.Struct("<H6xL4x")       # compression method, uncompressed size
+BLF_CAN_MSG = struct.Struct("<HBBL8s")         # channel, flags, dlc, id, data
+BLF_CAN_FD = struct.Struct("<HBBLLBBB5x64s")   # channel, flags, dlc, id, frame_length, bit_count, fd_flags, valid_bytes, data
+BLF_CAN_FD64 = struct.Struct("<BBBBLLLLLLLHBBL")  # channel, dlc, valid_bytes, tx_count, id, frame_length, flags, ..., ext_data_offset, crc
+BLF_CAN_MESSAGE, BLF_LOG_CONTAINER, BLF_CAN_MESSAGE2, BLF_CAN_FD_MESSAGE, BLF_CAN_FD_MESSAGE_64 = 1, 10, 86, 100, 101
+BLF_TIME_TEN_MICS = 1
+
+
+def _systemtime_us(st: Tuple[int, ...]) -> int:
+    year, month, _, day, hour, minute, sec, ms = st
+    if not year:
+        return 0
+    try:
+        return int(datetime(year, month, day, hour, minute, sec, ms * 1000).timestamp() * 1e6)
+    except ValueError:
+        return 0
+
+
+def _blf_objects(buf: bytes, start_us: int, out: List[CaptureRecord]) -> int:
+    """解出 buf 內完整的物件（CAN 幀 append 到 out），回傳第一個不完整物件的位置（跨 container 的物件留到下一塊）。"""
+    pos, end = 0, len(buf)
+    while pos < end:
+        at = buf.find(b"LOBJ", pos, pos + 8)      # 物件之間有 0 ~ 7 bytes 對齊
+        if at < 0:
+            if pos + 8 > end:
+                return pos
+            raise ValueError(f"BLF: object signature not found at container offset {pos}")
+        if at + BLF_OBJ_BASE.size > end:
+            return at
+        _, _, hver, obj_size, obj_type = BLF_OBJ_BASE.unpack_from(buf, at)
+        nxt = at + obj_size
+        if nxt > end:
+            return at
+        pos = nxt
+        if obj_type not in (BLF_CAN_MESSAGE, BLF_CAN_MESSAGE2, BLF_CAN_FD_MESSAGE, BLF_CAN_FD_MESSAGE_64):
+            continue
+        p = at + BLF_OBJ_BASE.size
+        if hver == 1:
+            tflags, _, _, ts = BLF_OBJ_V1.unpack_from(buf, p)
+            p += BLF_OBJ_V1.size
+        else:
+            tflags, _, _, _, ts = BLF_OBJ_V2.unpack_from(buf, p)
+            p += BLF_OBJ_V2.size
+        ts_us = start_us + (ts * 10 if tflags == BLF_TIME_TEN_MICS else ts // 1000)
+        if obj_type == BLF_CAN_FD_MESSAGE_64:
+            chan, _, valid, _, cid, _, flags, _, _, _, _, _, _, ext_off, _ = BLF_CAN_FD64.unpack_from(buf, p)
+            if flags & 0x0010:                    # remote
+                continue
+            p += BLF_CAN_FD64.size
+            stop = min(p + valid, at + ext_off if ext_off else nxt)
+            data = buf[p:stop].ljust(valid, b"\x00")
+            is_fd, brs = bool(flags & 0x1000), bool(flags & 0x2000)
+        elif obj_type == BLF_CAN_FD_MESSAGE:
+            chan, flags, _, cid, _, _, fd_flags, valid, payload = BLF_CAN_FD.unpack_from(buf, p)
+            if flags & 0x80:
+                continue
+            data, is_fd, brs = payload[:valid], bool(fd_flags & 0x1), bool(fd_flags & 0x2)
+        else:
+            chan, flags, dlc, cid, payload = BLF_CAN_MSG.unpack_from(buf, p)
+            if flags & 0x80:
+                continue
+            data, is_fd, brs = payload[:min(dlc, 8)], False, False
+        out.append(CaptureRecord(ts_us, cid & 0x1FFFFFFF, data, is_fd, brs, bool(cid & EFF_FLAG), max(chan - 1, 0)))
+    return pos
+
+
+def read_blf(path: str) -> Iterator[CaptureRecord]:
+    with open(path, "rb") as f:
+        hdr = f.read(BLF_FILE_HDR.size)
+        if len(hdr) < BLF_FILE_HDR.size or hdr[:4] != b"LOGG":
+            raise ValueError(f"{path}: not a BLF file")
+        fields = BLF_FILE_HDR.unpack(hdr)
+        start_us = _systemtime_us(fields[14:22])
+        f.seek(fields[1])
+        tail = b""
+        out: List[CaptureRecord] = []
+        while True:
+            base = f.read(BLF_OBJ_BASE.size)
+            if len(base) < BLF_OBJ_BASE.size:
+                break
+            sig, _, _, obj_size, obj_type = BLF_OBJ_BASE.unpack(base)
+            if sig != b"LOBJ":
+                raise ValueError(f"{path}: corrupt object header at offset {f.tell() - BLF_OBJ_BASE.size}")
+            body = f.read(obj_size - BLF_OBJ_BASE.size)
+            f.read(obj_size % 4)
+            if len(body) < obj_size - BLF_OBJ_BASE.size:
+                logging.warning("%s: truncated last object ignored", path)
+                break
+            if obj_type != BLF_LOG_CONTAINER:
+                continue
+            method, _ = BLF_CONTAINER.unpack_from(body)
+            payload = body[BLF_CONTAINER.size:]
+            if method == 2:
+                payload = zlib.decompress(payload)
+            elif method != 0:
+                raise ValueError(f"{path}: unsupported BLF compression method {method}")
+            buf = tail + payload if tail else payload
+            tail = buf[_blf_objects(buf, start_us, out):]
+            yield from out
+            out.clear()
+
+
+def detect_format(path: str) -> str:
+    with open(path, "rb") as f:
+        head = f.read(8)
+    if head[:4] == b"LOGG":
+        return "blf"
+    if head[:6] == b"CANCAP":
+        return "cancap"
+    return "asc" if path.lower().endswith(".asc") else "candump"
+
+
+READERS: Dict[str, Callable[[str], Iterator[CaptureRecord]]] = {
+    "candump": read_candump, "asc": read_asc, "blf": read_blf, "cancap": read_capture,
+}
+
+
+# ---------------- 解碼表 ---------------- #
+class MessageCodec(NamedTuple):
+    name: str                                          # 輸出檔名，例如 0x117_VCU_Status
+    frame_len: int                                     # payload 補齊 / 截斷到的寬度；0 = 用該 ID 第一幀的長度
+    batch: Optional[Callable[[Any], Dict[str, Any]]]   # (N, frame_len) uint8 -> {signal: ndarray}
+    per_frame: Optional[Callable[[bytes], Dict[str, Any]]] = None   # 沒有 batch 時逐幀 data -> {signal: value}
+
+
+class DecodeSpec(NamedTuple):
+    dbc: Optional[str] = None
+    gen_dir: Optional[str] = None
+    physical: bool = False
+    ids: Optional[Tuple[int, ...]] = None              # 只解這些 key（bit31 = extended）；None = 全部
+
+
+def _id_name(key: int) -> str:
+    cid = key & 0x1FFFFFFF
+    return f"0x{cid:08X}" if key & EFF_FLAG else f"0x{cid:X}"
+
+
+def load_dbc_codecs(dbc_path: str, physical: bool = False) -> Dict[int, MessageCodec]:
+    import cantools
+    from auto_generate_can_msg import (batch_apply_physical, batch_extract, batch_signal_layout, message_frame_len,
+                                       needs_physical)
+
+    def make(layout, conv, n):
+        if conv:
+            return lambda frames: batch_apply_physical(batch_extract(frames, layout, n), conv)
+        return lambda frames: batch_extract(frames, layout, n)
+
+    codecs: Dict[int, MessageCodec] = {}
+    for msg in cantools.database.load_file(dbc_path).messages:
+        layout = tuple(batch_signal_layout(sig) for sig in msg.signals)
+        conv = tuple((sig.name, sig.length, bool(sig.is_signed), bool(sig.is_float), float(sig.scale), float(sig.offset))
+                     for sig in msg.signals
+                     if physical and not (getattr(sig, "choices", None) or getattr(sig, "value_descriptions", None))
+                     and needs_physical(sig))
+        key = _key(msg.frame_id, bool(msg.is_extended_frame))
+        n = message_frame_len(msg)
+        codecs[key] = MessageCodec(f"{_id_name(key)}_{msg.name}", n, make(layout, conv, n))
+    return codecs
+
+
+_GEN_FUNC = re.compile(r"^decode_0x([0-9A-Fa-f]+)_(batch|to_dict)$")
+
+
+def load_generated_codecs(gen_dir: str) -> Dict[int, MessageCodec]:
+    """掃 gen_dir 內的 *generate_*.py（單檔 / --single-module 皆可），收集 decode_0x<ID>_batch / _to_dict。"""
+    found: Dict[int, Dict[str, Callable]] = {}
+    for path in sorted(glob.glob(os.path.join(gen_dir, "*generate_*.py"))):
+        modname = "_log_import_" + re.sub(r"\W", "_", os.path.basename(path)[:-3])
+        spec = importlib.util.spec_from_file_location(modname, path)
+        mod = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(mod)
+        for attr, fn in vars(mod).items():
+            m = _GEN_FUNC.match(attr)
+            if m and callable(fn):
+                cid = int(m.group(1), 16)
+                fns = found.setdefault(_key(cid, cid > 0x7FF), {})
+                fns[m.group(2)] = fn
+                fns["frame_len"] = getattr(mod, f"FRAME_LEN_0x{cid:X}", 0)
+    codecs: Dict[int, MessageCodec] = {}
+    for key, fns in found.items():
+        batch = fns.get("batch")
+        # 不補到 64 bytes：classic CAN 省 8 倍記憶體，lsb < 0 的 Motorola 位元也才會繞回真正的 payload 尾端
+        codecs[key] = MessageCodec(_id_name(key), fns["frame_len"],
+                                   (lambda fn: lambda frames: fn(frames, frames.shape[1]))(batch) if batch else None,
+                                   fns.get("to_dict"))
+    if not codecs:
+        raise ValueError(f"no decode_0x<ID>_batch / decode_0x<ID>_to_dict found in {gen_dir}/*generate_*.py")
+    return codecs
+
+
+def load_codecs(spec: DecodeSpec) -> Dict[int, MessageCodec]:
+    codecs = load_dbc_codecs(spec.dbc, spec.physical) if spec.dbc else load_generated_codecs(spec.gen_dir)
+    if spec.ids is not None:
+        missing = set(spec.ids) - set(codecs)
+        if missing:
+            raise ValueError(f"message ID={', '.join(_id_name(k) for k in sorted(missing))} not found in {spec.dbc or spec.gen_dir}")
+        codecs = {k: v for k, v in codecs.items() if k in spec.ids}
+    return codecs
+
+
+# ---------------- 欄式輸出 ---------------- #
+class ColumnWriter:
+    """一個 message 一個 writer：parquet / arrow 附加到同一個檔（row group / record batch），npz 每個 chunk 一個 part 檔。"""
+
+    def __init__(self, base: str, output: str, compression: Optional[str]):
+        self.base, self.output, self.compression = base, output, compression
+        self.parts = 0
+        self.rows = 0
+        self._schema = None
+        self._writer = None
+
+    def write(self, cols: Dict[str, Any]) -> None:
+        if self.output == "npz":
+            if not self.parts:
+                os.makedirs(self.base, exist_ok=True)
+                for old in glob.glob(os.path.join(self.base, "part-*.npz")):
+                    os.remove(old)    # 上次轉檔留下、這次不會覆蓋到的 part
+            save = np.savez if self.compression is None else np.savez_compressed
+            save(os.path.join(self.base, f"part-{self.parts:05d}.npz"), **cols)
+        else:
+            table = pa.table(cols)
+            if self._writer is None:
+                self._schema = table.schema
+                if self.output == "parquet":
+                    self._writer = pq.ParquetWriter(self.base + ".parquet", self._schema, compression=self.compression)
+                else:
+                    opts = pa.ipc.IpcWriteOptions(compression=self.compression if self.compression in ("zstd", "lz4") else None)
+                    self._writer = pa.ipc.new_file(self.base + ".arrow", self._schema, options=opts)
+            elif table.schema != self._schema:
+                table = table.cast(self._schema)   # 逐幀解碼時同一欄可能前一個 chunk 是 int、這個是 float
+            self._writer.write_table(table)
+        self.parts += 1
+        self.rows += len(cols["ts_us"])
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+class MessageBuffer:
+    """一個 ID 的待解碼幀：payload 補齊成 frame_len bytes 接在同一個 bytearray（解碼時直接 reshape 成 (N, frame_len)）。"""
+    __slots__ = ("codec", "writer", "frame_len", "ts", "chan", "payload", "rows")
+
+    def __init__(self, codec: MessageCodec, writer: ColumnWriter):
+        self.codec, self.writer = codec, writer
+        self.frame_len = codec.frame_len
+        self._reset()
+
+    def _reset(self) -> None:
+        self.ts, self.chan, self.payload, self.rows = array("q"), array("H"), bytearray(), 0
+
+    def add(self, rec: CaptureRecord) -> None:
+        n = self.frame_len
+        if not n:
+            n = self.frame_len = len(rec.data) or 8
+        self.ts.append(rec.ts_us)
+        self.chan.append(rec.chan)
+        data = rec.data
+        self.payload += data[:n] if len(data) >= n else data.ljust(n, b"\x00")
+        self.rows += 1
+
+    def flush(self) -> None:
+        if not self.rows:
+            return
+        n, rows = self.frame_len, self.rows
+        frames = np.frombuffer(self.payload, dtype=np.uint8).reshape(rows, n)
+        cols: Dict[str, Any] = {"ts_us": np.frombuffer(self.ts, dtype=np.int64), "chan": np.frombuffer(self.chan, dtype=np.uint16)}
+        if self.codec.batch is not None:
+            cols.update(self.codec.batch(frames))
+        else:
+            decoded = [self.codec.per_frame(frames[i].tobytes()) for i in range(rows)]
+            for name in decoded[0]:
+                vals = [int(d[name]) if isinstance(d[name], int) else d[name] for d in decoded]
+                col = np.asarray(vals)
+                if col.dtype == np.float64 and all(type(v) is int for v in vals):
+                    col = np.asarray(vals, dtype=np.uint64)   # 混有 >= 2**63 的 64-bit raw 值時 numpy 會推成 float64
+                cols[name] = col
+        self.writer.write(cols)
+        self._reset()   # 舊的 array 仍被 np.frombuffer 參照，換新的而不是清空
+
+
+_WORKER_CODECS: Optional[Dict[int, MessageCodec]] = None
+
+
+def _init_worker(spec: DecodeSpec) -> None:
+    """Process pool initializer：fork 時沿用父行程已載入的解碼表；spawn 時每個 worker 只載入一次。"""
+    global _WORKER_CODECS
+    if _WORKER_CODECS is None:
+        _WORKER_CODECS = load_codecs(spec)
+
+
+def output_names(paths: Sequence[str]) -> List[str]:
+    """每個輸入檔的輸出子目錄名：檔名（保留副檔名：drive1.asc 與 drive1.blf 不會寫到同一處）；
+    不同目錄的同名檔（day1/bus.log、day2/bus.log）前面加上層目錄名，仍重複時再加序號。"""
+    base = [Path(p).name for p in paths]
+    names = [b if base.count(b) == 1 else f"{Path(os.path.abspath(p)).parent.name}_{b}" for p, b in zip(paths, base)]
+    seen: Dict[str, int] = {}
+    out: List[str] = []
+    for name in names:
+        k = seen[name] = seen.get(name, 0) + 1
+        out.append(name if names.count(name) == 1 else f"{name}-{k}")
+    return out
+
+
+def convert_file(path: str, out_dir: str, fmt: str = "auto", output: str = "parquet", compression: Optional[str] = "zstd",
+                 chunk_rows: int = 65536, max_buffered_rows: int = 1_000_000,
+                 codecs: Optional[Dict[int, MessageCodec]] = None, name: Optional[str] = None) -> Dict[str, Any]:
+    """串流讀取 path、解碼、分 chunk 寫出到 <out_dir>/<name>/；回傳統計。codecs 省略時用 worker 的解碼表，
+    name 省略時為 output_names([path])[0]（即檔名）。"""
+    codecs = codecs if codecs is not None else _WORKER_CODECS
+    fmt = detect_format(path) if fmt == "auto" else fmt
+    dest = os.path.join(out_dir, name or Path(path).name)
+    os.makedirs(dest, exist_ok=True)
+    bufs: Dict[int, MessageBuffer] = {}
+    unknown: Dict[int, int] = {}
+    frames = buffered = 0
+    t0 = time.perf_counter()
+    try:
+        for rec in READERS[fmt](path):
+            frames += 1
+            key = rec.can_id | EFF_FLAG if rec.extended else rec.can_id
+            buf = bufs.get(key)
+            if buf is None:
+                codec = codecs.get(key)
+                if codec is None:
+                    unknown[key] = unknown.get(key, 0) + 1
+                    continue
+                buf = bufs[key] = MessageBuffer(codec, ColumnWriter(os.path.join(dest, codec.name), output, compression))
+            buf.add(rec)
+            buffered += 1
+            if buf.rows >= chunk_rows:
+                buffered -= buf.rows
+                buf.flush()
+            elif buffered >= max_buffered_rows:
+                big = max(bufs.values(), key=lambda b: b.rows)
+                buffered -= big.rows
+                big.flush()
+        for buf in bufs.values():
+            buf.flush()
+    finally:
+        for buf in bufs.values():
+            buf.writer.close()
+    dt = time.perf_counter() - t0
+    return {"path": path, "format": fmt, "dest": dest, "frames": frames, "seconds": dt,
+            "messages": {b.codec.name: (b.writer.rows, b.writer.parts) for b in bufs.values()}, "unknown": unknown}
+
+
+def print_summary(res: Dict[str, Any]) -> None:
+    decoded = sum(rows for rows, _ in res["messages"].values())
+    dt = res["seconds"]
+    print(f"[import] {res['path']} ({res['format']}): {res['frames']} frames, {decoded} decoded into "
+          f"{len(res['messages'])} messages, {res['frames'] - decoded} not decoded, {dt:.2f}s "
+          f"({res['frames'] / dt if dt else 0.0:.0f} frames/s) -> {res['dest']}")
+    if res["unknown"]:
+        top = sorted(res["unknown"].items(), key=lambda kv: -kv[1])[:8]
+        print("         skipped IDs (not in DBC / --ids): " + ", ".join(f"{_id_name(k)}×{n}" for k, n in top)
+              + (" ..." if len(res["unknown"]) > len(top) else ""))
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="ASC / BLF / candump / .cancap 紀錄串流解碼成每個 message 的欄式檔")
+    p.add_argument("inputs", nargs="+", help="輸入紀錄檔（.asc / .blf / candump .log / .cancap）")
+    src = p.add_mutually_exclusive_group(required=True)
+    src.add_argument("--dbc", help="以 DBC 直接解碼（與 auto_generate_can_msg.py 相同的位元規則）")
+    src.add_argument("--gen-dir", help="auto_generate_can_msg.py 的輸出目錄（使用 decode_0x<ID>_batch / _to_dict）")
+    p.add_argument("--physical", action="store_true", help="--dbc 時以物理值解碼（signed / float / scale / offset）")
+    p.add_argument("--ids", help="只解這些 CAN ID，逗號分隔（> 0x7FF 視為 extended）")
+    p.add_argument("--format", default="auto", choices=FORMATS, help="輸入格式 (預設 auto：依檔頭 / 副檔名判斷)")
+    p.add_argument("--output", default="parquet", choices=OUTPUTS, help="輸出格式 (預設 parquet；parquet / arrow 需 pyarrow)")
+    p.add_argument("--compression", default="zstd",
+                   help="parquet: zstd / snappy / gzip / none；arrow: zstd / lz4 / none；npz: none 以外皆壓縮 (預設 zstd)")
+    p.add_argument("--out", default="decoded", help="輸出目錄，每個輸入檔一個子目錄 (預設 decoded)")
+    p.add_argument("--chunk-rows", type=int, default=65536, help="每個 message 累積幾幀寫出一個 chunk (預設 65536)")
+    p.add_argument("--max-buffered-rows", type=int, default=1_000_000,
+                   help="全部 message 合計最多暫存幾幀，超過先寫出累積最多的 (預設 1000000)")
+    p.add_argument("--jobs", type=int, default=0, help="平行處理的 process 數（預設 0 = CPU 核心數；1 = 不平行）")
+    p.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"])
+    return p.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    logging.basicConfig(level=getattr(logging, args.log_level), format="[%(levelname)s] %(message)s")
+    if args.output != "npz" and pa is None:
+        raise SystemExit("[ERR] pyarrow not installed; pip install pyarrow (or use --output npz)")
+    ids = None
+    if args.ids:
+        ids = tuple(_key(i, i > 0x7FF) for i in (int(s.strip(), 0) for s in args.ids.split(",") if s.strip()))
+    spec = DecodeSpec(args.dbc, args.gen_dir, args.physical, ids)
+    try:
+        codecs = load_codecs(spec)
+    except (OSError, ValueError) as e:
+        raise SystemExit(f"[ERR] {e}")
+    logging.info("%d messages to decode (%s)", len(codecs), args.dbc or args.gen_dir)
+
+    global _WORKER_CODECS
+    compression = None if args.compression.lower() == "none" else args.compression
+    kwargs = dict(fmt=args.format, output=args.output, compression=compression,
+                  chunk_rows=max(1, args.chunk_rows), max_buffered_rows=max(1, args.max_buffered_rows))
+    jobs = min(args.jobs or os.cpu_count() or 1, len(args.inputs))
+    names = output_names(args.inputs)   # 同名輸入檔不可寫到同一個輸出目錄（--jobs 時更會互相覆寫）
+    failed = 0
+    if jobs <= 1:
+        for path, name in zip(args.inputs, names):
+            try:
+                print_summary(convert_file(path, args.out, codecs=codecs, name=name, **kwargs))
+            except (OSError, ValueError, zlib.error) as e:
+                print(f"[ERR] {path}: {e}")
+                failed += 1
+    else:
+        _WORKER_CODECS = codecs  # fork 的 worker 直接繼承，不用再載入
+        try:
+            with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(spec,)) as pool:
+                futures = [(path, pool.submit(convert_file, path, args.out, name=name, **kwargs))
+                           for path, name in zip(args.inputs, names)]
+                for path, fut in futures:
+                    try:
+                        print_summary(fut.result())
+                    except (OSError, ValueError, zlib.error) as e:
+                        print(f"[ERR] {path}: {e}")
+                        failed += 1
+        finally:
+            _WORKER_CODECS = None
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
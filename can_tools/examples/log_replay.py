@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+把 .cancap 紀錄重播進模擬 Server 的收包流程（解碼 → state → 回應規則），不需硬體
+
+- 以 capture_log.CaptureLog（mmap + sidecar 索引）讀檔：--start / --end（相對第一幀的秒數）與 --ids 只讀需要的 block
+- 每一幀走 ZlgSimServer._on_rx_frame()（CanParserAdapter.parse_changed → state.update → _maybe_respond），
+  與實機收包完全相同；回應幀進 TX 佇列，預設印出（同 --dry-run），加 --send 則經 --transport 送出
+- 速度：--speed 1 依原始時間間隔、--speed N 為 N 倍速、--speed 0 盡快
+- 只看檔案資訊：--info（幀數、時間範圍、每個 ID 的幀數）
+
+用法：
+    python3 log_replay.py bus.cancap --info
+    python3 log_replay.py bus.cancap --dbc ../my.dbc --config sim_config.yaml --speed 10 --ids 0x117,0x7DF
+    python3 log_replay.py bus.cancap --dbc ../my.dbc --config sim_config.yaml --send --transport vbus --vbus-shm --ifname bus0
+"""
+from __future__ import annotations
+import argparse, logging, time
+from typing import Optional, Set
+
+from can_sim_server_zlg import ZlgSimServer, build_arg_parser, load_config, load_parsers
+from can_transport import EFF_FLAG, open_transport
+from capture_log import CaptureLog
+from zlg_rx_engine import RxConfig
+
+
+def parse_args() -> argparse.Namespace:
+    p = build_arg_parser()
+    p.description = "Replay a .cancap capture into the simulator RX pipeline (decode, state, response rules)"
+    p.add_argument("capture", help="Capture file written by rx_sniffer.py --capture")
+    p.add_argument("--info", action="store_true", help="Print capture summary (time range, frames per ID) and exit")
+    p.add_argument("--reindex", action="store_true", help="Rebuild the sidecar index (<capture>.idx)")
+    p.add_argument("--start", type=float, default=None, help="Start offset in seconds from the first frame")
+    p.add_argument("--end", type=float, default=None, help="End offset in seconds from the first frame")
+    p.add_argument("--ids", help="Comma-separated CAN IDs to replay (extended IDs > 0x7FF are matched as extended)")
+    p.add_argument("--speed", type=float, default=1.0, help="1 = real time, N = N x real time, 0 = as fast as possible")
+    p.add_argument("--send", action="store_true", help="Transmit responses via --transport instead of printing them")
+    p.add_argument("--periodic", action="store_true", help="Also run periodic / startup_burst jobs during replay")
+    return p.parse_args()
+
+
+def parse_ids(text: Optional[str]) -> Optional[Set[int]]:
+    if not text:
+        return None
+    ids = [int(s.strip(), 0) for s in text.split(",") if s.strip()]
+    return {i | EFF_FLAG if i > 0x7FF else i for i in ids}
+
+
+def print_info(log: CaptureLog) -> None:
+    t0, t1 = log.time_range()
+    print(f"{log.path}: {len(log.blocks)} blocks, {log.frame_count()} frames, {(t1 - t0) / 1e6:.3f}s "
+          f"({time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(t0 / 1e6))} ~ "
+          f"{time.strftime('%H:%M:%S', time.localtime(t1 / 1e6))})")
+    for cid, count in log.ids().items():
+        ext = bool(cid & EFF_FLAG)
+        print(f"  0x{cid & 0x1FFFFFFF:0{8 if ext else 3}X}{' ext' if ext else ''}  {count}")
+
+
+def replay(log: CaptureLog, srv: ZlgSimServer, speed: float = 1.0, start_us: Optional[int] = None,
+           end_us: Optional[int] = None, ids: Optional[Set[int]] = None) -> None:
+    """依 speed 控制節奏，把每一幀交給 srv._on_rx_frame()。"""
+    on_rx = srv._on_rx_frame
+    n = 0
+    lag_max = 0.0
+    base_ts: Optional[int] = None
+    t0 = time.perf_counter()
+    for rec in log.frames(start_us, end_us, ids):
+        if speed > 0:
+            if base_ts is None:
+                base_ts = rec.ts_us
+            due = (rec.ts_us - base_ts) / 1e6 / speed
+            ahead = due - (time.perf_counter() - t0)
+            if ahead > 0.001:
+                time.sleep(ahead)   # 1 ms 以內的差距不睡，累積到下一幀
+            elif -ahead > lag_max:
+                lag_max = -ahead
+        on_rx(rec.can_id, rec.data)
+        n += 1
+    dt = time.perf_counter() - t0
+    logging.info("replayed %d frames in %.3fs (%.0f frames/s%s)", n, dt, n / dt if dt else 0.0,
+                 f", max lag {lag_max * 1000:.1f}ms" if speed > 0 else "")
+
+
+def main() -> int:
+    args = parse_args()
+    logging.basicConfig(level=getattr(logging, args.log_level), format="[%(levelname)s] %(message)s")
+    try:
+        log = CaptureLog(args.capture, rebuild=args.reindex)
+    except (OSError, ValueError) as e:
+        raise SystemExit(f"[ERR] {e}")
+    if args.info:
+        print_info(log)
+        log.close()
+        return 0
+
+    cfg = load_config(args.config)
+    parsers_by_id = load_parsers(args)
+    transport = None
+    if args.send:
+        transport = open_transport(args, rx_cfg=RxConfig(block_ms=args.rx_block_ms), tx_batch=args.tx_batch)
+        logging.info("Responses go to %s", transport.name)
+    srv = ZlgSimServer(None, None, None, parsers_by_id, cfg, dry_run=transport is None,
+                       tx_batch=args.tx_batch, tx_flush_ms=args.tx_flush_ms,
+                       tx_queue_max=args.tx_queue_max, tx_policy=args.tx_policy, transport=transport)
+    srv.start(rx=False, schedule=args.periodic)
+
+    first, _ = log.time_range()
+    start_us = first + int(args.start * 1e6) if args.start is not None else None
+    end_us = first + int(args.end * 1e6) if args.end is not None else None
+    try:
+        replay(log, srv, args.speed, start_us, end_us, parse_ids(args.ids))
+        time.sleep(0.2)   # 讓 TX 佇列送完
+    except KeyboardInterrupt:
+        pass
+    finally:
+        srv.stop()
+        logging.info("state: %d signals", len(srv.state))
+        if transport is not None:
+            transport.close()
+        log.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
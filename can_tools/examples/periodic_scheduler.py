@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+單執行緒週期排程器（取代每個 PeriodicJob 一條 thread + sleep(1ms) 輪詢）
+
+- 所有工作放在同一個 heap，以 time.monotonic_ns() 的絕對 deadline 排序
+- 下一次 deadline = 上一次 deadline + interval（不是 now + interval），不會累積漂移；
+  落後超過一個週期時跳到下一個未來的時間點，並記錄 overrun
+- 同一時間到期（相差 batch_window_us 以內）的工作一起交給 on_due(jobs)，方便一次送出
+- 每個工作記錄 jitter（實際觸發時間 - deadline）：次數、平均、最大、overrun
+
+用法：
+    sch = PeriodicScheduler(on_due)                 # on_due(List[ScheduledJob])
+    sch.add("VehicleStateTick", 100, payload=job)   # interval_ms=0 表示只觸發一次（可搭配 delay_ms）
+    sch.run(stop_event)                             # 或在 asyncio 內 await sch.run_async(stop_async_event)
+"""
+from __future__ import annotations
+import asyncio, heapq, itertools, threading, time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+_NS = 1_000_000
+
+
+class ScheduledJob:
+    __slots__ = ("name", "interval_ns", "payload", "fired", "overruns", "jitter_sum_ns", "jitter_max_ns")
+
+    def __init__(self, name: str, interval_ns: int, payload: Any = None):
+        self.name, self.interval_ns, self.payload = name, interval_ns, payload
+        self.fired = 0
+        self.overruns = 0
+        self.jitter_sum_ns = 0
+        self.jitter_max_ns = 0
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "fired": self.fired, "overruns": self.overruns,
+            "jitter_avg_us": self.jitter_sum_ns / self.fired / 1000.0 if self.fired else 0.0,
+            "jitter_max_us": self.jitter_max_ns / 1000.0,
+        }
+
+
+class PeriodicScheduler:
+    def __init__(self, on_due: Callable[[List[ScheduledJob]], None], batch_window_us: int = 200,
+                 spin_us: int = 1500):
+        """
+        batch_window_us: deadline 相差在此範圍內的工作視為同時到期，一起觸發
+        spin_us        : 最後這段時間改用 time.sleep 精準等待（Event.wait 在 Windows 上解析度約 15ms）
+        """
+        self.on_due = on_due
+        self.batch_window_ns = batch_window_us * 1000
+        self.spin_ns = spin_us * 1000
+        self.jobs: List[ScheduledJob] = []
+        self._heap: List[Tuple[int, int, ScheduledJob]] = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+
+    def add(self, name: str, interval_ms: float, payload: Any = None, delay_ms: float = 0.0) -> ScheduledJob:
+        """加入工作；第一次於 delay_ms 後觸發。interval_ms <= 0 表示只觸發一次。"""
+        job = ScheduledJob(name, int(interval_ms * _NS), payload)
+        first = time.monotonic_ns() + int(delay_ms * _NS)
+        with self._lock:
+            self.jobs.append(job)
+            heapq.heappush(self._heap, (first, next(self._seq), job))
+        self._wake.set()
+        return job
+
+    def _wait_until(self, deadline_ns: int, stop: threading.Event) -> bool:
+        """等到 deadline；期間有新工作加入或 stop 時提早返回 False。"""
+        while True:
+            remaining = deadline_ns - time.monotonic_ns()
+            if remaining <= 0:
+                return True
+            if stop.is_set():
+                return False
+            if remaining > self.spin_ns:
+                if self._wake.wait((remaining - self.spin_ns) / 1e9):
+                    self._wake.clear()
+                    return False
+            else:
+                time.sleep(remaining / 1e9)
+
+    def _next_deadline(self) -> Optional[int]:
+        with self._lock:
+            return self._heap[0][0] if self._heap else None
+
+    def _pop_due(self, now: int) -> List[ScheduledJob]:
+        """取出到期（含 batch window 內）的工作、記錄 jitter，並排入下一次 deadline。"""
+        due: List[ScheduledJob] = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now + self.batch_window_ns:
+                deadline, _, job = heapq.heappop(self._heap)
+                late = max(0, now - deadline)
+                job.fired += 1
+                job.jitter_sum_ns += late
+                if late > job.jitter_max_ns:
+                    job.jitter_max_ns = late
+                due.append(job)
+                if job.interval_ns <= 0:
+                    continue
+                nxt = deadline + job.interval_ns
+                if nxt <= now:
+                    # 落後超過一個週期：跳過錯過的觸發點，維持原本的相位
+                    missed = (now - nxt) // job.interval_ns + 1
+                    job.overruns += missed
+                    nxt += missed * job.interval_ns
+                heapq.heappush(self._heap, (nxt, next(self._seq), job))
+        return due
+
+    def run(self, stop: threading.Event) -> None:
+        while not stop.is_set():
+            head = self._next_deadline()
+            if head is None:
+                self._wake.wait(0.1)
+                self._wake.clear()
+                continue
+            if not self._wait_until(head, stop):
+                continue
+            due = self._pop_due(time.monotonic_ns())
+            if due:
+                self.on_due(due)
+
+    async def run_async(self, stop: "asyncio.Event", max_sleep_s: float = 0.05) -> None:
+        """asyncio 版：在 event loop 上等待 deadline（每次最多睡 max_sleep_s，以便察覺新加入的工作）。
+        on_due 可以是一般函式或 coroutine function。"""
+        while not stop.is_set():
+            head = self._next_deadline()
+            remaining = max_sleep_s * 1e9 if head is None else head - time.monotonic_ns()
+            if remaining > 0:
+                await asyncio.sleep(min(remaining / 1e9, max_sleep_s))
+                continue
+            due = self._pop_due(time.monotonic_ns())
+            if due:
+                ret = self.on_due(due)
+                if asyncio.iscoroutine(ret):
+                    await ret
+
+    def format_stats(self) -> List[str]:
+        out = []
+        for job in self.jobs:
+            s = job.stats()
+            out.append(f"{job.name}: fired={s['fired']} overruns={s['overruns']} "
+                       f"jitter avg={s['jitter_avg_us']:.0f}us max={s['jitter_max_us']:.0f}us")
+        return out
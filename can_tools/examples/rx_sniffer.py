@@ -1,8 +1,11 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """
-ZLG USBCANFD RX Sniffer
-- 放在 examples/ 與 zlgcan.py/zlgcan.dll/kerneldlls/ 同層
+ZLG USBCANFD / SocketCAN RX Sniffer
+- ZLG：放在 examples/ 與 zlgcan.py/zlgcan.dll/kerneldlls/ 同層
+- Linux：--transport socketcan --ifname can0（或 vcan0）
+- --capture bus.cancap：寫入二進位紀錄（can_capture.py，背景 thread 寫檔、可壓縮），畫面改為取樣 / 限速顯示
+- 逐幀列印以 --print-max（每秒行數上限）/ --print-every（每 N 幀取 1）限速，避免終端機拖慢收包
 """
 from __future__ import annotations
 import argparse, sys, os, time
@@ -19,58 +22,9 @@ if hasattr(os, "add_dll_directory"):
         try: os.add_dll_directory(str(kd))
         except Exception: pass
 
-import zlgcan  # type: ignore
-
-def _build_dev_map() -> dict[str, int]:
-    names = [
-        "ZCAN_USBCANFD_100U",
-        "ZCAN_USBCANFD_100U_MINI",
-        "ZCAN_USBCANFD_200U",
-        "ZCAN_USBCANFD_400U",
-        "ZCAN_USBCANFD_800U",
-    ]
-    dev_map = {}
-    for nm in names:
-        v = getattr(zlgcan, nm, None)
-        if v is not None:
-            dev_map[nm.replace("ZCAN_", "")] = v
-    return dev_map
-
-def open_device(dev_type_key: str, dev_idx: int) -> int:
-    dev_map = _build_dev_map()
-    dtype = dev_map.get(dev_type_key.upper())
-    if dtype is None:
-        raise SystemExit(f"[ERR] Unsupported dev type '{dev_type_key}'. Available: {list(dev_map.keys())}")
-    lib = zlgcan.ZCAN()
-    h = lib.OpenDevice(dtype, dev_idx, 0)
-    if h == getattr(zlgcan, "INVALID_DEVICE_HANDLE", 0):
-        raise SystemExit("[ERR] OpenDevice failed")
-    return h
-
-def start_channel(dev_handle: int, chn: int, abit: int, dbit: int, loopback: bool=False) -> int:
-    lib = zlgcan.ZCAN()
-    ok = lib.ZCAN_SetValue(dev_handle, f"{chn}/canfd_abit_baud_rate", str(abit).encode("utf-8"))
-    if ok != getattr(zlgcan, "ZCAN_STATUS_OK", 1):
-        raise SystemExit("[ERR] Set arbitration bitrate failed")
-    ok = lib.ZCAN_SetValue(dev_handle, f"{chn}/canfd_dbit_baud_rate", str(dbit).encode("utf-8"))
-    if ok != getattr(zlgcan, "ZCAN_STATUS_OK", 1):
-        raise SystemExit("[ERR] Set data bitrate failed")
-    try:
-        lib.ZCAN_SetValue(dev_handle, f"{chn}/initenal_resistance", b"1")
-    except Exception:
-        pass
-
-    cfg = zlgcan.ZCAN_CHANNEL_INIT_CONFIG()
-    cfg.can_type = getattr(zlgcan, "ZCAN_TYPE_CANFD", 1)
-    cfg.config.canfd.mode = 1 if loopback else 0
-
-    ch = lib.InitCAN(dev_handle, chn, cfg)
-    if ch is None:
-        raise SystemExit("[ERR] InitCAN failed")
-
-    if lib.StartCAN(ch) != getattr(zlgcan, "ZCAN_STATUS_OK", 1):
-        raise SystemExit("[ERR] StartCAN failed")
-    return ch
+from can_capture import CODECS, CaptureWriter, RatePrinter
+from can_transport import add_transport_args, open_transport
+from zlg_rx_engine import RxConfig
 
 def parse_args() -> argparse.Namespace:
     p = argparse.ArgumentParser(description="USBCANFD RX sniffer")
@@ -80,53 +34,70 @@ def parse_args() -> argparse.Namespace:
     p.add_argument("--abit", type=int, default=500000)
     p.add_argument("--dbit", type=int, default=2000000)
     p.add_argument("--loopback", action="store_true")
+    add_transport_args(p)
+    p.add_argument("--batch", type=int, default=256, help="每次收包最多取幾幀")
+    p.add_argument("--block-ms", type=int, default=20, help="閒置時阻塞等待上限 (ms)")
+    p.add_argument("--stats-sec", type=float, default=0.0, help="每 N 秒印一次收包統計（CPU/幀、延遲）；0 = 只在結束時印")
+    p.add_argument("--print-max", type=float, default=20, help="每秒最多印幾行幀內容（0 = 不印；其餘只計數）")
+    p.add_argument("--print-every", type=int, default=1, help="每 N 幀取 1 幀顯示 (預設 1)")
+    p.add_argument("--capture", help="寫入二進位紀錄檔（.cancap）")
+    p.add_argument("--capture-codec", default="none", choices=list(CODECS), help="block 壓縮：none|zlib|zstd|lz4")
+    p.add_argument("--capture-level", type=int, default=None, help="壓縮等級（zlib 預設 1、zstd 預設 3）")
+    p.add_argument("--capture-block-kb", type=int, default=1024, help="每個 block 大小 KB (預設 1024)")
+    p.add_argument("--capture-ring", type=int, default=8, help="預先配置的 block 數（writer 落後的緩衝）(預設 8)")
     return p.parse_args()
 
 def main() -> int:
     args = parse_args()
-    dev = open_device(args.dev_type, args.dev_idx)
-    chn = start_channel(dev, args.chan, args.abit, args.dbit, loopback=bool(args.loopback))
-    lib = zlgcan.ZCAN()
-    print(f"[INFO] Sniffing dev={dev} chn={chn}  (Ctrl+C to stop)")
+    # tx_echo=None：不更動裝置的 TX echo 設定
+    try:
+        tr = open_transport(args, rx_cfg=RxConfig(batch_fd=args.batch, batch=args.batch, block_ms=args.block_ms),
+                            tx_echo=None)
+    except (RuntimeError, OSError) as e:
+        raise SystemExit(f"[ERR] {e}")
+    cap = None
+    if args.capture:
+        try:
+            cap = CaptureWriter(args.capture, args.capture_codec, args.capture_level, args.capture_block_kb * 1024,
+                                args.capture_ring, chan=args.chan)
+        except (RuntimeError, OSError) as e:
+            tr.close()
+            raise SystemExit(f"[ERR] {e}")
+    printer = RatePrinter(args.print_max, args.print_every)
+    print(f"[INFO] Sniffing {tr.name}  (Ctrl+C to stop)" + (f", capturing to {args.capture}" if cap else ""))
 
+    next_report = time.monotonic() + args.stats_sec
+    rc = 0
     try:
         while True:
-            num_fd = lib.GetReceiveNum(chn, getattr(zlgcan, "ZCAN_TYPE_CANFD", 1))
-            if num_fd:
-                take = min(num_fd, 256)
-                arr, got = lib.ReceiveFD(chn, take, 50)
-                for i in range(got):
-                    f = arr[i].frame
-                    can_id = f.can_id & 0x1FFFFFFF
-                    dl = int(f.len)
-                    data = bytes(f.data[:dl])
-                    brs = bool(f.flags & 0x01)
-                    print(f"[RX-FD] id=0x{can_id:X} len={dl} brs={brs} data={data.hex(' ')}")
-
-            num = lib.GetReceiveNum(chn, getattr(zlgcan, "ZCAN_TYPE_CAN", 0))
-            if num:
-                take = min(num, 256)
-                arr, got = lib.Receive(chn, take, 50)
-                for i in range(got):
-                    f = arr[i].frame
-                    can_id = f.can_id & 0x1FFFFFFF
-                    dlc = int(f.can_dlc)
-                    data = bytes(f.data[:dlc])
-                    print(f"[RX]    id=0x{can_id:X} dlc={dlc} data={data.hex(' ')}")
-
-            time.sleep(0.001)
+            frames = tr.recv(args.block_ms)
+            if cap is not None:
+                cap.add_frames(frames)
+            printer.feed(frames)
+            if args.stats_sec > 0 and time.monotonic() >= next_report:
+                print(f"[STAT] {tr.format_stats()}")
+                if cap is not None:
+                    print(f"[STAT] {cap.format()}")
+                next_report += args.stats_sec
     except KeyboardInterrupt:
         pass
+    except RuntimeError as e:   # capture 寫檔失敗（例如磁碟滿）
+        print(f"[ERR] {e}", file=sys.stderr)
+        rc = 1
     finally:
-        try:
-            lib.ResetCAN(chn)
-        except Exception:
-            pass
-        try:
-            zlgcan.ZCAN().CloseDevice(dev)
-        except Exception:
-            pass
-    return 0
+        print(f"[STAT] {tr.format_stats()}")
+        tr.close()
+        if cap is not None:
+            try:
+                cap.close()
+            except RuntimeError as e:
+                print(f"[ERR] {e}", file=sys.stderr)
+                rc = 1
+            print(f"[STAT] {cap.format()}")
+            if cap.dropped:
+                print(f"[WARN] capture dropped {cap.dropped} frames (writer fell behind); "
+                      f"try a larger --capture-ring / --capture-block-kb or a faster --capture-codec", file=sys.stderr)
+    return rc
 
 if __name__ == "__main__":
     raise SystemExit(main())
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模擬 Server 的 signal 狀態（取代 ZlgSimServer.state 這個多執行緒共用的 dict）
+
+- copy-on-write：寫入端（RX thread）複製目前的 dict、套用變動後，以一次參照替換發佈新 snapshot；
+  已發佈的 snapshot 之後不會再被修改，讀取端（排程 / 回應規則的公式）不需要鎖，也不會擋住 RX
+- 每個 signal 記錄最後更新時間（time.monotonic_ns）與序號；整個 store 有遞增的 seq
+- subscribe(cb, names) 訂閱變動：發佈後在寫入端 thread 呼叫 cb(changed, snapshot)
+- 多個寫入端之間以一把鎖排隊（只有寫入端會拿這把鎖）
+
+用法：
+    st = SignalState()
+    st.update({"PwrSta": 4})                 # RX thread
+    vals = st.values                         # 讀取端：一致的 dict snapshot（請勿修改）
+    vals.get("PwrSta", 0)
+    st.meta("PwrSta")                        # -> (ts_ns, seq)
+    st.subscribe(lambda changed, snap: ..., names=["PwrSta"])
+"""
+from __future__ import annotations
+import logging, threading, time
+from typing import Any, Callable, Dict, Iterable, List, Mapping, NamedTuple, Optional, Tuple
+
+StateCallback = Callable[[Dict[str, Any], "StateSnapshot"], None]
+
+
+class StateSnapshot(NamedTuple):
+    values: Dict[str, Any]                  # signal -> 值
+    meta: Dict[str, Tuple[int, int]]        # signal -> (最後更新 monotonic_ns, 序號)
+    seq: int                                # 發佈序號（每次 update 遞增）
+
+
+class SignalState:
+    def __init__(self, initial: Optional[Mapping[str, Any]] = None):
+        self._write_lock = threading.Lock()
+        self._subs: List[Tuple[StateCallback, Optional[frozenset]]] = []
+        self._snap = StateSnapshot({}, {}, 0)
+        if initial:
+            self.update(initial)
+
+    # ---- 讀取（不拿鎖） ---- #
+    @property
+    def values(self) -> Dict[str, Any]:
+        return self._snap.values
+
+    @property
+    def seq(self) -> int:
+        return self._snap.seq
+
+    def snapshot(self) -> StateSnapshot:
+        return self._snap
+
+    def get(self, name: str, default: Any = None) -> Any:
+        return self._snap.values.get(name, default)
+
+    def meta(self, name: str) -> Optional[Tuple[int, int]]:
+        return self._snap.meta.get(name)
+
+    def changed_since(self, seq: int) -> Dict[str, Any]:
+        """序號大於 seq 的 signal（輪詢式讀取端用：記下上次的 snapshot.seq 即可）。"""
+        snap = self._snap
+        return {k: snap.values[k] for k, (_, s) in snap.meta.items() if s > seq}
+
+    def __len__(self) -> int:
+        return len(self._snap.values)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._snap.values
+
+    # ---- 寫入 ---- #
+    def update(self, changed: Mapping[str, Any], ts_ns: Optional[int] = None) -> int:
+        """套用變動並發佈新 snapshot；回傳新的 seq（changed 為空時不發佈，回傳目前的 seq）。"""
+        if not changed:
+            return self._snap.seq
+        ts = time.monotonic_ns() if ts_ns is None else ts_ns
+        with self._write_lock:
+            old = self._snap
+            seq = old.seq + 1
+            values = old.values.copy()
+            values.update(changed)
+            meta = old.meta.copy()
+            stamp = (ts, seq)
+            for k in changed:
+                meta[k] = stamp
+            snap = StateSnapshot(values, meta, seq)
+            self._snap = snap   # 參照替換是 atomic，讀取端看到的是舊的或新的完整 snapshot
+            subs = self._subs
+        for cb, names in subs:
+            if names is None:
+                hit = dict(changed)
+            else:
+                hit = {k: v for k, v in changed.items() if k in names}
+                if not hit:
+                    continue
+            try:
+                cb(hit, snap)
+            except Exception:
+                logging.exception("SignalState subscriber failed")
+        return seq
+
+    # ---- 訂閱 ---- #
+    def subscribe(self, cb: StateCallback, names: Optional[Iterable[str]] = None) -> StateCallback:
+        """names 為 None 時訂閱全部 signal；回傳 cb，可交給 unsubscribe()。"""
+        entry = (cb, frozenset(names) if names is not None else None)
+        with self._write_lock:
+            self._subs = self._subs + [entry]   # 同樣 copy-on-write，update 迭代中的清單不受影響
+        return cb
+
+    def unsubscribe(self, cb: StateCallback) -> None:
+        with self._write_lock:
+            self._subs = [e for e in self._subs if e[0] is not cb]
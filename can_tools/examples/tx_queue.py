@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+有上限、依 CAN ID 優先的 TX 佇列（取代無上限的 queue.Queue）
+
+- 出列順序比照 CAN 仲裁：ID 小的先送；同 base ID 時 standard 先於 extended；同一 ID 內維持 FIFO
+  （ID > 0x7FF 視為 extended，與 ZlgTxBatcher 相同）
+- 滿了的處理方式（policy）：
+    drop_oldest : 丟掉佇列內最舊的一幀，新幀照常進來
+    coalesce    : 同一 ID 只保留最新的 payload（佇列內已有該 ID 就直接取代）；新 ID 且已滿時同 drop_oldest
+    block       : put() 等到有空位（最多 block_timeout_s，逾時丟棄新幀）；RX thread 送回應時也會被擋住，請小心使用
+- 統計：目前 / 最大深度、丟棄數、coalesce 數，以及 enqueue → 送出（sent() 被呼叫）的延遲
+
+介面與 queue.Queue 相同（put / get / get_nowait，空的時候丟 queue.Empty），
+TX 端送完一批後呼叫 sent() 記錄延遲。
+"""
+from __future__ import annotations
+import heapq, queue, threading, time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Sequence, Set, Tuple
+
+Frame = Tuple[int, bytes]
+POLICIES = ("drop_oldest", "coalesce", "block")
+
+
+def arbitration_key(can_id: int, extended: Optional[bool] = None) -> int:
+    """數值越小越先贏得仲裁：比 11-bit base ID，再比 IDE（standard = 0），再比 extended 的低 18 bits。
+    extended 未給時以 can_id > 0x7FF 判斷。"""
+    if can_id > 0x7FF if extended is None else extended:
+        return (((can_id >> 18) & 0x7FF) << 19) | (1 << 18) | (can_id & 0x3FFFF)
+    return can_id << 19
+
+
+class TxQueue:
+    def __init__(self, maxsize: int = 4096, policy: str = "drop_oldest", block_timeout_s: Optional[float] = 1.0):
+        if policy not in POLICIES:
+            raise ValueError(f"unknown TX queue policy {policy!r} (choose from {', '.join(POLICIES)})")
+        self.maxsize = max(1, int(maxsize))
+        self.policy = policy
+        self.block_timeout_s = block_timeout_s
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._by_id: Dict[int, Deque[List]] = {}    # can_id -> deque([payload, enqueue_ns])
+        self._heap: List[Tuple[int, int]] = []      # (arbitration_key, can_id)，每個 ID 至多一筆
+        self._in_heap: Set[int] = set()             # 在 heap 內有一筆的 ID（含 drop_oldest 清空、尚未清掉的）
+        self._size = 0
+        self._inflight: List[int] = []              # 已出列、尚未 sent() 的 enqueue_ns
+        # 統計
+        self.max_depth = 0
+        self.enqueued = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.sent_frames = 0
+        self.lat_sum_us = 0.0
+        self.lat_max_us = 0.0
+
+    def qsize(self) -> int:
+        return self._size
+
+    def empty(self) -> bool:
+        return self._size == 0
+
+    # ---- 入列 ---- #
+    def _drop_oldest(self) -> None:
+        oldest_id, oldest_ns = None, None
+        for can_id, dq in self._by_id.items():
+            if dq and (oldest_ns is None or dq[0][1] < oldest_ns):
+                oldest_id, oldest_ns = can_id, dq[0][1]
+        if oldest_id is None:
+            return
+        self._by_id[oldest_id].popleft()   # 空掉的 ID 留在 heap（仍算在 _in_heap，不會重複 push），出列時再清
+        self._size -= 1
+        self.dropped += 1
+
+    def put(self, item: Frame, block: bool = True, timeout: Optional[float] = None) -> bool:
+        """放入一幀；回傳 False 表示新幀被丟棄（block 逾時）。block / timeout 只在 policy=block 時有意義。"""
+        can_id, payload = item
+        now = time.monotonic_ns()
+        with self._lock:
+            dq = self._by_id.get(can_id)
+            if self.policy == "coalesce" and dq:
+                dq[-1][0] = payload
+                dq[-1][1] = now
+                self.coalesced += 1
+                return True
+            if self._size >= self.maxsize:
+                if self.policy == "block":
+                    wait = self.block_timeout_s if timeout is None else timeout
+                    if not block or not self._not_full.wait_for(lambda: self._size < self.maxsize, wait):
+                        self.dropped += 1
+                        return False
+                    dq = self._by_id.get(can_id)
+                else:
+                    self._drop_oldest()
+            if dq is None:
+                dq = self._by_id[can_id] = deque()
+            if can_id not in self._in_heap:
+                self._in_heap.add(can_id)
+                heapq.heappush(self._heap, (arbitration_key(can_id), can_id))
+            dq.append([payload, now])
+            self._size += 1
+            self.enqueued += 1
+            if self._size > self.max_depth:
+                self.max_depth = self._size
+            self._not_empty.notify()
+        return True
+
+    def put_many(self, frames: Sequence[Frame]) -> int:
+        """依序 put；回傳被接受的幀數。"""
+        return sum(1 for f in frames if self.put(f))
+
+    # ---- 出列 ---- #
+    def _pop(self) -> Frame:
+        heap, by_id, in_heap = self._heap, self._by_id, self._in_heap
+        while True:
+            _, can_id = heap[0]
+            dq = by_id[can_id]
+            if dq:
+                break
+            heapq.heappop(heap)   # drop_oldest 清空的 ID
+            in_heap.discard(can_id)
+        payload, t_ns = dq.popleft()
+        if not dq:
+            heapq.heappop(heap)
+            in_heap.discard(can_id)
+        self._size -= 1
+        self._inflight.append(t_ns)
+        self._not_full.notify()
+        return can_id, payload
+
+    def get(self, block: bool = True, timeout: Optional[float] = None) -> Frame:
+        with self._lock:
+            if not self._size:
+                if not block or not self._not_empty.wait_for(lambda: self._size > 0, timeout):
+                    raise queue.Empty
+            return self._pop()
+
+    def get_nowait(self) -> Frame:
+        return self.get(block=False)
+
+    def sent(self) -> None:
+        """TX 端送完已出列的幀後呼叫：記錄 enqueue → 送出的延遲。"""
+        now = time.monotonic_ns()
+        with self._lock:
+            inflight, self._inflight = self._inflight, []
+            for t_ns in inflight:
+                lat = (now - t_ns) / 1000.0
+                self.lat_sum_us += lat
+                if lat > self.lat_max_us:
+                    self.lat_max_us = lat
+            self.sent_frames += len(inflight)
+
+    # ---- 統計 ---- #
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            "depth": self._size, "max_depth": self.max_depth, "enqueued": self.enqueued,
+            "dropped": self.dropped, "coalesced": self.coalesced, "sent": self.sent_frames,
+            "lat_avg_us": self.lat_sum_us / self.sent_frames if self.sent_frames else 0.0,
+            "lat_max_us": self.lat_max_us,
+        }
+
+    def format(self) -> str:
+        s = self.snapshot()
+        return (f"txq policy={self.policy} depth={s['depth']}/{self.maxsize} max={s['max_depth']} "
+                f"enq={s['enqueued']} sent={s['sent']} dropped={s['dropped']} coalesced={s['coalesced']} "
+                f"lat avg={s['lat_avg_us']:.0f}us max={s['lat_max_us']:.0f}us")
@@ -1,8 +1,9 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """
-ZLG USBCANFD TX Tester
-- 放在 examples/ 與 zlgcan.py/zlgcan.dll/kerneldlls/ 同層
+ZLG USBCANFD / SocketCAN TX Tester
+- ZLG：放在 examples/ 與 zlgcan.py/zlgcan.dll/kerneldlls/ 同層
+- Linux：--transport socketcan --ifname can0（或 vcan0）
 """
 from __future__ import annotations
 import argparse, sys, os, time
@@ -19,64 +20,7 @@ if hasattr(os, "add_dll_directory"):
         try: os.add_dll_directory(str(kd))
         except Exception: pass
 
-import zlgcan  # type: ignore
-
-def _build_dev_map() -> dict[str, int]:
-    names = [
-        "ZCAN_USBCANFD_100U",
-        "ZCAN_USBCANFD_100U_MINI",
-        "ZCAN_USBCANFD_200U",
-        "ZCAN_USBCANFD_400U",
-        "ZCAN_USBCANFD_800U",
-    ]
-    dev_map = {}
-    for nm in names:
-        v = getattr(zlgcan, nm, None)
-        if v is not None:
-            dev_map[nm.replace("ZCAN_", "")] = v
-    return dev_map
-
-def open_device(dev_type_key: str, dev_idx: int) -> int:
-    dev_map = _build_dev_map()
-    dtype = dev_map.get(dev_type_key.upper())
-    if dtype is None:
-        raise SystemExit(f"[ERR] Unsupported dev type '{dev_type_key}'. Available: {list(dev_map.keys())}")
-    lib = zlgcan.ZCAN()
-    h = lib.OpenDevice(dtype, dev_idx, 0)
-    if h == getattr(zlgcan, "INVALID_DEVICE_HANDLE", 0):
-        raise SystemExit("[ERR] OpenDevice failed")
-    return h
-
-def start_channel(dev_handle: int, chn: int, abit: int, dbit: int, loopback: bool=False) -> int:
-    lib = zlgcan.ZCAN()
-    ok = lib.ZCAN_SetValue(dev_handle, f"{chn}/canfd_abit_baud_rate", str(abit).encode("utf-8"))
-    if ok != getattr(zlgcan, "ZCAN_STATUS_OK", 1):
-        raise SystemExit("[ERR] Set arbitration bitrate failed")
-    ok = lib.ZCAN_SetValue(dev_handle, f"{chn}/canfd_dbit_baud_rate", str(dbit).encode("utf-8"))
-    if ok != getattr(zlgcan, "ZCAN_STATUS_OK", 1):
-        raise SystemExit("[ERR] Set data bitrate failed")
-
-    try:
-        lib.ZCAN_SetValue(dev_handle, f"{chn}/initenal_resistance", b"1")
-    except Exception:
-        pass
-
-    cfg = zlgcan.ZCAN_CHANNEL_INIT_CONFIG()
-    cfg.can_type = getattr(zlgcan, "ZCAN_TYPE_CANFD", 1)
-    cfg.config.canfd.mode = 1 if loopback else 0
-
-    ch = lib.InitCAN(dev_handle, chn, cfg)
-    if ch is None:
-        raise SystemExit("[ERR] InitCAN failed")
-
-    try:
-        lib.ZCAN_SetValue(dev_handle, f"{chn}/set_device_tx_echo", b"0")
-    except Exception:
-        pass
-
-    if lib.StartCAN(ch) != getattr(zlgcan, "ZCAN_STATUS_OK", 1):
-        raise SystemExit("[ERR] StartCAN failed")
-    return ch
+from can_transport import EFF_FLAG, add_transport_args, open_transport
 
 def hex_to_bytes(s: str) -> bytes:
     s = s.strip().replace(" ", "")
@@ -101,6 +45,7 @@ def parse_args() -> argparse.Namespace:
     p.add_argument("--fd", action="store_true", help="send as CAN FD frame")
     p.add_argument("--brs", action="store_true", help="FD bit rate switch (BRS)")
     p.add_argument("--loopback", action="store_true", help="controller loopback mode")
+    add_transport_args(p)
     return p.parse_args()
 
 def main() -> int:
@@ -110,33 +55,17 @@ def main() -> int:
     if not (0 <= len(data) <= 64):
         raise SystemExit("[ERR] payload bytes must be 0..64 for FD (0..8 for classic)")
 
-    dev = open_device(args.dev_type, args.dev_idx)
-    chn = start_channel(dev, args.chan, args.abit, args.dbit, loopback=bool(args.loopback))
-    lib = zlgcan.ZCAN()
+    try:
+        tr = open_transport(args, brs=bool(args.brs), force_fd=bool(args.fd))
+    except (RuntimeError, OSError) as e:
+        raise SystemExit(f"[ERR] {e}")
+    wire_id = can_id | (EFF_FLAG if args.extended else 0)
 
-    print(f"[INFO] Open OK dev={dev} chn={chn}  FD={args.fd} BRS={args.brs} EXT={args.extended}")
+    print(f"[INFO] Open OK {tr.name}  FD={args.fd} BRS={args.brs} EXT={args.extended}")
     sent = 0
     try:
         while True:
-            if args.fd or len(data) > 8:
-                obj = zlgcan.ZCAN_TransmitFD_Data()
-                obj.transmit_type = 0
-                obj.frame.can_id = can_id | (1<<31 if (args.extended or can_id > 0x7FF) else 0)
-                obj.frame.len = len(data)
-                if args.brs:
-                    obj.frame.flags |= 0x1  # BRS
-                for i, b in enumerate(data):
-                    obj.frame.data[i] = b
-                lib.TransmitFD(chn, (zlgcan.ZCAN_TransmitFD_Data * 1)(obj), 1)
-            else:
-                obj = zlgcan.ZCAN_Transmit_Data()
-                obj.transmit_type = 0
-                obj.frame.can_id = can_id | (1<<31 if (args.extended or can_id > 0x7FF) else 0)
-                obj.frame.can_dlc = len(data)
-                for i, b in enumerate(data):
-                    obj.frame.data[i] = b
-                lib.Transmit(chn, (zlgcan.ZCAN_Transmit_Data * 1)(obj), 1)
-
+            tr.send([(wire_id, data)])
             sent += 1
             print(f"[TX] id=0x{can_id:X} len={len(data)} data={data.hex(' ')} count={sent}")
             if args.period_ms <= 0:
@@ -146,14 +75,7 @@ def main() -> int:
             time.sleep(args.period_ms / 1000.0)
         return 0
     finally:
-        try:
-            lib.ResetCAN(chn)
-        except Exception:
-            pass
-        try:
-            zlgcan.ZCAN().CloseDevice(dev)
-        except Exception:
-            pass
+        tr.close()
 
 if __name__ == "__main__":
     raise SystemExit(main())
@@ -14,56 +14,8 @@ if hasattr(os, "add_dll_directory"):
     except Exception:
         pass
 
-import zlgcan  # type: ignore
-
-def _dev_map():
-    m = {}
-    for k in [
-        "ZCAN_USBCANFD_100U",
-        "ZCAN_USBCANFD_100U_MINI",
-        "ZCAN_USBCANFD_200U",
-        "ZCAN_USBCANFD_400U",
-        "ZCAN_USBCANFD_800U",
-    ]:
-        v = getattr(zlgcan, k, None)
-        if v is not None:
-            m[k.replace("ZCAN_", "")] = v
-    return m
-
-def open_dev(kind, idx):
-    dt = _dev_map().get(kind.upper())
-    if dt is None:
-        raise SystemExit(f"Unsupported dev-type: {kind}")
-    h = zlgcan.ZCAN().OpenDevice(dt, idx, 0)
-    if h == getattr(zlgcan, "INVALID_DEVICE_HANDLE", 0):
-        raise SystemExit("OpenDevice failed")
-    return h
-
-def start_chan(dev, ch, abit, dbit, loopback=True, tx_echo=True):
-    lib = zlgcan.ZCAN()
-    # bitrate
-    lib.ZCAN_SetValue(dev, f"{ch}/canfd_abit_baud_rate", str(abit).encode())
-    lib.ZCAN_SetValue(dev, f"{ch}/canfd_dbit_baud_rate", str(dbit).encode())
-    # terminator (ignore errors if not supported)
-    try: 
-        lib.ZCAN_SetValue(dev, f"{ch}/initenal_resistance", b"1")
-    except Exception: pass
-    # init as CAN FD
-    cfg = zlgcan.ZCAN_CHANNEL_INIT_CONFIG()
-    cfg.can_type = getattr(zlgcan, "ZCAN_TYPE_CANFD", 1)
-    cfg.config.canfd.mode = 1 if loopback else 0
-    chn = lib.InitCAN(dev, ch, cfg)
-    if chn is None: 
-        raise SystemExit("InitCAN failed")
-    
-    # tx echo (ignore if not supported)
-    if tx_echo:
-        try: 
-            lib.ZCAN_SetValue(dev, f"{ch}/set_device_tx_echo", b"1")
-        except Exception: pass
-    if lib.StartCAN(chn) != getattr(zlgcan, "ZCAN_STATUS_OK", 1):
-        raise SystemExit("StartCAN failed")
-    return chn
+from can_transport import RxFrame, add_transport_args, open_transport
+from zlg_rx_engine import RxConfig
 
 def hx(s: str) -> bytes:
     s = s.strip().replace(" ", "")
@@ -87,74 +39,48 @@ def parse_args() -> argparse.Namespace:
     # NEW: batch sizes
     p.add_argument("--rx-batch-fd", type=int, default=64, help="FD receive batch size per call")
     p.add_argument("--rx-batch", type=int, default=128, help="Classic CAN receive batch size per call")
+    p.add_argument("--stats", action="store_true", help="print RX stats (CPU/frame, latency) on exit")
+    # socketcan：以 CAN_RAW_RECV_OWN_MSGS 收回自己送的幀（等同 ZLG loopback + TX echo）
+    add_transport_args(p)
     return p.parse_args()
 
 def main() -> int:
     a = parse_args()
     can_id = int(a.id, 0)
     payload = hx(a.data)
-    dev = open_dev(a.dev_type, a.dev_idx)
-    chn = start_chan(dev, a.chan, a.abit, a.dbit, loopback=True, tx_echo=True)
-    lib = zlgcan.ZCAN()
-    print(f"[INFO] dev={dev} chn={chn} FD={a.fd} BRS={a.brs} loopback=ON echo=ON "
+    a.loopback = True
+    # 收包交給共用 transport：TX 之間的空檔在 recv() 內阻塞等待 echo/loopback，不再固定 sleep 後輪詢
+    try:
+        tr = open_transport(a, rx_cfg=RxConfig(batch_fd=max(1, a.rx_batch_fd), batch=max(1, a.rx_batch), block_ms=a.period_ms),
+                            brs=bool(a.brs), force_fd=bool(a.fd), tx_echo=True)
+    except (RuntimeError, OSError) as e:
+        raise SystemExit(f"[ERR] {e}")
+    print(f"[INFO] {tr.name} FD={a.fd} BRS={a.brs} loopback=ON echo=ON "
           f"batchFD={a.rx_batch_fd} batch={a.rx_batch}")
 
+    def on_frame(f: RxFrame) -> None:
+        if f.is_fd:
+            print(f"[RX-FD] id=0x{f.can_id:X} len={len(f.data)} brs={f.brs} data={f.data.hex(' ')}")
+        else:
+            print(f"[RX]    id=0x{f.can_id:X} dlc={len(f.data)} data={f.data.hex(' ')}")
+
     t0 = 0.0
     try:
         while True:
             now = time.time()
             if now - t0 >= (a.period_ms / 1000.0):
-                if a.fd or len(payload) > 8:
-                    obj = zlgcan.ZCAN_TransmitFD_Data()
-                    obj.transmit_type = 0
-                    obj.frame.can_id = can_id | (1 << 31 if can_id > 0x7FF else 0)
-                    obj.frame.len = len(payload)
-                    if a.brs:
-                        obj.frame.flags |= 0x1
-                    for i, b in enumerate(payload): obj.frame.data[i] = b
-                    lib.TransmitFD(chn, (zlgcan.ZCAN_TransmitFD_Data * 1)(obj), 1)
-                else:
-                    obj = zlgcan.ZCAN_Transmit_Data()
-                    obj.transmit_type = 0
-                    obj.frame.can_id = can_id | (1 << 31 if can_id > 0x7FF else 0)
-                    obj.frame.can_dlc = len(payload)
-                    for i, b in enumerate(payload):
-                        obj.frame.data[i] = b
-                    lib.Transmit(chn, (zlgcan.ZCAN_Transmit_Data * 1)(obj), 1)
+                tr.send([(can_id, payload)])
                 print(f"[TX] id=0x{can_id:X} data={payload.hex(' ')}")
                 t0 = now
 
-                # Read-back once after TX (grab echo/loopback)
-                time.sleep(0.01)
-                # FD
-                nfd = lib.GetReceiveNum(chn, getattr(zlgcan, "ZCAN_TYPE_CANFD", 1))
-                if nfd:
-                    arr, got = lib.ReceiveFD(chn, min(nfd, max(1, a.rx_batch_fd)), 10)
-                    for i in range(got):
-                        f = arr[i].frame
-                        dl = int(f.len)
-                        print(f"[RX-FD] id=0x{f.can_id & 0x1FFFFFFF:X} len={dl} brs={bool(f.flags & 1)} "
-                              f"data={bytes(f.data[:dl]).hex(' ')}")
-                # Classic
-                n = lib.GetReceiveNum(chn, getattr(zlgcan, "ZCAN_TYPE_CAN", 0))
-                if n:
-                    arr, got = lib.Receive(chn, min(n, max(1, a.rx_batch)), 10)
-                    for i in range(got):
-                        f = arr[i].frame
-                        dlc = int(f.can_dlc)
-                        print(f"[RX]    id=0x{f.can_id & 0x1FFFFFFF:X} dlc={dlc} "
-                              f"data={bytes(f.data[:dlc]).hex(' ')}")
-
-            time.sleep(0.001)
+            for f in tr.recv(max(0.0, (t0 + a.period_ms / 1000.0 - time.time()) * 1000.0)):
+                on_frame(f)
     except KeyboardInterrupt:
         pass
     finally:
-        try: 
-            lib.ResetCAN(chn)
-        except Exception: pass
-        try: 
-            zlgcan.ZCAN().CloseDevice(dev)
-        except Exception: pass
+        if a.stats:
+            print(f"[STAT] {tr.format_stats()}")
+        tr.close()
     return 0
 
 if __name__ == "__main__":
@@ -0,0 +1,550 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+記憶體內的虛擬 CAN bus（不需 ZLG / vcan，可做壓力 / soak 測試）
+
+- VirtualBus   : 同一個 process 內；多個 Server / sniffer 以 get_bus(name).attach() 接上同一條 bus
+- ShmVirtualBus: 跨 process；以 multiprocessing.shared_memory 的環狀 buffer 共用（Linux / macOS，需要 fcntl）
+- 兩者的節點都是 can_transport.CanTransport（VirtualBusTransport / ShmBusTransport），
+  Server / 工具以 --transport vbus --ifname <bus 名稱> 使用（加 --vbus-shm 走跨 process）
+
+bus 模型：
+- 位元率：frame 在 bus 上的時間 = 仲裁段 bits / abit + 資料段 bits / dbit（FD + BRS 時），
+  bits 以 worst-case bit stuffing 估算（classic: g + 8n + 13 + (g + 8n - 1) // 4）；abit=0 表示不模擬時間
+- 仲裁：bus 忙碌期間各節點送出的幀一起等待，bus 空出時 arbitration_key 最小的先上（與 TxQueue 同規則）
+  （跨 process 版只在同一次 send() 的批次內依 ID 排序，不同 process 之間依先後；為近似）
+- 遺失 / 延遲：各接收端各自以 loss 機率丟棄、以 latency ± jitter 延後交付（seed 固定時可重現）
+- TX 緩衝：每個節點最多 tx_buffer 幀尚未上 bus（跨 process 版：bus 排程最多領先實際時間 tx_window_ms），
+  滿了 send() 等待空位，逾時（tx_timeout_ms）的幀計入 tx failed
+
+用法：
+    bus = get_bus("vbus0", abit=500000, dbit=2000000, loss=0.001, latency_us=200)
+    srv_tr = bus.attach("server"); sniff = bus.attach("sniffer")
+    srv = ZlgSimServer(None, None, None, parsers, cfg, transport=srv_tr); srv.start()
+    sniff.send([(0x117, b"\\x01")]); frames = sniff.recv(20)
+"""
+from __future__ import annotations
+import heapq, logging, os, random, struct, tempfile, threading, time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from can_transport import EFF_FLAG, CanTransport, RxFrame
+from tx_queue import arbitration_key
+from zlg_rx_engine import RxStats
+
+_FD_LENS = (0, 1, 2, 3, 4, 5, 6, 7, 8, 12, 16, 20, 24, 32, 48, 64)
+
+
+def fd_len(n: int) -> int:
+    """payload 長度進位到合法的 CAN FD 長度。"""
+    for L in _FD_LENS:
+        if n <= L:
+            return L
+    return 64
+
+
+def frame_bits(n: int, is_fd: bool, extended: bool) -> Tuple[int, int]:
+    """(仲裁速率 bits, 資料速率 bits)；classic 全部算在仲裁速率，含 worst-case stuffing、ACK、EOF、IFS。"""
+    if not is_fd:
+        g = 54 if extended else 34
+        return g + 8 * n + 13 + (g + 8 * n - 1) // 4, 0
+    n = fd_len(n)
+    arb = 37 if extended else 17              # SOF ~ BRS
+    crc = 21 if n > 16 else 17
+    data = 5 + 8 * n                          # ESI + DLC + data（動態 stuffing 區段）
+    data_bits = data + (data - 1) // 4 + 4 + crc + (crc + 4) // 4 + 1   # + stuff count、CRC、固定 stuff bits、CRC delimiter
+    return arb + (arb - 1) // 4 + 12, data_bits   # ACK(2) + EOF(7) + IFS(3)
+
+
+class BusModel:
+    """位元率 / 遺失 / 延遲參數；abit=0 時 frame 不佔 bus 時間。"""
+
+    def __init__(self, abit: int = 500000, dbit: int = 2000000, loss: float = 0.0,
+                 latency_us: float = 0.0, jitter_us: float = 0.0, seed: Optional[int] = None):
+        self.abit, self.dbit = int(abit), int(dbit or abit)
+        self.loss, self.latency_us, self.jitter_us, self.seed = float(loss), float(latency_us), float(jitter_us), seed
+
+    def duration_ns(self, n: int, is_fd: bool, brs: bool, extended: bool) -> int:
+        if self.abit <= 0:
+            return 0
+        nb, db = frame_bits(n, is_fd, extended)
+        return (nb * 1_000_000_000) // self.abit + (db * 1_000_000_000) // (self.dbit if brs else self.abit)
+
+    def rng(self, index: int) -> random.Random:
+        return random.Random(None if self.seed is None else self.seed * 1000003 + index)
+
+    def delay_ns(self, rng: random.Random) -> int:
+        if self.jitter_us:
+            return max(0, int((self.latency_us + rng.uniform(-self.jitter_us, self.jitter_us)) * 1000))
+        return int(self.latency_us * 1000)
+
+
+class _VbusNode(CanTransport):
+    """兩種 bus 共用的接收端：依交付時間排序的 heap、遺失 / 延遲與統計。"""
+
+    def __init__(self, name: str, model: BusModel, index: int, batch: int, brs: bool, force_fd: bool, recv_own: bool):
+        self.name, self.model, self.index = name, model, index
+        self.batch, self.brs, self.force_fd, self.recv_own = max(1, batch), brs, force_fd, recv_own
+        self._rng = model.rng(index)
+        self._rx: List[Tuple[int, int, RxFrame]] = []   # (deliver_ns, seq, frame)
+        self._rx_seq = 0
+        self._stats = RxStats()
+        self.lost = 0
+        self.tx_frames = 0
+        self.tx_failed = 0
+
+    def _frame_flags(self, can_id: int, payload: bytes) -> Tuple[int, bool, bool]:
+        """(11 / 29-bit ID, is_fd, extended)"""
+        raw = can_id & 0x1FFFFFFF
+        return raw, self.force_fd or len(payload) > 8, bool(can_id & EFF_FLAG) or raw > 0x7FF
+
+    def _deliver(self, end_ns: int, frame: RxFrame) -> None:
+        """呼叫端持有本節點的鎖。"""
+        m = self.model
+        if m.loss and self._rng.random() < m.loss:
+            self.lost += 1
+            return
+        self._rx_seq += 1
+        heapq.heappush(self._rx, (end_ns + m.delay_ns(self._rng), self._rx_seq, frame))
+
+    def _take_ready(self, now: int) -> List[RxFrame]:
+        rx, out = self._rx, []
+        while rx and rx[0][0] <= now and len(out) < self.batch:
+            out.append(heapq.heappop(rx)[2])
+        if out:
+            st = self._stats
+            got = len(out)
+            st.frames += got
+            fd = sum(1 for f in out if f.is_fd)
+            st.fd_frames += fd
+            st.can_frames += got - fd
+            if got > st.max_burst:
+                st.max_burst = got
+            host_us = now // 1000
+            for f in out:
+                st._latency(host_us, f.ts_us)   # ts_us = 上 bus 結束時間；差值即模擬的傳遞延遲
+        return out
+
+    @property
+    def stats(self) -> RxStats:
+        return self._stats
+
+    def format_stats(self) -> str:
+        return f"{self._stats.format()}; tx frames={self.tx_frames} failed={self.tx_failed} lost={self.lost}"
+
+
+# ---------------- 同一 process ---------------- #
+class VirtualBusTransport(_VbusNode):
+    def __init__(self, bus: "VirtualBus", name: str, index: int, batch: int = 256, brs: bool = True,
+                 force_fd: bool = False, recv_own: bool = False, tx_buffer: int = 256, tx_timeout_ms: float = 100.0):
+        super().__init__(name, bus.model, index, batch, brs, force_fd, recv_own)
+        self.bus = bus
+        self.tx_buffer, self.tx_timeout_ms = max(1, tx_buffer), tx_timeout_ms
+        self.pending = 0                     # 已 send、尚未上 bus 的幀數（受 bus 的鎖保護）
+        self._cond = threading.Condition()   # 保護 _rx
+
+    def recv(self, timeout_ms: float) -> List[RxFrame]:
+        st = self._stats
+        c0 = time.thread_time()
+        deadline = time.monotonic_ns() + int(max(0.0, timeout_ms) * 1e6)
+        with self._cond:
+            while True:
+                st.calls += 1
+                now = time.monotonic_ns()
+                out = self._take_ready(now)
+                if out or now >= deadline:
+                    break
+                st.empty_polls += 1
+                st.blocking_waits += 1
+                wake = min(deadline, self._rx[0][0]) if self._rx else deadline
+                st.cpu_s += time.thread_time() - c0
+                self._cond.wait((wake - now) / 1e9)
+                c0 = time.thread_time()
+        st.cpu_s += time.thread_time() - c0
+        return out
+
+    def send(self, frames: Sequence[Tuple[int, bytes]]) -> int:
+        sent = self.bus._submit(self, frames)
+        self.tx_frames += sent
+        self.tx_failed += len(frames) - sent
+        return sent
+
+    def close(self) -> None:
+        self.bus.detach(self)
+
+
+class VirtualBus:
+    """單一 bus thread 依仲裁順序把幀放上 bus，依模型時間交付給其他節點。"""
+
+    LEAD_NS = 200_000   # bus 排程最多領先實際時間 200 us（避免每幀都睡到 bus 空出的那一刻）
+
+    def __init__(self, name: str = "vbus0", abit: int = 500000, dbit: int = 2000000, loss: float = 0.0,
+                 latency_us: float = 0.0, jitter_us: float = 0.0, seed: Optional[int] = None):
+        self.name = name
+        self.model = BusModel(abit, dbit, loss, latency_us, jitter_us, seed)
+        self.nodes: List[VirtualBusTransport] = []
+        self._cond = threading.Condition()
+        self._pending: List[Tuple[int, int, VirtualBusTransport, int, bytes, bool, bool, bool]] = []
+        self._seq = 0
+        self._next_index = 0
+        self._bus_free_ns = 0
+        self._thread: Optional[threading.Thread] = None
+        self._stop = False
+        # 統計
+        self.frames = 0
+        self.busy_ns = 0
+        self.max_pending = 0
+        self._t0 = time.monotonic_ns()
+
+    def attach(self, name: str = "", batch: int = 256, brs: bool = True, force_fd: bool = False,
+               recv_own: bool = False, tx_buffer: int = 256) -> VirtualBusTransport:
+        with self._cond:
+            node = VirtualBusTransport(self, name or f"{self.name}/{self._next_index}", self._next_index,
+                                       batch, brs, force_fd, recv_own, tx_buffer)
+            self._next_index += 1
+            self.nodes = self.nodes + [node]   # bus thread 迭代中的清單不受影響
+            if self._thread is None:
+                self._stop = False
+                self._thread = threading.Thread(target=self._run, name=f"vbus-{self.name}", daemon=True)
+                self._thread.start()
+        return node
+
+    def detach(self, node: VirtualBusTransport) -> None:
+        with self._cond:
+            if node not in self.nodes:
+                return
+            self.nodes = [n for n in self.nodes if n is not node]
+            if self.nodes:
+                return
+            # 最後一個節點離開：停掉 bus thread，之後 get_bus 同名會建新的
+            self._stop = True
+            self._cond.notify_all()
+            th, self._thread = self._thread, None
+        if th is not None:
+            th.join(timeout=1.0)
+            logging.info("%s", self.format())
+            _forget_bus(self)
+
+    def _submit(self, node: VirtualBusTransport, frames: Sequence[Tuple[int, bytes]]) -> int:
+        sent = 0
+        timeout_s = node.tx_timeout_ms / 1000.0
+        with self._cond:
+            for can_id, payload in frames:
+                if node.pending >= node.tx_buffer:
+                    # TX 緩衝滿：叫醒 bus thread 並等它取走（同 ZLG 裝置 TX buffer 滿時 Transmit 阻塞）
+                    self._cond.notify_all()
+                    if not self._cond.wait_for(lambda: node.pending < node.tx_buffer or self._stop, timeout_s) or self._stop:
+                        break
+                raw, is_fd, ext = node._frame_flags(can_id, payload)
+                self._seq += 1
+                heapq.heappush(self._pending, (arbitration_key(raw, ext), self._seq, node, raw, bytes(payload),
+                                               is_fd, is_fd and node.brs, ext))
+                node.pending += 1
+                sent += 1
+            if len(self._pending) > self.max_pending:
+                self.max_pending = len(self._pending)
+            self._cond.notify_all()
+        return sent
+
+    def _run(self) -> None:
+        cond, model = self._cond, self.model
+        with cond:
+            while not self._stop:
+                if not self._pending:
+                    cond.wait()
+                    continue
+                now = time.monotonic_ns()
+                if self._bus_free_ns - now > self.LEAD_NS:
+                    # bus 仍忙：等它空出，期間送進來的幀一起參與仲裁
+                    cond.wait((self._bus_free_ns - now - self.LEAD_NS) / 1e9)
+                    continue
+                _, _, src, raw, payload, is_fd, brs, ext = heapq.heappop(self._pending)
+                src.pending -= 1
+                start = max(now, self._bus_free_ns)
+                end = start + model.duration_ns(len(payload), is_fd, brs, ext)
+                self._bus_free_ns = end
+                self.frames += 1
+                self.busy_ns += end - start
+                frame = RxFrame(raw, payload, is_fd, brs, ext, end // 1000)
+                for n in self.nodes:
+                    if n is src and not n.recv_own:
+                        continue
+                    with n._cond:
+                        n._deliver(end, frame)
+                        n._cond.notify()
+                cond.notify_all()   # 叫醒等 TX 緩衝的 send()
+
+    def format(self) -> str:
+        elapsed = max(1, time.monotonic_ns() - self._t0)
+        return (f"vbus {self.name}: frames={self.frames} load={100.0 * self.busy_ns / elapsed:.1f}% "
+                f"max_pending={self.max_pending} nodes={len(self.nodes)}")
+
+
+_BUSES: Dict[str, VirtualBus] = {}
+_BUSES_LOCK = threading.Lock()
+
+
+def get_bus(name: str = "vbus0", **model: Any) -> VirtualBus:
+    """同名共用同一條 bus（第一次建立時的 model 參數為準）。"""
+    with _BUSES_LOCK:
+        bus = _BUSES.get(name)
+        if bus is None:
+            bus = _BUSES[name] = VirtualBus(name, **model)
+        return bus
+
+
+def _forget_bus(bus: VirtualBus) -> None:
+    with _BUSES_LOCK:
+        if _BUSES.get(bus.name) is bus:
+            del _BUSES[bus.name]
+
+
+# ---------------- 跨 process（shared memory） ---------------- #
+class ShmVirtualBus:
+    """shared memory 環狀 buffer：header + nslots 個固定大小 slot；寫入端以 flock 排隊，讀取端各自維護游標（不拿鎖）。
+
+    header: magic, nslots, abit, dbit, refs, next_node, write_seq, bus_free_ns, frames, busy_ns
+    slot  : seq(寫完才填, = 幀序號 + 1), end_ns, can_id, len, flags(bit0 FD, bit1 BRS, bit2 EXT), src(u32, 同 next_node), data[64]
+    讀取端落後超過 nslots 幀時會被覆寫，計入 overruns。
+    """
+
+    MAGIC = b"VBS2"                                       # slot 版面改變時換 magic，舊版 segment 不會被誤讀
+    _HDR = struct.Struct("=4sIIIIIQQQQ")
+    _HDR_SIZE = 64
+    _SLOT = struct.Struct("=QQIBBI64s")
+    _SEQ = struct.Struct("=Q")
+
+    def __init__(self, name: str = "vbus0", abit: int = 500000, dbit: int = 2000000, nslots: int = 65536,
+                 loss: float = 0.0, latency_us: float = 0.0, jitter_us: float = 0.0, seed: Optional[int] = None):
+        try:
+            import fcntl
+        except ImportError:
+            raise RuntimeError("shared-memory virtual bus needs fcntl (Linux / macOS)")
+        from multiprocessing import shared_memory
+        self._fcntl = fcntl
+        self.name = name
+        self.shm_name = f"canvbus_{name}"
+        self._lock_f = open(os.path.join(tempfile.gettempdir(), f"{self.shm_name}.lock"), "a+b")
+        size = self._HDR_SIZE + nslots * self._SLOT.size
+        with self._locked():
+            try:
+                self._shm = shared_memory.SharedMemory(self.shm_name, create=True, size=size)
+                self._HDR.pack_into(self._shm.buf, 0, self.MAGIC, nslots, abit, dbit, 0, 0, 0, 0, 0, 0)
+            except FileExistsError:
+                self._shm = shared_memory.SharedMemory(self.shm_name)
+            _untrack(self._shm)
+            magic, nslots, abit, dbit, refs = self._HDR.unpack_from(self._shm.buf, 0)[:5]
+            if magic != self.MAGIC:
+                raise RuntimeError(f"shared memory {self.shm_name} is not a virtual bus")
+            struct.pack_into("=I", self._shm.buf, self._OFF_REFS, refs + 1)
+        self.nslots = nslots
+        # 位元率以建立 bus 的 process 為準（寫在 header）；遺失 / 延遲為各節點自己的設定
+        self.model = BusModel(abit, dbit, loss, latency_us, jitter_us, seed)
+        self.buf = self._shm.buf
+        self.nodes: List[ShmBusTransport] = []
+
+    # header 欄位 offset（_HDR 格式 "=4sIIIIIQQQQ"）
+    _OFF_REFS, _OFF_NEXT, _OFF_WSEQ, _OFF_FREE, _OFF_FRAMES, _OFF_BUSY = 16, 20, 24, 32, 40, 48
+
+    def _locked(self):
+        f, fcntl = self._lock_f, self._fcntl
+
+        class _L:
+            def __enter__(self_):
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+            def __exit__(self_, *exc):
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        return _L()
+
+    def _u32(self, off: int) -> int:
+        return struct.unpack_from("=I", self.buf, off)[0]
+
+    def _u64(self, off: int) -> int:
+        return self._SEQ.unpack_from(self.buf, off)[0]
+
+    def write_seq(self) -> int:
+        return self._u64(self._OFF_WSEQ)
+
+    def attach(self, name: str = "", batch: int = 256, brs: bool = True, force_fd: bool = False,
+               recv_own: bool = False, tx_window_ms: float = 5.0) -> "ShmBusTransport":
+        with self._locked():
+            index = self._u32(self._OFF_NEXT)
+            struct.pack_into("=I", self.buf, self._OFF_NEXT, index + 1)
+        node = ShmBusTransport(self, name or f"{self.name}/{index}", index, batch, brs, force_fd, recv_own, tx_window_ms)
+        self.nodes.append(node)
+        return node
+
+    def _publish(self, src: int, frames: List[Tuple[int, int, bytes, bool, bool, bool]], max_lead_ns: int) -> int:
+        """frames: [(arbitration_key, raw_id, payload, is_fd, brs, ext)]（已依仲裁排序）；回傳寫入幀數。
+        bus 排程領先實際時間超過 max_lead_ns 時停止（呼叫端稍後再送剩下的）。"""
+        buf, slot, nslots, model = self.buf, self._SLOT, self.nslots, self.model
+        n = 0
+        with self._locked():
+            wseq = self._u64(self._OFF_WSEQ)
+            free = self._u64(self._OFF_FREE)
+            nframes = self._u64(self._OFF_FRAMES)
+            busy = self._u64(self._OFF_BUSY)
+            now = time.monotonic_ns()   # Linux 的 CLOCK_MONOTONIC 全系統共用，跨 process 可比較
+            for _, raw, payload, is_fd, brs, ext in frames:
+                if free - now > max_lead_ns:
+                    break
+                start = max(now, free)
+                end = start + model.duration_ns(len(payload), is_fd, brs, ext)
+                off = self._HDR_SIZE + (wseq % nslots) * slot.size
+                self._SEQ.pack_into(buf, off, 0)   # 寫入中
+                slot.pack_into(buf, off, 0, end, raw, len(payload), int(is_fd) | int(brs) << 1 | int(ext) << 2, src, payload)
+                wseq += 1
+                self._SEQ.pack_into(buf, off, wseq)   # 最後才填 seq：讀取端看到 seq 才讀內容
+                busy += end - start
+                free = end
+                nframes += 1
+                n += 1
+            struct.pack_into("=QQQQ", buf, self._OFF_WSEQ, wseq, free, nframes, busy)
+        return n
+
+    def _read(self, seq: int) -> Optional[Tuple[int, int, int, int, int, bytes]]:
+        """讀第 seq 幀（0 起算）：(end_ns, raw_id, len, flags, src, data)；已被覆寫回傳 None。"""
+        off = self._HDR_SIZE + (seq % self.nslots) * self._SLOT.size
+        s, end, raw, length, flags, src, data = self._SLOT.unpack_from(self.buf, off)
+        if s != seq + 1 or self._SEQ.unpack_from(self.buf, off)[0] != s:
+            return None
+        return end, raw, length, flags, src, data
+
+    def detach(self, node: "ShmBusTransport") -> None:
+        if node not in self.nodes:
+            return
+        self.nodes.remove(node)
+        if self.nodes:
+            return
+        with self._locked():
+            refs = self._u32(self._OFF_REFS) - 1
+            struct.pack_into("=I", self.buf, self._OFF_REFS, refs)
+            logging.info("%s", self.format())
+            self.buf = None
+            self._shm.close()
+            if refs <= 0:
+                # 最後一個 process：移除 shared memory
+                _track(self._shm)   # unlink() 會順便 unregister
+                try:
+                    self._shm.unlink()
+                except FileNotFoundError:
+                    pass
+        self._lock_f.close()
+
+    def format(self) -> str:
+        return (f"vbus {self.name} (shm): frames={self._u64(self._OFF_FRAMES)} "
+                f"busy={self._u64(self._OFF_BUSY) / 1e9:.3f}s refs={self._u32(self._OFF_REFS)}")
+
+
+def _untrack(shm: Any) -> None:
+    """Python < 3.13 的 resource_tracker 會在任一 process 結束時 unlink 它開過的 shared memory；
+    bus 的生命週期改由 header 的 refs 管理。"""
+    try:
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+
+
+def _track(shm: Any) -> None:
+    try:
+        from multiprocessing import resource_tracker
+        resource_tracker.register(shm._name, "shared_memory")
+    except Exception:
+        pass
+
+
+class ShmBusTransport(_VbusNode):
+    def __init__(self, bus: ShmVirtualBus, name: str, index: int, batch: int = 256, brs: bool = True,
+                 force_fd: bool = False, recv_own: bool = False, tx_window_ms: float = 5.0,
+                 tx_timeout_ms: float = 100.0):
+        super().__init__(name, bus.model, index, batch, brs, force_fd, recv_own)
+        self.bus = bus
+        self.tx_window_ns, self.tx_timeout_ms = int(tx_window_ms * 1e6), tx_timeout_ms
+        self._cursor = bus.write_seq()   # 只收 attach 之後的幀
+        self.overruns = 0
+
+    def _poll_shm(self) -> None:
+        bus = self.bus
+        wseq = bus.write_seq()
+        if wseq - self._cursor > bus.nslots:
+            self.overruns += wseq - self._cursor - bus.nslots
+            self._cursor = wseq - bus.nslots
+        while self._cursor < wseq:
+            rec = bus._read(self._cursor)
+            self._cursor += 1
+            if rec is None:
+                self.overruns += 1
+                continue
+            end, raw, length, flags, src, data = rec
+            if src == self.index and not self.recv_own:
+                continue
+            self._deliver(end, RxFrame(raw, data[:length], bool(flags & 1), bool(flags & 2), bool(flags & 4), end // 1000))
+
+    def recv(self, timeout_ms: float) -> List[RxFrame]:
+        st = self._stats
+        c0 = time.thread_time()
+        deadline = time.monotonic_ns() + int(max(0.0, timeout_ms) * 1e6)
+        idle_s = 50e-6
+        while True:
+            st.calls += 1
+            self._poll_shm()
+            now = time.monotonic_ns()
+            out = self._take_ready(now)
+            if out or now >= deadline:
+                break
+            # 沒有跨 process 的喚醒機制：指數退避輪詢（50 us 起，到 1 ms 為止）
+            st.empty_polls += 1
+            wake = min(deadline, self._rx[0][0]) if self._rx else deadline
+            st.cpu_s += time.thread_time() - c0
+            time.sleep(min(idle_s, (wake - now) / 1e9))
+            c0 = time.thread_time()
+            idle_s = min(idle_s * 2, 1e-3)
+        st.cpu_s += time.thread_time() - c0
+        return out
+
+    def send(self, frames: Sequence[Tuple[int, bytes]]) -> int:
+        items = []
+        for can_id, payload in frames:
+            raw, is_fd, ext = self._frame_flags(can_id, payload)
+            items.append((arbitration_key(raw, ext), raw, bytes(payload), is_fd, is_fd and self.brs, ext))
+        items.sort(key=lambda it: it[0])
+        sent = 0
+        deadline = time.monotonic() + self.tx_timeout_ms / 1000.0
+        while sent < len(items):
+            n = self.bus._publish(self.index, items[sent:], self.tx_window_ns)
+            sent += n
+            if sent < len(items):
+                if n:
+                    deadline = time.monotonic() + self.tx_timeout_ms / 1000.0
+                elif time.monotonic() >= deadline:
+                    break   # tx_timeout_ms 內 bus 都沒有空間
+                time.sleep(0.0005)   # bus 排程已滿 tx_window：等 bus 時間追上
+        self.tx_frames += sent
+        self.tx_failed += len(items) - sent
+        return sent
+
+    def format_stats(self) -> str:
+        return f"{super().format_stats()} overruns={self.overruns}"
+
+    def close(self) -> None:
+        self.bus.detach(self)
+
+
+# ---------------- CLI ---------------- #
+_SHM_BUSES: Dict[str, ShmVirtualBus] = {}
+
+
+def open_vbus(args: Any, name: str, batch: int = 256, brs: bool = True, force_fd: bool = False,
+              recv_own: bool = False, node: str = "") -> CanTransport:
+    """--transport vbus：依 --vbus-* 參數接上 name 這條 bus（--vbus-shm 時跨 process）。"""
+    abit = 0 if getattr(args, "vbus_no_timing", False) else getattr(args, "abit", 500000)
+    model = dict(abit=abit, dbit=getattr(args, "dbit", 2000000), loss=getattr(args, "vbus_loss", 0.0),
+                 latency_us=getattr(args, "vbus_latency_us", 0.0), jitter_us=getattr(args, "vbus_jitter_us", 0.0),
+                 seed=getattr(args, "vbus_seed", None))
+    if getattr(args, "vbus_shm", False):
+        bus = _SHM_BUSES.get(name)
+        if bus is None or bus.buf is None:
+            bus = _SHM_BUSES[name] = ShmVirtualBus(name, **model)
+        return bus.attach(node, batch=batch, brs=brs, force_fd=force_fd, recv_own=recv_own)
+    return get_bus(name, **model).attach(node, batch=batch, brs=brs, force_fd=force_fd, recv_own=recv_own)
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ZLG 共用收包引擎（取代各工具裡 GetReceiveNum + time.sleep(0.001) 的輪詢迴圈）
+
+策略（自適應）：
+- 有資料：burst drain，一次取滿 batch、取滿就繼續取，直到 buffer 清空，不 sleep
+- 剛變閒：指數退避 sleep（min_backoff_us → max_backoff_us 每次加倍）
+- 持續閒置：改用 ReceiveFD(wait_ms) 在 DLL 內阻塞等待，有幀就立即返回，不佔 CPU
+  （classic CAN 不會喚醒 FD 的阻塞等待；最近有收到 classic 幀時，阻塞時間上限改為 max_backoff_us）
+
+統計（RxStats）：每幀 CPU 時間（thread_time）、DLL 呼叫次數、空輪詢、最大 burst，
+以及收包延遲（host 收到時間 - 裝置 timestamp，以觀察到的最小差值為基準的相對延遲）。
+
+用法：
+    eng = ZlgRxEngine(zlgcan, chn_handle, handler)      # handler(can_id, data, is_fd, frame)
+    eng.run(stop_event)                                 # 或自行呼叫 eng.poll(max_wait_ms)
+    print(eng.stats.format())
+"""
+from __future__ import annotations
+import threading, time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+RxHandler = Callable[[int, bytes, bool, Any], None]
+
+
+@dataclass
+class RxConfig:
+    batch_fd: int = 256          # 每次 ReceiveFD 最多取幾幀
+    batch: int = 256             # 每次 Receive（classic）最多取幾幀
+    block_ms: int = 20           # 閒置時 ReceiveFD 阻塞等待上限
+    min_backoff_us: int = 50     # 退避起點
+    max_backoff_us: int = 2000   # 退避上限；到達後改用阻塞等待
+    classic: bool = True         # 是否也收 classic CAN（ZCAN_TYPE_CAN）
+    classic_hold_s: float = 1.0  # 最近多久內收過 classic 幀，就不做長時間阻塞
+
+
+class RxStats:
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.frames = 0
+        self.fd_frames = 0
+        self.can_frames = 0
+        self.calls = 0           # Receive / ReceiveFD / GetReceiveNum 呼叫次數
+        self.empty_polls = 0
+        self.blocking_waits = 0
+        self.max_burst = 0
+        self.cpu_s = 0.0
+        self.lat_n = 0
+        self.lat_sum_us = 0.0
+        self.lat_max_us = 0.0
+        self._min_offset_us: Optional[int] = None
+        self._t0 = time.perf_counter()
+
+    def _latency(self, host_us: int, dev_ts_us: int) -> None:
+        off = host_us - dev_ts_us
+        if self._min_offset_us is None or off < self._min_offset_us:
+            self._min_offset_us = off
+        lat = off - self._min_offset_us
+        self.lat_n += 1
+        self.lat_sum_us += lat
+        if lat > self.lat_max_us:
+            self.lat_max_us = lat
+
+    def snapshot(self) -> Dict[str, float]:
+        elapsed = time.perf_counter() - self._t0
+        return {
+            "frames": self.frames, "fd_frames": self.fd_frames, "can_frames": self.can_frames,
+            "calls": self.calls, "empty_polls": self.empty_polls, "blocking_waits": self.blocking_waits,
+            "max_burst": self.max_burst, "elapsed_s": elapsed,
+            "cpu_pct": 100.0 * self.cpu_s / elapsed if elapsed else 0.0,
+            "cpu_us_per_frame": 1e6 * self.cpu_s / self.frames if self.frames else 0.0,
+            "lat_avg_us": self.lat_sum_us / self.lat_n if self.lat_n else 0.0,
+            "lat_max_us": self.lat_max_us,
+        }
+
+    def format(self) -> str:
+        s = self.snapshot()
+        return (f"rx frames={s['frames']} (fd={s['fd_frames']} can={s['can_frames']}) "
+                f"calls={s['calls']} empty={s['empty_polls']} block={s['blocking_waits']} max_burst={s['max_burst']} "
+                f"cpu={s['cpu_pct']:.1f}% {s['cpu_us_per_frame']:.1f}us/frame "
+                f"lat avg={s['lat_avg_us']:.0f}us max={s['lat_max_us']:.0f}us")
+
+
+class ZlgRxEngine:
+    def __init__(self, zcanlib, chn_handle: int, handler: RxHandler, cfg: Optional[RxConfig] = None):
+        self.zcanlib, self.chn = zcanlib, chn_handle
+        self.handler = handler
+        self.cfg = cfg or RxConfig()
+        self.stats = RxStats()
+        self.cur_ts_us = 0   # dispatch 中那一幀的裝置 timestamp（handler 內讀；沒有時為 0）
+        self._lib = zcanlib.ZCAN()
+        self._type_fd = getattr(zcanlib, "ZCAN_TYPE_CANFD", 1)
+        self._type_can = getattr(zcanlib, "ZCAN_TYPE_CAN", 0)
+        self._idle_rounds = 0
+        self._last_classic = 0.0
+
+    # ---- dispatch ---- #
+    def _dispatch(self, msgs, got: int, is_fd: bool) -> None:
+        st, handler = self.stats, self.handler
+        host_us = time.perf_counter_ns() // 1000
+        for i in range(got):
+            m = msgs[i]
+            frame = m.frame
+            can_id = frame.can_id & 0x1FFFFFFF
+            if is_fd:
+                data = bytes(frame.data[:frame.len])
+            elif frame.can_id & (1 << 30):
+                data = b""  # remote frame
+            else:
+                data = bytes(frame.data[:frame.can_dlc])
+            ts = getattr(m, "timestamp", None)
+            if ts:
+                st._latency(host_us, int(ts))
+            self.cur_ts_us = int(ts or 0)
+            handler(can_id, data, is_fd, frame)
+        st.frames += got
+        if is_fd:
+            st.fd_frames += got
+        else:
+            st.can_frames += got
+            self._last_classic = time.monotonic()
+
+    def _drain(self, is_fd: bool) -> int:
+        """把 buffer 取到空為止（一次取滿 batch 就繼續取）。"""
+        lib, chn, st = self._lib, self.chn, self.stats
+        kind, batch = (self._type_fd, self.cfg.batch_fd) if is_fd else (self._type_can, self.cfg.batch)
+        recv = lib.ReceiveFD if is_fd else lib.Receive
+        total = 0
+        while True:
+            st.calls += 1
+            n = lib.GetReceiveNum(chn, kind)
+            if not n:
+                break
+            take = min(n, batch)
+            st.calls += 1
+            msgs, got = recv(chn, take, 0)
+            if got <= 0:
+                break
+            self._dispatch(msgs, got, is_fd)
+            total += got
+            if got < take:
+                break
+        return total
+
+    # ---- public ---- #
+    def poll(self, max_wait_ms: Optional[float] = None) -> int:
+        """收一輪：有資料就 burst drain；沒有就依退避狀態 sleep 或阻塞等待（不超過 max_wait_ms）。回傳處理幀數。"""
+        cfg, st = self.cfg, self.stats
+        c0 = time.thread_time()
+        n = self._drain(True)
+        if cfg.classic:
+            n += self._drain(False)
+        if n:
+            self._idle_rounds = 0
+            if n > st.max_burst:
+                st.max_burst = n
+            st.cpu_s += time.thread_time() - c0
+            return n
+
+        st.empty_polls += 1
+        wait_ms = cfg.block_ms if max_wait_ms is None else max_wait_ms
+        delay_us = cfg.min_backoff_us << min(self._idle_rounds, 30)
+        self._idle_rounds += 1
+        if delay_us < cfg.max_backoff_us:
+            st.cpu_s += time.thread_time() - c0
+            time.sleep(min(delay_us / 1e6, wait_ms / 1000.0))
+            return 0
+        # 完全閒置：在 DLL 內阻塞等待 FD 幀
+        if cfg.classic and time.monotonic() - self._last_classic < cfg.classic_hold_s:
+            wait_ms = min(wait_ms, cfg.max_backoff_us / 1000.0)
+        st.blocking_waits += 1
+        st.calls += 1
+        st.cpu_s += time.thread_time() - c0
+        msgs, got = self._lib.ReceiveFD(self.chn, cfg.batch_fd, max(1, int(wait_ms)))
+        c0 = time.thread_time()
+        if got > 0:
+            self._dispatch(msgs, got, True)
+            self._idle_rounds = 0
+        st.cpu_s += time.thread_time() - c0
+        return max(got, 0)
+
+    def run(self, stop: threading.Event, report: Optional[Callable[[str], None]] = None,
+            report_every_s: float = 0.0) -> None:
+        """stop 設定前持續收包；report_every_s > 0 時定期以 report(stats.format()) 回報。"""
+        next_report = time.monotonic() + report_every_s
+        while not stop.is_set():
+            self.poll()
+            if report and report_every_s > 0 and time.monotonic() >= next_report:
+                report(self.stats.format())
+                next_report += report_every_s
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ZLG 批次送包（取代每幀 new ZCAN_TransmitFD_Data + for 迴圈複製 + TransmitFD(..., 1)）
+
+- classic / FD 各一個預先配置的 ctypes 陣列（batch_size 幀），重複使用
+- payload 以 ctypes.memmove 一次複製
+- 一批 frames 依長度分成 classic（<= 8 bytes）與 FD 兩組，每組一次 Transmit / TransmitFD
+  （同一組內維持送出順序；classic 與 FD 之間的先後不保證）
+- 超過 FD data 緩衝區（64 bytes）的 payload 不送，計入 failed
+
+用法：
+    tx = ZlgTxBatcher(zlgcan, chn_handle, batch_size=64)
+    tx.send([(0x117, payload), (0x210, payload2), ...])
+"""
+from __future__ import annotations
+import ctypes, logging
+from typing import List, Sequence, Tuple
+
+
+class ZlgTxBatcher:
+    def __init__(self, zcanlib, chn_handle: int, batch_size: int = 64, brs: bool = True, force_fd: bool = False):
+        """force_fd: <= 8 bytes 的幀也以 FD 送出（預設依長度分 classic / FD）"""
+        self.zcanlib, self.chn = zcanlib, chn_handle
+        self.batch_size = max(1, int(batch_size))
+        self.brs = brs
+        self.force_fd = force_fd
+        self._lib = zcanlib.ZCAN()
+        self._fd_arr = (zcanlib.ZCAN_TransmitFD_Data * self.batch_size)()
+        self._can_arr = (zcanlib.ZCAN_Transmit_Data * self.batch_size)()
+        for i in range(self.batch_size):
+            self._fd_arr[i].transmit_type = 0
+            self._can_arr[i].transmit_type = 0
+        self._fd_max = len(self._fd_arr[0].frame.data)
+        # 統計
+        self.frames = 0
+        self.calls = 0
+        self.failed = 0
+
+    @staticmethod
+    def _wire_id(can_id: int) -> int:
+        # can_id 已帶 bit31（extended）時原樣保留
+        return can_id | (1 << 31 if can_id > 0x7FF else 0)
+
+    def _submit(self, frames: Sequence[Tuple[int, bytes]], fd: bool) -> int:
+        arr = self._fd_arr if fd else self._can_arr
+        flags = 0x1 if self.brs else 0
+        memmove, addressof = ctypes.memmove, ctypes.addressof
+        sent = 0
+        for off in range(0, len(frames), self.batch_size):
+            chunk = frames[off:off + self.batch_size]
+            for i, (can_id, payload) in enumerate(chunk):
+                f = arr[i].frame
+                f.can_id = self._wire_id(can_id)
+                n = len(payload)
+                if fd:
+                    f.len = n
+                    f.flags = flags
+                else:
+                    f.can_dlc = n
+                memmove(addressof(f.data), payload, n)
+            self.calls += 1
+            if fd:
+                ret = self._lib.TransmitFD(self.chn, arr, len(chunk))
+            else:
+                ret = self._lib.Transmit(self.chn, arr, len(chunk))
+            ok = int(ret or 0)
+            if ok < len(chunk):
+                self.failed += len(chunk) - ok
+                logging.warning("ZLG %s transmit: %d/%d frames accepted", "FD" if fd else "CAN", ok, len(chunk))
+            sent += ok
+        return sent
+
+    def send(self, frames: Sequence[Tuple[int, bytes]]) -> int:
+        """送出一批 (can_id, payload)；回傳裝置接受的幀數。"""
+        fd: List[Tuple[int, bytes]] = []
+        classic: List[Tuple[int, bytes]] = []
+        force_fd, fd_max = self.force_fd, self._fd_max
+        rejected = 0
+        for item in frames:
+            n = len(item[1])
+            if n > fd_max:
+                rejected += 1
+                continue
+            (fd if force_fd or n > 8 else classic).append(item)
+        if rejected:
+            self.failed += rejected
+            logging.warning("ZLG transmit: %d frames rejected (payload > %d bytes)", rejected, fd_max)
+        sent = 0
+        if classic:
+            sent += self._submit(classic, fd=False)
+        if fd:
+            sent += self._submit(fd, fd=True)
+        self.frames += sent
+        return sent
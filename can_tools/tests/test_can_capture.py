@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""can_capture 寫入 / 讀回、capture_log 索引查詢（含 .idx 損毀時重建）、writer thread 寫檔失敗的回報。"""
+from __future__ import annotations
+import errno
+import random
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+EXAMPLES = ROOT / "examples"
+if str(EXAMPLES) not in sys.path:
+    sys.path.insert(0, str(EXAMPLES))
+
+import can_capture as cc
+import capture_log as cl
+from can_transport import RxFrame
+
+IDS = ((0x100, False), (0x117, False), (0x7FF, False), (0x18FEF100, True), (0x1ABCDEF0, True))
+
+
+def _frames(n: int = 3000, seed: int = 1):
+    """(dev_ts_us, can_id, data, is_fd, brs, extended, chan)"""
+    rnd = random.Random(seed)
+    out = []
+    for i in range(n):
+        cid, ext = IDS[rnd.randrange(len(IDS))]
+        is_fd = rnd.random() < 0.3
+        ln = rnd.choice((12, 16, 32, 64)) if is_fd else rnd.randrange(9)
+        out.append((1_000 + i * 100, cid, bytes(rnd.randrange(256) for _ in range(ln)), is_fd, is_fd and rnd.random() < 0.5,
+                    ext, rnd.randrange(2)))
+    return out
+
+
+def _write(path: Path, frames, codec: str = "none") -> None:
+    w = cc.CaptureWriter(str(path), codec, block_size=4096, ring_blocks=len(frames))   # ring 夠大：不丟幀
+    for ts, cid, data, is_fd, brs, ext, chan in frames:
+        assert w.add(cid, data, ts, is_fd, brs, ext, chan)
+    w.close()
+    assert w.dropped == 0 and w.frames == len(frames) and w.blocks > 1
+
+
+def _rel(recs):
+    """ts 轉成相對第一幀（寫入端把裝置 timestamp 對齊到 host 時間）。"""
+    recs = [tuple(r) for r in recs]
+    t0 = recs[0][0] if recs else 0
+    return [(r[0] - t0,) + r[1:] for r in recs]
+
+
+def _codecs():
+    out = ["none", "zlib"]
+    if cc.zstandard is not None:
+        out.append("zstd")
+    if cc.lz4_block is not None:
+        out.append("lz4")
+    return out
+
+
+@pytest.mark.parametrize("codec", _codecs())
+def test_capture_round_trip(tmp_path, codec):
+    frames = _frames()
+    path = tmp_path / "bus.cancap"
+    _write(path, frames, codec)
+    assert _rel(cc.read_capture(str(path))) == _rel(frames)
+
+
+@pytest.fixture
+def capture(tmp_path):
+    frames = _frames()
+    path = tmp_path / "bus.cancap"
+    _write(path, frames, "zlib")
+    return path, frames
+
+
+def _check_queries(log: cl.CaptureLog, frames) -> None:
+    recs = list(log.frames())
+    t0 = recs[0].ts_us
+    assert _rel(recs) == _rel(frames)
+    assert log.frame_count() == len(frames)
+    assert log.time_range() == (recs[0].ts_us, recs[-1].ts_us)
+    assert log.ids() == dict(sorted(Counter(cl._key(f[1], f[5]) for f in frames).items()))
+    for cid, ext in IDS:
+        key = cl._key(cid, ext)
+        got = list(log.frames(ids={key}))
+        assert got == [r for r in recs if r.can_id == cid and r.extended == ext]
+        # 只讀含有該 ID 的 block
+        assert all(any(r.can_id == cid for r in cc.iter_records(log.block_data(i))) for i in log.select_blocks(ids={key}))
+    lo, hi = t0 + 50_000, t0 + 120_000
+    assert list(log.frames(lo, hi)) == [r for r in recs if lo <= r.ts_us <= hi]
+    key = cl._key(0x18FEF100, True)
+    assert list(log.frames(lo, hi, {key})) == [r for r in recs if lo <= r.ts_us <= hi and r.extended and r.can_id == 0x18FEF100]
+
+
+def test_capture_log_index_queries(capture, monkeypatch):
+    path, frames = capture
+    with cl.CaptureLog(str(path)) as log:          # 第一次：掃描建立 .idx
+        assert log.indexed
+        _check_queries(log, frames)
+    assert Path(str(path) + ".idx").exists()
+
+    def no_rebuild(self):
+        raise AssertionError("index should have been loaded from .idx")
+
+    monkeypatch.setattr(cl.CaptureLog, "build_index", no_rebuild)
+    with cl.CaptureLog(str(path)) as log:          # 第二次：直接載入
+        assert log.indexed
+        _check_queries(log, frames)
+
+
+@pytest.mark.parametrize("damage", ["truncate_tail", "truncate_tables", "extra_bytes", "bad_block_number"])
+def test_damaged_index_is_rebuilt(capture, damage):
+    path, frames = capture
+    cl.CaptureLog(str(path)).close()
+    idx = Path(str(path) + ".idx")
+    data = bytearray(idx.read_bytes())
+    if damage == "truncate_tail":
+        data = data[:-4]
+    elif damage == "truncate_tables":
+        data = data[:cl.IDX_HDR.size + 10]
+    elif damage == "extra_bytes":
+        data += b"\x00" * 4
+    else:
+        data[-4:] = (1 << 20).to_bytes(4, "little")
+    idx.write_bytes(bytes(data))
+    with cl.CaptureLog(str(path)) as log:
+        _check_queries(log, frames)
+
+
+class _FullDisk:
+    """寫完檔頭之後每次 write 都 ENOSPC。"""
+
+    def __init__(self, f):
+        self._f, self.writes = f, 0
+
+    def write(self, b):
+        if self.writes:
+            raise OSError(errno.ENOSPC, "No space left on device")
+        self.writes += 1
+        return self._f.write(b)
+
+    def close(self):
+        self._f.close()
+
+
+def _full_disk_open(*args, **kwargs):
+    return _FullDisk(open(*args, **kwargs))
+
+
+def test_writer_error_raised_by_add_frames(tmp_path, monkeypatch):
+    monkeypatch.setattr(cc, "open", _full_disk_open, raising=False)
+    w = cc.CaptureWriter(str(tmp_path / "full.cancap"), block_size=4096, ring_blocks=2, flush_ms=0)
+    batch = [RxFrame(0x100, bytes(8), False, False, False, 0)] * 100
+    deadline = time.monotonic() + 10
+    with pytest.raises(RuntimeError, match="No space left"):
+        while time.monotonic() < deadline:
+            w.add_frames(batch)
+            time.sleep(0.001)
+    assert isinstance(w.error, OSError) and w.lost > 0
+    t = time.monotonic()
+    w.close()                                      # 已回報過：不再丟，也不會卡住等空 block
+    assert time.monotonic() - t < 5
+
+
+def test_writer_error_raised_by_close(tmp_path, monkeypatch):
+    monkeypatch.setattr(cc, "open", _full_disk_open, raising=False)
+    w = cc.CaptureWriter(str(tmp_path / "full.cancap"), block_size=4096, ring_blocks=2)
+    for i in range(10):
+        w.add(0x100, bytes([i]) * 8)
+    with pytest.raises(RuntimeError, match="No space left"):
+        w.close()
+    assert w.lost == 10
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""log_import 讀取端：candump（log / 螢幕格式）、Vector ASC（hex / dec、absolute / relative）、BLF 物件 header v1 / v2。"""
+from __future__ import annotations
+import struct
+import sys
+import zlib
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+EXAMPLES = ROOT / "examples"
+if str(EXAMPLES) not in sys.path:
+    sys.path.insert(0, str(EXAMPLES))
+
+import log_import as li
+
+FRAMES = ((1_500_000, 0x117, b"\x01\x02\x03\x04\x05\x06\x07\x08", False),
+          (2_000_000, 0x18FEF100, b"\xAA\xBB", True))
+
+
+CANDUMP_LOG = """\
+(1436509052.249713) can0 123#DEADBEEF
+(1436509052.250000) can0 18FEF100#0102
+(1436509052.251000) can1 100##1112233
+(1436509052.252000) can0 123#R
+(1436509052.253000) can0 20000080#0000000000000000
+(1436509052.254000) can1 7FF##0.AA.BB
+"""
+
+CANDUMP_SCREEN = """\
+  can0  123   [4]  DE AD BE EF
+  can1  18FEF100   [2]  01 02
+  can0  100  [12]  00 01 02 03 04 05 06 07 08 09 0A 0B
+  can0  321   [0]  remote request
+"""
+
+ASC_HEADER = "date Mon Jan 1 12:00:00.000 am 2024\n"
+ASC_HEX_ABS = ASC_HEADER + """\
+base hex  timestamps absolute
+internal events logged
+Begin Triggerblock Mon Jan 1 12:00:00.000 am 2024
+   0.001000 1  123             Rx   d 8 01 02 03 04 05 06 07 08
+   0.002500 2  18FEF100x       Rx   d 2 AA BB
+   0.003000 1  ErrorFrame
+   0.003500 1  200             Rx   r
+   0.004000 CANFD   1 Rx        101  EngineData  1 0 9 12 00 01 02 03 04 05 06 07 08 09 0A 0B     0    0 103000
+End TriggerBlock
+"""
+ASC_DEC_REL = ASC_HEADER + """\
+base dec  timestamps relative
+Begin Triggerblock Mon Jan 1 12:00:00.000 am 2024
+   0.001000 1  291             Rx   d 2 1 255
+   0.000500 1  ErrorFrame
+   0.002000 2  419361024x      Tx   d 1 16
+End TriggerBlock
+"""
+
+
+def _recs(reader, path):
+    return [tuple(r) for r in reader(str(path))]
+
+
+def test_candump_log_format(tmp_path):
+    path = tmp_path / "bus.log"
+    path.write_text(CANDUMP_LOG)
+    assert li.detect_format(str(path)) == "candump"
+    assert _recs(li.read_candump, path) == [
+        (1436509052249713, 0x123, b"\xDE\xAD\xBE\xEF", False, False, False, 0),
+        (1436509052250000, 0x18FEF100, b"\x01\x02", False, False, True, 0),
+        (1436509052251000, 0x100, b"\x11\x22\x33", True, True, False, 1),
+        (1436509052254000, 0x7FF, b"\xAA\xBB", True, False, False, 1),      # remote / error frame 略過
+    ]
+
+
+def test_candump_screen_format(tmp_path):
+    path = tmp_path / "screen.txt"
+    path.write_text(CANDUMP_SCREEN)
+    assert _recs(li.read_candump, path) == [
+        (0, 0x123, b"\xDE\xAD\xBE\xEF", False, False, False, 0),
+        (0, 0x18FEF100, b"\x01\x02", False, False, True, 1),
+        (0, 0x100, bytes(range(12)), True, False, False, 0),
+    ]
+
+
+def test_asc_hex_absolute(tmp_path):
+    path = tmp_path / "drive.asc"
+    path.write_text(ASC_HEX_ABS)
+    assert li.detect_format(str(path)) == "asc"
+    t0 = li._asc_date_us("Mon Jan 1 12:00:00.000 am 2024")
+    assert t0 > 0
+    assert _recs(li.read_asc, path) == [
+        (t0 + 1000, 0x123, bytes(range(1, 9)), False, False, False, 0),
+        (t0 + 2500, 0x18FEF100, b"\xAA\xBB", False, False, True, 1),
+        (t0 + 4000, 0x101, bytes(range(12)), True, True, False, 0),
+    ]
+
+
+def test_asc_dec_relative(tmp_path):
+    path = tmp_path / "drive.asc"
+    path.write_text(ASC_DEC_REL)
+    t0 = li._asc_date_us("Mon Jan 1 12:00:00.000 am 2024")
+    # relative：相對上一個事件（含略過的 ErrorFrame）
+    assert _recs(li.read_asc, path) == [
+        (t0 + 1000, 291, b"\x01\xFF", False, False, False, 0),
+        (t0 + 3500, 419361024, b"\x10", False, False, True, 1),
+    ]
+
+
+def _blf_object(obj_type: int, hver: int, ts_ns: int, body: bytes) -> bytes:
+    if hver == 1:
+        hdr = li.BLF_OBJ_V1.pack(2, 0, 0, ts_ns)              # flags 2 = ns
+    else:
+        hdr = li.BLF_OBJ_V2.pack(2, 0, 0, 0, ts_ns)
+    size = li.BLF_OBJ_BASE.size + len(hdr) + len(body)
+    obj = li.BLF_OBJ_BASE.pack(b"LOBJ", li.BLF_OBJ_BASE.size + len(hdr), hver, size, obj_type) + hdr + body
+    return obj + b"\x00" * (-len(obj) % 4)
+
+
+def _write_blf(path: Path, hver: int, method: int) -> None:
+    objs = b""
+    for ts_ns, cid, data, ext in FRAMES:
+        body = li.BLF_CAN_MSG.pack(1, 0, len(data), cid | (li.EFF_FLAG if ext else 0), data.ljust(8, b"\x00"))
+        objs += _blf_object(li.BLF_CAN_MESSAGE2, hver, ts_ns, body + b"\x00" * 8)
+    payload = zlib.compress(objs) if method == 2 else objs
+    container = li.BLF_CONTAINER.pack(method, len(objs)) + payload
+    cont = li.BLF_OBJ_BASE.pack(b"LOBJ", li.BLF_OBJ_BASE.size, 1, li.BLF_OBJ_BASE.size + len(container),
+                                li.BLF_LOG_CONTAINER) + container
+    hdr = li.BLF_FILE_HDR.pack(b"LOGG", li.BLF_FILE_HDR.size, *([0] * 8), 0, 0, 0, 0, *([0] * 16))
+    path.write_bytes(hdr + cont + b"\x00" * (-len(cont) % 4))
+
+
+@pytest.mark.parametrize("method", [0, 2])
+@pytest.mark.parametrize("hver", [1, 2])
+def test_blf_object_header_versions(tmp_path, hver, method):
+    path = tmp_path / "bus.blf"
+    _write_blf(path, hver, method)
+    assert li.detect_format(str(path)) == "blf"
+    recs = list(li.read_blf(str(path)))
+    assert [(r.ts_us, r.can_id, r.data, r.extended, r.chan) for r in recs] == \
+        [(ts // 1000, cid, data, ext, 0) for ts, cid, data, ext in FRAMES]
+
+
+def test_output_names_disambiguates_same_basename():
+    names = li.output_names(["day1/bus.log", "day2/bus.log", "drive.asc", "drive.blf", "a/x/bus.log", "b/x/bus.log"])
+    assert names == ["day1_bus.log", "day2_bus.log", "drive.asc", "drive.blf", "x_bus.log-1", "x_bus.log-2"]
+    assert len(set(names)) == len(names)
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""TxQueue：溢位時 heap 不可無限成長；出列順序仍依仲裁優先。"""
+from __future__ import annotations
+import queue
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+EXAMPLES = ROOT / "examples"
+if str(EXAMPLES) not in sys.path:
+    sys.path.insert(0, str(EXAMPLES))
+
+from tx_queue import TxQueue
+
+IDS = (0x300, 0x100, 0x200)
+
+
+def _drain(q: TxQueue):
+    out = []
+    while True:
+        try:
+            out.append(q.get_nowait())
+        except queue.Empty:
+            return out
+
+
+@pytest.mark.parametrize("policy", ["drop_oldest", "coalesce"])
+def test_heap_bounded_under_overflow(policy):
+    q = TxQueue(2, policy)
+    for i in range(10000):                       # consumer 停住，只一直 put
+        q.put((IDS[i % len(IDS)], bytes([i & 0xFF])))
+    assert q.qsize() == 2
+    assert len(q._heap) <= len(IDS)
+    assert q.dropped + q.coalesced + q.qsize() == 10000
+
+
+def test_overflow_then_drain_keeps_priority_order():
+    q = TxQueue(2, "drop_oldest")
+    for i in range(10000):
+        q.put((IDS[i % len(IDS)], bytes([i & 0xFF])))
+    frames = _drain(q)
+    # 最後兩幀是 i = 9998 (0x200)、9999 (0x300)；ID 小的先出
+    assert frames == [(0x200, bytes([9998 & 0xFF])), (0x300, bytes([9999 & 0xFF]))]
+    assert q.empty() and not q._heap
+    # 清空後再用：已被 drop 清空的 ID 仍能正常入列 / 出列
+    q.put((0x100, b"\x01"))
+    q.put((0x300, b"\x03"))
+    assert _drain(q) == [(0x100, b"\x01"), (0x300, b"\x03")]
+    assert len(q._heap) == 0